@@ -9,6 +9,8 @@ from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.core.config import settings
 from app.core.security import verify_token
+from app.utils.http_client import user_service_client
+from app.utils.identity import identity_resolver
 
 def public_endpoint(path: str) -> bool:
     """检查是否是公开端点"""
@@ -33,23 +35,12 @@ async def get_current_user(
     if public_endpoint(request.url.path):
         return None
         
-    # 验证令牌
+    # 本地验证令牌
     payload = verify_token(token)
-    user_id = int(payload["sub"])
     
-    # 从用户服务获取用户信息
+    # 从身份缓存获取用户信息，未命中时才调用用户服务
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.USER_SERVICE_BASE_URL}/users/me",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            response.raise_for_status()
-            user_data = response.json()
-            # 添加令牌过期时间
-            if 'exp' in payload:
-                user_data['token_exp'] = payload['exp']
-            return user_data
+        return await identity_resolver.resolve(token, payload)
     except httpx.HTTPStatusError as e:
         if e.response.status_code == status.HTTP_401_UNAUTHORIZED:
             raise HTTPException(
@@ -86,6 +77,6 @@ def get_pagination_params(
 # 获取用户服务客户端
 async def get_user_service_client() -> httpx.AsyncClient:
     """
-    创建用于调用用户服务的HTTP客户端
+    获取进程内共享的用户服务HTTP客户端（复用keep-alive连接池）
     """
-    return httpx.AsyncClient(base_url=settings.USER_SERVICE_BASE_URL, timeout=10.0)
\ No newline at end of file
+    return await user_service_client.get_client()
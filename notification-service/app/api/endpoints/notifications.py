@@ -3,10 +3,10 @@ from typing import Any, Dict, List, Optional
 from datetime import datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status, Query, Path
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, or_, select, update, delete
 
-from app.db.session import get_db
+from app.db.session import AsyncSessionLocal, get_async_db
 from app.models.notification import Notification, NotificationType
 from app.schemas.notification import (
     Notification as NotificationSchema,
@@ -21,12 +21,20 @@ from app.api.deps import get_current_user, get_pagination_params
 from app.core.config import settings
 from app.websockets.connection import connection_manager, authenticate_websocket
 from app.websockets.broadcaster import broadcast_to_user
+from app.utils.counting import count_strategy, inbox_scope
 
 router = APIRouter()
 
+def unread_query(user_id: int):
+    """用户未读通知查询"""
+    return select(Notification).where(
+        Notification.user_id == user_id,
+        Notification.is_read == False
+    )
+
 @router.get("/", response_model=NotificationPage)
 async def get_notifications(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     pagination: Dict[str, int] = Depends(get_pagination_params),
     type: Optional[NotificationType] = None,
     is_read: Optional[bool] = None,
@@ -41,26 +49,29 @@ async def get_notifications(
     skip = (page - 1) * size
     
     # 查询条件
-    query = db.query(Notification).filter(Notification.user_id == current_user["id"])
+    query = select(Notification).where(Notification.user_id == current_user["id"])
     
     # 应用筛选
     if type:
-        query = query.filter(Notification.type == type)
+        query = query.where(Notification.type == type)
     
     if is_read is not None:
-        query = query.filter(Notification.is_read == is_read)
+        query = query.where(Notification.is_read == is_read)
     
-    # 获取总数
-    total = query.count()
+    # 获取总数（数量较大时为估计值，结果按筛选条件缓存）
+    scope = inbox_scope(current_user["id"])
+    total, total_is_estimate = await count_strategy.count(
+        db, query, scope, {"type": type, "is_read": is_read}
+    )
     
     # 获取未读通知数量
-    unread_count = db.query(Notification).filter(
-        Notification.user_id == current_user["id"],
-        Notification.is_read == False
-    ).count()
+    unread_count, _ = await count_strategy.count(
+        db, unread_query(current_user["id"]), scope, {"type": None, "is_read": False}
+    )
     
     # 应用排序和分页
-    notifications = query.order_by(Notification.created_at.desc()).offset(skip).limit(size).all()
+    result = await db.execute(query.order_by(Notification.created_at.desc()).offset(skip).limit(size))
+    notifications = result.scalars().all()
     
     # 计算总页数
     pages = (total + size - 1) // size if total > 0 else 1
@@ -68,6 +79,7 @@ async def get_notifications(
     return {
         "items": notifications,
         "total": total,
+        "total_is_estimate": total_is_estimate,
         "page": page,
         "size": size,
         "pages": pages,
@@ -76,41 +88,49 @@ async def get_notifications(
 
 @router.get("/unread/count", response_model=NotificationCount)
 async def get_unread_count(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
     """
     获取未读通知数量
     """
+    scope = inbox_scope(current_user["id"])
+    
     # 获取总通知数量
-    total = db.query(Notification).filter(
-        Notification.user_id == current_user["id"]
-    ).count()
+    total, total_is_estimate = await count_strategy.count(
+        db,
+        select(Notification).where(Notification.user_id == current_user["id"]),
+        scope,
+        {"type": None, "is_read": None},
+    )
     
     # 获取未读通知数量
-    unread = db.query(Notification).filter(
-        Notification.user_id == current_user["id"],
-        Notification.is_read == False
-    ).count()
+    unread, unread_is_estimate = await count_strategy.count(
+        db, unread_query(current_user["id"]), scope, {"type": None, "is_read": False}
+    )
     
     return {
         "total": total,
-        "unread": unread
+        "unread": unread,
+        "total_is_estimate": total_is_estimate,
+        "unread_is_estimate": unread_is_estimate
     }
 
 @router.get("/{notification_id}", response_model=NotificationSchema)
 async def get_notification(
     notification_id: int = Path(..., gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
     """
     获取特定通知的详情
     """
-    notification = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.user_id == current_user["id"]
-    ).first()
+    notification = (await db.execute(
+        select(Notification).where(
+            Notification.id == notification_id,
+            Notification.user_id == current_user["id"]
+        )
+    )).scalars().first()
     
     if not notification:
         raise HTTPException(
@@ -125,16 +145,18 @@ async def update_notification(
     *,
     notification_id: int = Path(..., gt=0),
     notification_in: NotificationUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
     """
     更新通知状态
     """
-    notification = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.user_id == current_user["id"]
-    ).first()
+    notification = (await db.execute(
+        select(Notification).where(
+            Notification.id == notification_id,
+            Notification.user_id == current_user["id"]
+        )
+    )).scalars().first()
     
     if not notification:
         raise HTTPException(
@@ -147,37 +169,41 @@ async def update_notification(
         notification.is_read = notification_in.is_read
     
     db.add(notification)
-    db.commit()
-    db.refresh(notification)
+    await db.commit()
+    await db.refresh(notification)
+    await count_strategy.invalidate_inbox(current_user["id"])
     
     return notification
 
 @router.put("/mark-all-read", response_model=Dict[str, Any])
 async def mark_all_as_read(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
     """
     将所有通知标记为已读
     """
     # 更新所有未读通知
-    result = db.query(Notification).filter(
-        Notification.user_id == current_user["id"],
-        Notification.is_read == False
-    ).update({"is_read": True})
+    result = await db.execute(
+        update(Notification).where(
+            Notification.user_id == current_user["id"],
+            Notification.is_read == False
+        ).values(is_read=True)
+    )
     
-    db.commit()
+    await db.commit()
+    await count_strategy.invalidate_inbox(current_user["id"])
     
     return {
         "message": "所有通知已标记为已读",
-        "updated_count": result
+        "updated_count": result.rowcount
     }
 
 @router.put("/batch", response_model=Dict[str, Any])
 async def batch_update_notifications(
     *,
     update_data: NotificationBulkUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
     """
@@ -191,32 +217,37 @@ async def batch_update_notifications(
         )
     
     # 更新通知
-    result = db.query(Notification).filter(
-        Notification.id.in_(update_data.notification_ids),
-        Notification.user_id == current_user["id"]
-    ).update({"is_read": update_data.is_read})
+    result = await db.execute(
+        update(Notification).where(
+            Notification.id.in_(update_data.notification_ids),
+            Notification.user_id == current_user["id"]
+        ).values(is_read=update_data.is_read)
+    )
     
-    db.commit()
+    await db.commit()
+    await count_strategy.invalidate_inbox(current_user["id"])
     
     return {
-        "message": f"已更新{result}条通知",
-        "updated_count": result
+        "message": f"已更新{result.rowcount}条通知",
+        "updated_count": result.rowcount
     }
 
 @router.delete("/{notification_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_notification(
     *,
     notification_id: int = Path(..., gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> None:
     """
     删除特定通知
     """
-    notification = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.user_id == current_user["id"]
-    ).first()
+    notification = (await db.execute(
+        select(Notification).where(
+            Notification.id == notification_id,
+            Notification.user_id == current_user["id"]
+        )
+    )).scalars().first()
     
     if not notification:
         raise HTTPException(
@@ -224,28 +255,30 @@ async def delete_notification(
             detail="通知不存在"
         )
     
-    db.delete(notification)
-    db.commit()
+    await db.delete(notification)
+    await db.commit()
+    await count_strategy.invalidate_inbox(current_user["id"])
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_all_notifications(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> None:
     """
     删除所有通知
     """
-    db.query(Notification).filter(
-        Notification.user_id == current_user["id"]
-    ).delete()
+    await db.execute(
+        delete(Notification).where(Notification.user_id == current_user["id"])
+    )
     
-    db.commit()
+    await db.commit()
+    await count_strategy.invalidate_inbox(current_user["id"])
 
 @router.post("/test", response_model=NotificationSchema)
 async def create_test_notification(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
     """
@@ -266,8 +299,9 @@ async def create_test_notification(
     )
     
     db.add(notification)
-    db.commit()
-    db.refresh(notification)
+    await db.commit()
+    await db.refresh(notification)
+    await count_strategy.invalidate_inbox(current_user["id"])
     
     # 通过WebSocket发送通知
     await broadcast_to_user(
@@ -325,29 +359,27 @@ async def websocket_endpoint(websocket: WebSocket):
                 
                 # 处理消息（例如标记通知为已读）
                 if data.get("type") == "mark_read" and "notification_id" in data:
-                    # 创建数据库会话
-                    db = next(get_db())
-                    try:
-                        # 更新通知状态
-                        notification = db.query(Notification).filter(
-                            Notification.id == data["notification_id"],
-                            Notification.user_id == user_id
-                        ).first()
+                    # 使用异步会话，单条 UPDATE ... RETURNING 完成标记，不阻塞事件循环
+                    async with AsyncSessionLocal() as db:
+                        result = await db.execute(
+                            update(Notification).where(
+                                Notification.id == data["notification_id"],
+                                Notification.user_id == user_id
+                            ).values(is_read=True).returning(Notification.id)
+                        )
+                        notification_id = result.scalar_one_or_none()
+                        await db.commit()
+                    
+                    if notification_id is not None:
+                        await count_strategy.invalidate_inbox(user_id)
                         
-                        if notification:
-                            notification.is_read = True
-                            db.add(notification)
-                            db.commit()
-                            
-                            # 发送确认消息
-                            await websocket.send_json({
-                                "type": "notification_updated",
-                                "notification_id": notification.id,
-                                "is_read": True,
-                                "timestamp": datetime.utcnow().isoformat()
-                            })
-                    finally:
-                        db.close()
+                        # 发送确认消息
+                        await websocket.send_json({
+                            "type": "notification_updated",
+                            "notification_id": notification_id,
+                            "is_read": True,
+                            "timestamp": datetime.utcnow().isoformat()
+                        })
             except json.JSONDecodeError:
                 # 忽略无效的JSON
                 pass
@@ -13,6 +13,15 @@ class Settings(BaseSettings):
     # 数据库配置
     DATABASE_URL: str
     
+    # 数据库连接池（每个引擎、每个工作进程独立）
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0  # 等待可用连接的超时（秒）
+    DB_POOL_RECYCLE: int = 1800  # 连接最大存活时间（秒）
+    DB_POOL_PRE_PING: bool = True  # 取出连接前检测是否可用
+    DB_STATEMENT_TIMEOUT_MS: int = 15000  # 服务端语句超时（毫秒），0 表示不限制
+    DB_PGBOUNCER_MODE: bool = False  # 经 PgBouncer（事务模式）连接：不在本地池化，禁用预编译语句缓存
+    
     # JWT 配置 (从用户服务获取)
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
@@ -40,11 +49,26 @@ class Settings(BaseSettings):
     KAFKA_TOPIC_POSTS: str = "social.posts"
     KAFKA_TOPIC_COMMENTS: str = "social.comments"
     KAFKA_TOPIC_REACTIONS: str = "social.reactions"
+    KAFKA_TOPIC_USERS: str = "user.events"  # 用户资料变更事件
     KAFKA_CONSUMER_GROUP: str = "notification-service-group"
     
     # 用户服务 API
     USER_SERVICE_BASE_URL: str = "http://user-service:8000/api/v1"
     
+    # 用户服务 HTTP 连接池
+    USER_SERVICE_MAX_CONNECTIONS: int = 100
+    USER_SERVICE_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    USER_SERVICE_KEEPALIVE_EXPIRY: float = 30.0  # 空闲连接保留秒数
+    USER_SERVICE_HTTP2: bool = False
+    USER_SERVICE_TIMEOUT: float = 10.0  # 读写超时（秒）
+    USER_SERVICE_CONNECT_TIMEOUT: float = 3.0
+    USER_SERVICE_POOL_TIMEOUT: float = 5.0  # 等待连接池分配连接的超时
+    
+    # 身份缓存（避免每个请求都调用 /users/me）
+    IDENTITY_CACHE_MAX_SIZE: int = 10000
+    IDENTITY_CACHE_TTL: int = 60  # 秒，且不超过令牌剩余有效期
+    IDENTITY_CACHE_REDIS_ENABLED: bool = True  # 是否启用Redis二级缓存
+    
     # WebSocket 设置
     WEBSOCKET_PATH: str = "/ws/notifications"
     
@@ -60,6 +84,10 @@ class Settings(BaseSettings):
     NOTIFICATION_PAGE_SIZE: int = 20
     NOTIFICATION_MAX_AGE_DAYS: int = 30  # 通知保留天数
     
+    # 分页总数统计
+    COUNT_EXACT_THRESHOLD: int = 1000  # 超过该数量时返回估计值
+    COUNT_CACHE_TTL: int = 300  # Redis中缓存总数的时间（秒）
+    
     # 服务主机和端口
     HOST: str = "0.0.0.0"
     PORT: int = 8000
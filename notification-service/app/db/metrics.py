@@ -0,0 +1,73 @@
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# 连接池指标，engine 标签区分同步/异步引擎
+DB_POOL_SIZE = Gauge("db_pool_size", "数据库连接池常驻连接数", ["engine"])
+DB_POOL_CAPACITY = Gauge("db_pool_capacity_connections", "数据库连接池最大连接数（常驻+溢出）", ["engine"])
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out_connections", "已被请求占用的数据库连接数", ["engine"])
+DB_POOL_CHECKED_IN = Gauge("db_pool_checked_in_connections", "连接池中空闲的数据库连接数", ["engine"])
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow_connections", "超出常驻大小的溢出连接数", ["engine"])
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "从连接池取出连接的等待时间（秒）",
+    ["engine"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "等待可用连接超时的次数",
+    ["engine"],
+)
+
+
+class _CheckoutTimingMixin:
+    """记录取出连接的等待时间和超时次数"""
+
+    metrics_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(engine=self.metrics_label).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(engine=self.metrics_label).observe(time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    """带指标的同步引擎连接池"""
+
+    metrics_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    """带指标的异步引擎连接池"""
+
+    metrics_label = "async"
+
+
+def register_pool_metrics(engine: Engine, label: str) -> None:
+    """
+    注册连接池状态指标的取值函数（抓取时读取）
+
+    参数:
+        engine: 同步引擎；异步引擎传入 async_engine.sync_engine
+        label: 指标的 engine 标签值
+    """
+    # PgBouncer 模式下使用 NullPool，本地没有可观测的池状态
+    if not isinstance(engine.pool, QueuePool):
+        return
+
+    # 每次都从引擎读取当前连接池，dispose() 重建连接池后指标仍然有效
+    DB_POOL_SIZE.labels(engine=label).set_function(lambda: engine.pool.size())
+    DB_POOL_CAPACITY.labels(engine=label).set_function(lambda: engine.pool.size() + engine.pool._max_overflow)
+    DB_POOL_CHECKED_OUT.labels(engine=label).set_function(lambda: engine.pool.checkedout())
+    DB_POOL_CHECKED_IN.labels(engine=label).set_function(lambda: engine.pool.checkedin())
+    # 溢出数在未达到常驻大小时为负数
+    DB_POOL_OVERFLOW.labels(engine=label).set_function(lambda: max(engine.pool.overflow(), 0))
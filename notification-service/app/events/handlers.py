@@ -1,17 +1,18 @@
 import logging
 from typing import Dict, Any, Optional
 from datetime import datetime
-import httpx
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.models.notification import Notification, NotificationType
 from app.schemas.notification import NotificationCreate
+from app.utils.counting import count_strategy, pending_recipients
+from app.utils.http_client import user_service_client
 
 logger = logging.getLogger(__name__)
 
-async def handle_notification(data: Dict[str, Any], db: Session) -> Optional[Notification]:
+async def handle_notification(data: Dict[str, Any], db: AsyncSession) -> Optional[Notification]:
     """
     处理通知消息，保存到数据库
     
@@ -63,18 +64,19 @@ async def handle_notification(data: Dict[str, Any], db: Session) -> Optional[Not
         )
         
         db.add(notification)
-        db.commit()
-        db.refresh(notification)
+        await db.commit()
+        await db.refresh(notification)
+        await count_strategy.invalidate_inbox(notification.user_id)
         
         logger.info(f"成功创建通知: ID={notification.id}, 用户={notification.user_id}, 类型={notification.type}")
         
         return notification
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"创建通知失败: {str(e)}")
         return None
 
-async def handle_post_event(event_type: str, post_data: Dict[str, Any], db: Session) -> None:
+async def handle_post_event(event_type: str, post_data: Dict[str, Any], db: AsyncSession) -> None:
     """
     处理帖子事件，生成相关通知
     
@@ -120,12 +122,14 @@ async def handle_post_event(event_type: str, post_data: Dict[str, Any], db: Sess
         db.add(notification)
     
     try:
-        db.commit()
+        recipients = pending_recipients(db)
+        await db.commit()
+        await count_strategy.invalidate_inbox(*recipients)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"创建提及通知失败: {str(e)}")
 
-async def handle_comment_event(event_type: str, comment_data: Dict[str, Any], db: Session) -> None:
+async def handle_comment_event(event_type: str, comment_data: Dict[str, Any], db: AsyncSession) -> None:
     """
     处理评论事件，生成相关通知
     
@@ -149,98 +153,100 @@ async def handle_comment_event(event_type: str, comment_data: Dict[str, Any], db
     
     try:
         # 获取帖子信息
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{settings.USER_SERVICE_BASE_URL}/posts/{post_id}")
-            if response.status_code != 200:
-                logger.error(f"获取帖子信息失败: {response.text}")
-                return
+        client = await user_service_client.get_client()
+        response = await client.get(f"{settings.USER_SERVICE_BASE_URL}/posts/{post_id}")
+        if response.status_code != 200:
+            logger.error(f"获取帖子信息失败: {response.text}")
+            return
                 
-            post_info = response.json()
-            post_author_id = post_info.get("user_id")
+        post_info = response.json()
+        post_author_id = post_info.get("user_id")
             
-            # 如果是回复其他评论
-            if parent_id:
-                # 获取父评论信息
-                parent_response = await client.get(f"{settings.USER_SERVICE_BASE_URL}/comments/{parent_id}")
-                if parent_response.status_code != 200:
-                    logger.error(f"获取父评论信息失败: {parent_response.text}")
-                else:
-                    parent_comment = parent_response.json()
-                    parent_author_id = parent_comment.get("user_id")
+        # 如果是回复其他评论
+        if parent_id:
+            # 获取父评论信息
+            parent_response = await client.get(f"{settings.USER_SERVICE_BASE_URL}/comments/{parent_id}")
+            if parent_response.status_code != 200:
+                logger.error(f"获取父评论信息失败: {parent_response.text}")
+            else:
+                parent_comment = parent_response.json()
+                parent_author_id = parent_comment.get("user_id")
                     
-                    # 如果回复的不是自己的评论，发送通知
-                    if int(parent_author_id) != int(user_id):
-                        reply_notification = Notification(
-                            user_id=parent_author_id,
-                            type=NotificationType.COMMENT_REPLY,
-                            title="有人回复了你的评论",
-                            body=truncate_text(comment_data.get("content", ""), 100),
-                            sender_id=user_id,
-                            sender_name=comment_data.get("user", {}).get("username"),
-                            sender_avatar=comment_data.get("user", {}).get("avatar_url"),
-                            resource_type="comment",
-                            resource_id=comment_data.get("id"),
-                            meta_data={
-                                "post_id": post_id,
-                                "parent_id": parent_id
-                            },
-                            is_read=False
-                        )
+                # 如果回复的不是自己的评论，发送通知
+                if int(parent_author_id) != int(user_id):
+                    reply_notification = Notification(
+                        user_id=parent_author_id,
+                        type=NotificationType.COMMENT_REPLY,
+                        title="有人回复了你的评论",
+                        body=truncate_text(comment_data.get("content", ""), 100),
+                        sender_id=user_id,
+                        sender_name=comment_data.get("user", {}).get("username"),
+                        sender_avatar=comment_data.get("user", {}).get("avatar_url"),
+                        resource_type="comment",
+                        resource_id=comment_data.get("id"),
+                        meta_data={
+                            "post_id": post_id,
+                            "parent_id": parent_id
+                        },
+                        is_read=False
+                    )
                         
-                        db.add(reply_notification)
+                    db.add(reply_notification)
             
-            # 如果评论者不是帖子作者，发送通知给帖子作者
-            if int(post_author_id) != int(user_id):
-                post_notification = Notification(
-                    user_id=post_author_id,
-                    type=NotificationType.POST_COMMENT,
-                    title="有人评论了你的帖子",
-                    body=truncate_text(comment_data.get("content", ""), 100),
-                    sender_id=user_id,
-                    sender_name=comment_data.get("user", {}).get("username"),
-                    sender_avatar=comment_data.get("user", {}).get("avatar_url"),
-                    resource_type="post",
-                    resource_id=post_id,
-                    meta_data={
-                        "comment_id": comment_data.get("id")
-                    },
-                    is_read=False
-                )
+        # 如果评论者不是帖子作者，发送通知给帖子作者
+        if int(post_author_id) != int(user_id):
+            post_notification = Notification(
+                user_id=post_author_id,
+                type=NotificationType.POST_COMMENT,
+                title="有人评论了你的帖子",
+                body=truncate_text(comment_data.get("content", ""), 100),
+                sender_id=user_id,
+                sender_name=comment_data.get("user", {}).get("username"),
+                sender_avatar=comment_data.get("user", {}).get("avatar_url"),
+                resource_type="post",
+                resource_id=post_id,
+                meta_data={
+                    "comment_id": comment_data.get("id")
+                },
+                is_read=False
+            )
                 
-                db.add(post_notification)
+            db.add(post_notification)
             
-            # 处理评论中的提及
-            mentioned_users = extract_mentions(comment_data.get("content", ""))
-            for mentioned_user_id in mentioned_users:
-                if (int(mentioned_user_id) == int(user_id) or 
-                    int(mentioned_user_id) == int(post_author_id) or 
-                    (parent_id and int(mentioned_user_id) == int(parent_author_id))):
-                    continue  # 跳过已通知的用户
+        # 处理评论中的提及
+        mentioned_users = extract_mentions(comment_data.get("content", ""))
+        for mentioned_user_id in mentioned_users:
+            if (int(mentioned_user_id) == int(user_id) or 
+                int(mentioned_user_id) == int(post_author_id) or 
+                (parent_id and int(mentioned_user_id) == int(parent_author_id))):
+                continue  # 跳过已通知的用户
                     
-                mention_notification = Notification(
-                    user_id=mentioned_user_id,
-                    type=NotificationType.MENTION,
-                    title="有人在评论中提到了你",
-                    body=truncate_text(comment_data.get("content", ""), 100),
-                    sender_id=user_id,
-                    sender_name=comment_data.get("user", {}).get("username"),
-                    sender_avatar=comment_data.get("user", {}).get("avatar_url"),
-                    resource_type="comment",
-                    resource_id=comment_data.get("id"),
-                    meta_data={
-                        "post_id": post_id
-                    },
-                    is_read=False
-                )
+            mention_notification = Notification(
+                user_id=mentioned_user_id,
+                type=NotificationType.MENTION,
+                title="有人在评论中提到了你",
+                body=truncate_text(comment_data.get("content", ""), 100),
+                sender_id=user_id,
+                sender_name=comment_data.get("user", {}).get("username"),
+                sender_avatar=comment_data.get("user", {}).get("avatar_url"),
+                resource_type="comment",
+                resource_id=comment_data.get("id"),
+                meta_data={
+                    "post_id": post_id
+                },
+                is_read=False
+            )
                 
-                db.add(mention_notification)
+            db.add(mention_notification)
         
-        db.commit()
+        recipients = pending_recipients(db)
+        await db.commit()
+        await count_strategy.invalidate_inbox(*recipients)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"处理评论事件失败: {str(e)}")
 
-async def handle_reaction_event(event_type: str, reaction_data: Dict[str, Any], db: Session) -> None:
+async def handle_reaction_event(event_type: str, reaction_data: Dict[str, Any], db: AsyncSession) -> None:
     """
     处理反应事件，生成相关通知
     
@@ -265,66 +271,68 @@ async def handle_reaction_event(event_type: str, reaction_data: Dict[str, Any],
     try:
         if post_id:
             # 获取帖子信息
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{settings.USER_SERVICE_BASE_URL}/posts/{post_id}")
-                if response.status_code != 200:
-                    logger.error(f"获取帖子信息失败: {response.text}")
-                    return
+            client = await user_service_client.get_client()
+            response = await client.get(f"{settings.USER_SERVICE_BASE_URL}/posts/{post_id}")
+            if response.status_code != 200:
+                logger.error(f"获取帖子信息失败: {response.text}")
+                return
                     
-                post_info = response.json()
-                post_author_id = post_info.get("user_id")
+            post_info = response.json()
+            post_author_id = post_info.get("user_id")
                 
-                # 如果点赞者不是帖子作者，发送通知
-                if int(post_author_id) != int(user_id):
-                    like_notification = Notification(
-                        user_id=post_author_id,
-                        type=NotificationType.POST_LIKE,
-                        title="有人喜欢你的帖子",
-                        body=f"{reaction_data.get('user', {}).get('username', '有人')}对你的帖子表示了{get_reaction_text(reaction_type)}",
-                        sender_id=user_id,
-                        sender_name=reaction_data.get("user", {}).get("username"),
-                        sender_avatar=reaction_data.get("user", {}).get("avatar_url"),
-                        resource_type="post",
-                        resource_id=post_id,
-                        is_read=False
-                    )
+            # 如果点赞者不是帖子作者，发送通知
+            if int(post_author_id) != int(user_id):
+                like_notification = Notification(
+                    user_id=post_author_id,
+                    type=NotificationType.POST_LIKE,
+                    title="有人喜欢你的帖子",
+                    body=f"{reaction_data.get('user', {}).get('username', '有人')}对你的帖子表示了{get_reaction_text(reaction_type)}",
+                    sender_id=user_id,
+                    sender_name=reaction_data.get("user", {}).get("username"),
+                    sender_avatar=reaction_data.get("user", {}).get("avatar_url"),
+                    resource_type="post",
+                    resource_id=post_id,
+                    is_read=False
+                )
                     
-                    db.add(like_notification)
+                db.add(like_notification)
         
         elif comment_id:
             # 获取评论信息
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{settings.USER_SERVICE_BASE_URL}/comments/{comment_id}")
-                if response.status_code != 200:
-                    logger.error(f"获取评论信息失败: {response.text}")
-                    return
+            client = await user_service_client.get_client()
+            response = await client.get(f"{settings.USER_SERVICE_BASE_URL}/comments/{comment_id}")
+            if response.status_code != 200:
+                logger.error(f"获取评论信息失败: {response.text}")
+                return
                     
-                comment_info = response.json()
-                comment_author_id = comment_info.get("user_id")
+            comment_info = response.json()
+            comment_author_id = comment_info.get("user_id")
                 
-                # 如果点赞者不是评论作者，发送通知
-                if int(comment_author_id) != int(user_id):
-                    like_notification = Notification(
-                        user_id=comment_author_id,
-                        type=NotificationType.COMMENT_LIKE,
-                        title="有人喜欢你的评论",
-                        body=f"{reaction_data.get('user', {}).get('username', '有人')}对你的评论表示了{get_reaction_text(reaction_type)}",
-                        sender_id=user_id,
-                        sender_name=reaction_data.get("user", {}).get("username"),
-                        sender_avatar=reaction_data.get("user", {}).get("avatar_url"),
-                        resource_type="comment",
-                        resource_id=comment_id,
-                        meta_data={
-                            "post_id": comment_info.get("post_id")
-                        },
-                        is_read=False
-                    )
+            # 如果点赞者不是评论作者，发送通知
+            if int(comment_author_id) != int(user_id):
+                like_notification = Notification(
+                    user_id=comment_author_id,
+                    type=NotificationType.COMMENT_LIKE,
+                    title="有人喜欢你的评论",
+                    body=f"{reaction_data.get('user', {}).get('username', '有人')}对你的评论表示了{get_reaction_text(reaction_type)}",
+                    sender_id=user_id,
+                    sender_name=reaction_data.get("user", {}).get("username"),
+                    sender_avatar=reaction_data.get("user", {}).get("avatar_url"),
+                    resource_type="comment",
+                    resource_id=comment_id,
+                    meta_data={
+                        "post_id": comment_info.get("post_id")
+                    },
+                    is_read=False
+                )
                     
-                    db.add(like_notification)
+                db.add(like_notification)
         
-        db.commit()
+        recipients = pending_recipients(db)
+        await db.commit()
+        await count_strategy.invalidate_inbox(*recipients)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"处理反应事件失败: {str(e)}")
 
 # 辅助函数
@@ -2,16 +2,16 @@
 
 import asyncio
 import json
-from typing import List, Dict, Any, Callable, Awaitable
+from typing import List, Dict, Any, Callable, Awaitable, Optional
 from datetime import datetime
 import logging
 
 from aiokafka import AIOKafkaConsumer
 from aiokafka.errors import KafkaConnectionError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.db.session import SessionLocal
+from app.db.session import AsyncSessionLocal
 from app.websockets.broadcaster import broadcast_to_user
 
 logger = logging.getLogger(__name__)
@@ -19,16 +19,23 @@ logger = logging.getLogger(__name__)
 class KafkaConsumer:
     """Kafka 消费者，用于接收和处理事件"""
     
-    def __init__(self, topics: List[str], handler_map: Dict[str, Callable[[Dict[str, Any], Session], Awaitable[None]]]):
+    def __init__(
+        self,
+        topics: List[str],
+        handler_map: Dict[str, Callable[[Dict[str, Any], AsyncSession], Awaitable[None]]],
+        group_id: Optional[str] = settings.KAFKA_CONSUMER_GROUP
+    ):
         """
         初始化 Kafka 消费者
         
         参数:
             topics: 要订阅的主题列表
             handler_map: 主题到处理函数的映射
+            group_id: 消费组，同组的实例分摊消息；为 None 时每个实例都收到全部消息
         """
         self.topics = topics
         self.handler_map = handler_map
+        self.group_id = group_id
         self.consumer = None
         self.running = False
         self.should_stop = False
@@ -50,9 +57,9 @@ class KafkaConsumer:
                 self.consumer = AIOKafkaConsumer(
                     *self.topics,
                     bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
-                    group_id=settings.KAFKA_CONSUMER_GROUP,
+                    group_id=self.group_id,
                     auto_offset_reset="latest",  # latest 确保只获取新消息
-                    enable_auto_commit=True,
+                    enable_auto_commit=self.group_id is not None,
                     value_deserializer=lambda m: json.loads(m.decode('utf-8'))
                 )
                 
@@ -105,12 +112,9 @@ class KafkaConsumer:
                     # 处理消息
                     if topic in self.handler_map:
                         try:
-                            # 创建数据库会话
-                            db = SessionLocal()
-                            try:
+                            # 创建异步数据库会话
+                            async with AsyncSessionLocal() as db:
                                 await self.handler_map[topic](value, db)
-                            finally:
-                                db.close()
                         except Exception as e:
                             logger.error(f"处理消息时发生错误: {str(e)}")
                 
@@ -163,7 +167,7 @@ class KafkaConsumer:
 
 
 # 创建通知处理函数
-async def process_notification(message: Dict[str, Any], db: Session):
+async def process_notification(message: Dict[str, Any], db: AsyncSession):
     """
     处理来自通知主题的消息
     """
@@ -193,7 +197,7 @@ async def process_notification(message: Dict[str, Any], db: Session):
         )
 
 # 创建帖子事件处理函数
-async def process_post_event(message: Dict[str, Any], db: Session):
+async def process_post_event(message: Dict[str, Any], db: AsyncSession):
     """
     处理来自帖子主题的消息
     """
@@ -207,7 +211,7 @@ async def process_post_event(message: Dict[str, Any], db: Session):
     await handle_post_event(message["event_type"], message["post"], db)
 
 # 创建评论事件处理函数
-async def process_comment_event(message: Dict[str, Any], db: Session):
+async def process_comment_event(message: Dict[str, Any], db: AsyncSession):
     """
     处理来自评论主题的消息
     """
@@ -221,7 +225,7 @@ async def process_comment_event(message: Dict[str, Any], db: Session):
     await handle_comment_event(message["event_type"], message["comment"], db)
 
 # 创建反应事件处理函数
-async def process_reaction_event(message: Dict[str, Any], db: Session):
+async def process_reaction_event(message: Dict[str, Any], db: AsyncSession):
     """
     处理来自反应主题的消息
     """
@@ -234,6 +238,18 @@ async def process_reaction_event(message: Dict[str, Any], db: Session):
     # 处理反应事件
     await handle_reaction_event(message["event_type"], message["reaction"], db)
 
+# 创建用户事件处理函数
+async def process_user_event(message: Dict[str, Any], db: AsyncSession):
+    """
+    处理来自用户主题的消息，失效身份缓存
+    """
+    from app.utils.identity import identity_resolver
+    
+    if message.get("type") != "user_updated" or "user_id" not in message:
+        return
+    
+    await identity_resolver.invalidate(int(message["user_id"]))
+
 # 创建 Kafka 消费者实例
 kafka_consumer = KafkaConsumer(
     topics=[
@@ -248,4 +264,13 @@ kafka_consumer = KafkaConsumer(
         settings.KAFKA_TOPIC_COMMENTS: process_comment_event,
         settings.KAFKA_TOPIC_REACTIONS: process_reaction_event
     }
+)
+
+# 用户事件用于失效进程内的身份缓存，每个实例都必须收到全部消息，因此不加入消费组
+user_event_consumer = KafkaConsumer(
+    topics=[settings.KAFKA_TOPIC_USERS],
+    handler_map={
+        settings.KAFKA_TOPIC_USERS: process_user_event
+    },
+    group_id=None
 )
\ No newline at end of file
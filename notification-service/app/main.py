@@ -9,8 +9,11 @@ from prometheus_fastapi_instrumentator import Instrumentator
 
 from app.api.api_router import api_router  # 确保从正确的地方导入api_router
 from app.core.config import settings
-from app.events.kafka_consumer import kafka_consumer
+from app.events.kafka_consumer import kafka_consumer, user_event_consumer
 from app.websockets.broadcaster import init_redis, close_redis, subscribe_to_channel
+from app.utils.http_client import user_service_client
+from app.db.session import async_engine, engine
+from app.db.metrics import register_pool_metrics
 
 # 配置日志
 logging.basicConfig(
@@ -79,6 +82,13 @@ def root():
 async def startup_event():
     logger.info("服务启动中...")
     
+    # 注册数据库连接池指标
+    register_pool_metrics(engine, "sync")
+    register_pool_metrics(async_engine.sync_engine, "async")
+    
+    # 创建用户服务HTTP连接池
+    await user_service_client.start()
+    
     # 初始化Redis连接 (异步但不等待完成)
     asyncio.create_task(init_redis())
     
@@ -88,6 +98,7 @@ async def startup_event():
     # 启动Kafka消费者 (异步但不等待完成)
     # 只尝试5次，如果还是失败，让服务继续运行
     asyncio.create_task(kafka_consumer.start(max_retries=5))
+    asyncio.create_task(user_event_consumer.start(max_retries=5))
     logger.info("服务启动完成 - 后台任务仍在运行")
 
 # 关闭事件
@@ -100,6 +111,14 @@ async def shutdown_event():
     
     # 停止Kafka消费者
     await kafka_consumer.stop()
+    await user_event_consumer.stop()
+    
+    # 关闭用户服务HTTP连接池
+    await user_service_client.close()
+    
+    # 关闭数据库连接池
+    await async_engine.dispose()
+    engine.dispose()
     
     logger.info("服务已安全关闭")
 
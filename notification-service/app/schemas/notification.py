@@ -57,11 +57,14 @@ class NotificationFilter(BaseModel):
 class NotificationCount(BaseModel):
     total: int
     unread: int
+    total_is_estimate: bool = False
+    unread_is_estimate: bool = False
 
 # 通知分页响应Schema
 class NotificationPage(BaseModel):
     items: List[Notification]
     total: int
+    total_is_estimate: bool = False  # 总数较大时为查询计划估计值
     page: int
     size: int
     pages: int
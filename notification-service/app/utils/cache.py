@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """带过期时间的进程内LRU缓存（非线程安全，仅在事件循环中使用）"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        参数:
+            maxsize: 最多缓存的条目数，超出时淘汰最久未使用的条目
+            ttl: 默认过期时间（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """获取缓存值，不存在或已过期时返回 default"""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """写入缓存值，ttl 不提供时使用默认过期时间"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """删除指定条目"""
+        self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """删除所有满足条件的条目，返回删除数量"""
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+
+_MISSING = object()
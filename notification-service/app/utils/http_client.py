@@ -0,0 +1,111 @@
+import logging
+from typing import Optional
+
+import httpx
+from prometheus_client import Gauge
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 连接池饱和度指标
+USER_SERVICE_POOL_MAX = Gauge(
+    "user_service_http_pool_max_connections",
+    "用户服务HTTP连接池允许的最大连接数",
+)
+USER_SERVICE_POOL_ACTIVE = Gauge(
+    "user_service_http_pool_active_connections",
+    "用户服务HTTP连接池中正在处理请求的连接数",
+)
+USER_SERVICE_POOL_IDLE = Gauge(
+    "user_service_http_pool_idle_connections",
+    "用户服务HTTP连接池中空闲（keep-alive）的连接数",
+)
+USER_SERVICE_POOL_PENDING = Gauge(
+    "user_service_http_pool_pending_requests",
+    "等待用户服务HTTP连接池分配连接的请求数",
+)
+
+
+class UserServiceClient:
+    """用户服务HTTP客户端，进程内共享一个连接池"""
+
+    def __init__(self):
+        """初始化客户端（连接池在 start() 中创建）"""
+        self.client: Optional[httpx.AsyncClient] = None
+        self.is_ready = False
+
+        USER_SERVICE_POOL_MAX.set(settings.USER_SERVICE_MAX_CONNECTIONS)
+        USER_SERVICE_POOL_ACTIVE.set_function(lambda: self._count_connections(idle=False))
+        USER_SERVICE_POOL_IDLE.set_function(lambda: self._count_connections(idle=True))
+        USER_SERVICE_POOL_PENDING.set_function(self._count_pending)
+
+    async def start(self):
+        """创建共享的HTTP连接池"""
+        if self.client is not None:
+            return
+
+        self.client = httpx.AsyncClient(
+            base_url=settings.USER_SERVICE_BASE_URL,
+            http2=settings.USER_SERVICE_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.USER_SERVICE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.USER_SERVICE_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.USER_SERVICE_KEEPALIVE_EXPIRY,
+            ),
+            timeout=self.default_timeout(),
+        )
+        self.is_ready = True
+        logger.info("用户服务HTTP客户端已启动")
+
+    async def close(self):
+        """关闭连接池"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            self.is_ready = False
+            logger.info("用户服务HTTP客户端已关闭")
+
+    async def get_client(self) -> httpx.AsyncClient:
+        """获取共享客户端，未启动时自动启动"""
+        if self.client is None:
+            await self.start()
+        return self.client
+
+    @staticmethod
+    def default_timeout() -> httpx.Timeout:
+        """默认的单次调用超时配置"""
+        return httpx.Timeout(
+            settings.USER_SERVICE_TIMEOUT,
+            connect=settings.USER_SERVICE_CONNECT_TIMEOUT,
+            pool=settings.USER_SERVICE_POOL_TIMEOUT,
+        )
+
+    def _get_pool(self):
+        """获取底层 httpcore 连接池（用于统计指标）"""
+        if self.client is None:
+            return None
+        transport = getattr(self.client, "_transport", None)
+        return getattr(transport, "_pool", None)
+
+    def _count_connections(self, idle: bool) -> int:
+        pool = self._get_pool()
+        if pool is None:
+            return 0
+        try:
+            return sum(1 for conn in pool.connections if conn.is_idle() == idle)
+        except Exception:
+            return 0
+
+    def _count_pending(self) -> int:
+        pool = self._get_pool()
+        if pool is None:
+            return 0
+        try:
+            return sum(1 for request in getattr(pool, "_requests", []) if request.connection is None)
+        except Exception:
+            return 0
+
+
+# 创建用户服务客户端单例
+user_service_client = UserServiceClient()
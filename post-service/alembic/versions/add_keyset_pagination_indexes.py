@@ -0,0 +1,49 @@
+"""添加键集分页索引
+
+Revision ID: 3c5e9a1d7f24
+Revises: 8b72e3a19f8e
+Create Date: 2026-10-18 10:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3c5e9a1d7f24'
+down_revision = '8b72e3a19f8e'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 帖子列表：按可见性或作者筛选后按 (created_at, id) 倒序翻页
+    op.create_index(
+        'ix_posts_visibility_created_at_id', 'posts',
+        ['visibility', sa.text('created_at DESC'), sa.text('id DESC')], unique=False
+    )
+    op.create_index(
+        'ix_posts_user_id_created_at_id', 'posts',
+        ['user_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False
+    )
+
+    # 评论列表：帖子下的顶级评论/回复、用户的评论
+    op.create_index(
+        'ix_comments_post_parent_created_at_id', 'comments',
+        ['post_id', 'parent_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False
+    )
+    op.create_index(
+        'ix_comments_user_id_created_at_id', 'comments',
+        ['user_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False
+    )
+
+    # 帖子的反应用户列表
+    op.create_index(
+        'ix_reactions_post_id_created_at_id', 'reactions',
+        ['post_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_reactions_post_id_created_at_id', table_name='reactions')
+    op.drop_index('ix_comments_user_id_created_at_id', table_name='comments')
+    op.drop_index('ix_comments_post_parent_created_at_id', table_name='comments')
+    op.drop_index('ix_posts_user_id_created_at_id', table_name='posts')
+    op.drop_index('ix_posts_visibility_created_at_id', table_name='posts')
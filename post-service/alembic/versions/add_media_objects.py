@@ -0,0 +1,31 @@
+"""添加内容寻址的媒体对象表
+
+Revision ID: 9e3b7d2c4f18
+Revises: 5d2f8c4b9e61
+Create Date: 2026-10-18 19:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9e3b7d2c4f18'
+down_revision = '5d2f8c4b9e61'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'media_objects',
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('content_type', sa.String(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('attributes', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('digest'),
+        sa.UniqueConstraint('path')
+    )
+
+def downgrade():
+    op.drop_table('media_objects')
@@ -0,0 +1,52 @@
+"""添加事务性发件箱表和搜索索引登记表
+
+Revision ID: c4a8f1e6d293
+Revises: 9e3b7d2c4f18
+Create Date: 2026-10-18 21:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8f1e6d293'
+down_revision = '9e3b7d2c4f18'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'outbox_events',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('topic', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=True),
+        sa.Column('message', sa.JSON(), nullable=False),
+        sa.Column('dispatched', sa.Boolean(), server_default=sa.text('false'), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_outbox_events_undispatched', 'outbox_events', ['id'],
+        postgresql_where=sa.text('NOT dispatched')
+    )
+
+    op.create_table(
+        'search_index_queue',
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('queued_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('indexed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('post_id')
+    )
+    op.create_index(
+        'ix_search_index_queue_pending', 'search_index_queue', ['queued_at'],
+        postgresql_where=sa.text('indexed_at IS NULL')
+    )
+    op.create_index('ix_search_index_queue_queued_at', 'search_index_queue', ['queued_at'])
+    op.create_index('ix_search_index_queue_indexed_at', 'search_index_queue', ['indexed_at'])
+
+def downgrade():
+    op.drop_index('ix_search_index_queue_indexed_at', table_name='search_index_queue')
+    op.drop_index('ix_search_index_queue_queued_at', table_name='search_index_queue')
+    op.drop_index('ix_search_index_queue_pending', table_name='search_index_queue')
+    op.drop_table('search_index_queue')
+    op.drop_index('ix_outbox_events_undispatched', table_name='outbox_events')
+    op.drop_table('outbox_events')
@@ -0,0 +1,47 @@
+"""添加反应数汇总表
+
+Revision ID: 5d2f8c4b9e61
+Revises: 3c5e9a1d7f24
+Create Date: 2026-10-18 12:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '5d2f8c4b9e61'
+down_revision = '3c5e9a1d7f24'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'reaction_counts',
+        sa.Column('target_type', sa.String(length=16), nullable=False),
+        sa.Column('target_id', sa.Integer(), nullable=False),
+        sa.Column('type',
+                  postgresql.ENUM('LIKE', 'LOVE', 'HAHA', 'WOW', 'SAD', 'ANGRY', name='reactiontype', create_type=False),
+                  nullable=False),
+        sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('target_type', 'target_id', 'type')
+    )
+
+    # 用现有反应回填
+    op.execute("""
+        INSERT INTO reaction_counts (target_type, target_id, type, count)
+        SELECT 'post', post_id, type, count(*)
+        FROM reactions
+        WHERE post_id IS NOT NULL
+        GROUP BY post_id, type
+    """)
+    op.execute("""
+        INSERT INTO reaction_counts (target_type, target_id, type, count)
+        SELECT 'comment', comment_id, type, count(*)
+        FROM reactions
+        WHERE comment_id IS NOT NULL
+        GROUP BY comment_id, type
+    """)
+
+
+def downgrade():
+    op.drop_table('reaction_counts')
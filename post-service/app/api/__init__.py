@@ -2,7 +2,7 @@
 
 from fastapi import APIRouter
 
-from app.api.endpoints import posts, comments, reactions, search, health
+from app.api.endpoints import posts, comments, reactions, search, health, uploads
 
 # Create main router
 api_router = APIRouter()
@@ -15,6 +15,7 @@ api_router.include_router(health.router, prefix="/posts/health", tags=["健康
 api_router.include_router(search.router, prefix="/search", tags=["搜索"])
 api_router.include_router(reactions.router, prefix="/reactions", tags=["反应/点赞"])
 api_router.include_router(comments.router, prefix="/comments", tags=["评论"])
+api_router.include_router(uploads.router, prefix="/posts/media/sessions", tags=["媒体上传"])
 
 # 3. Posts router last (since it has a dynamic parameter route that could catch other paths)
 api_router.include_router(posts.router, prefix="/posts", tags=["帖子"])
\ No newline at end of file
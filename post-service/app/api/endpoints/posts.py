@@ -1,19 +1,34 @@
-from typing import Any, Dict, List, Optional
-from datetime import datetime, date
-
+import asyncio
+import functools
+import mimetypes
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from datetime import datetime, date, timedelta
+
+from minio.datatypes import Object
 from fastapi import APIRouter, Depends, HTTPException, Query, Path, UploadFile, File, Form, status
-from sqlalchemy.orm import Session
-import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from app.api.deps import get_current_user, check_ownership, get_pagination_params, get_user_service_client
-from app.db.session import get_db
+from app.api.deps import get_current_user, check_ownership, get_pagination_params
+from app.db.session import get_async_db
 from app.models.post import Post, Tag, MediaType, Visibility
-from app.models.reaction import Reaction
+from app.models.reaction import ReactionType
 from app.schemas.post import (
     PostCreate, PostUpdate, Post as PostSchema, PostDetail, PostPage, PostFilter, 
-    TagInDB, UserBrief
+    TagInDB, UserBrief, MediaUploadRequest, MediaUploadResponse, MediaUploadTicket
 )
-from app.utils.storage import storage
+from app.events.outbox import add_post_event
+from app.services.media_processing import media_processor
+from app.services.reaction_state import load_user_reactions
+from app.services.tags import add_post_tags, normalize_tag_names, remove_post_tags
+from app.services.timeline import timeline_service
+from app.services.view_counter import view_counter
+from app.utils.counting import count_strategy
+from app.utils.pagination import paginate
+from app.utils.storage import UploadTooLargeError, max_upload_size, media_key_prefix, storage
+from app.utils.user_cache import user_profile_cache
 from app.core.config import settings
 
 from app.api.endpoints.search import search_posts as original_search_posts, search_posts_advanced as original_search_posts_advanced
@@ -28,9 +43,8 @@ async def search_posts_endpoint(
     user_id: Optional[int] = Query(None, description="按用户ID筛选"),
     from_date: Optional[date] = Query(None, description="起始日期"),
     to_date: Optional[date] = Query(None, description="结束日期"),
-    pagination: Dict[str, int] = Depends(get_pagination_params),
+    pagination: Dict[str, Any] = Depends(get_pagination_params),
     current_user: Dict[str, Any] = Depends(get_current_user),
-    user_client: httpx.AsyncClient = Depends(get_user_service_client)
 ) -> Any:
     """
     搜索帖子 (重定向到search.py中的功能)
@@ -43,15 +57,13 @@ async def search_posts_endpoint(
         to_date=to_date,
         pagination=pagination,
         current_user=current_user,
-        user_client=user_client
     )
 
 @router.post("/search", response_model=SearchResponse)
 async def search_posts_advanced_endpoint(
     search_request: SearchRequest,
-    pagination: Dict[str, int] = Depends(get_pagination_params),
+    pagination: Dict[str, Any] = Depends(get_pagination_params),
     current_user: Dict[str, Any] = Depends(get_current_user),
-    user_client: httpx.AsyncClient = Depends(get_user_service_client)
 ) -> Any:
     """
     高级搜索帖子
@@ -60,11 +72,23 @@ async def search_posts_advanced_endpoint(
         search_request=search_request,
         pagination=pagination,
         current_user=current_user,
-        user_client=user_client,
     )
 
 
-def build_post_schema(post: Post, user_info: Optional[Dict[str, Any]] = None, reaction: Optional[Reaction] = None) -> PostSchema:
+async def load_post(db: AsyncSession, post_id: int) -> Optional[Post]:
+    """
+    按ID获取帖子并预加载标签（异步会话不支持延迟加载）
+    """
+    result = await db.execute(
+        select(Post)
+        .options(selectinload(Post.tags))
+        .where(Post.id == post_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
+
+def build_post_schema(post: Post, user_info: Optional[Dict[str, Any]] = None, reaction_type: Optional[ReactionType] = None) -> PostSchema:
     return PostSchema(
         id=post.id,
         user_id=post.user_id,
@@ -83,13 +107,13 @@ def build_post_schema(post: Post, user_info: Optional[Dict[str, Any]] = None, re
         created_at=post.created_at,
         updated_at=post.updated_at,
         user=user_info,
-        current_user_reaction=reaction.type.value if reaction else None
+        current_user_reaction=reaction_type.value if reaction_type else None
     )
 
 @router.post("/text", response_model=PostSchema)
 async def create_text_post(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     content: str = Form(...),
     visibility: Visibility = Form(Visibility.PUBLIC),
     location: Optional[str] = Form(None),
@@ -108,91 +132,214 @@ async def create_text_post(
         media_urls=[]
     )
 
-    for tag_name in tag_names.split(","):
-        tag_name = tag_name.strip().lower()
-        if not tag_name:
-            continue
-        tag = db.query(Tag).filter(Tag.name == tag_name).first()
-        if not tag:
-            tag = Tag(name=tag_name, post_count=1)
-            db.add(tag)
-        else:
-            tag.post_count += 1
-        post.tags.append(tag)
-
     db.add(post)
-    db.commit()
-    db.refresh(post)
+    await db.flush()
+    await add_post_tags(db, post.id, normalize_tag_names((tag_names or "").split(",")))
+    add_post_event(db, "created", post, current_user)
+    await db.commit()
+    post = await load_post(db, post.id)
+    await count_strategy.invalidate("posts")
+    await timeline_service.schedule_fan_out(post.id, post.user_id, post.visibility)
 
     return build_post_schema(post, user_info=current_user)
 
+def resolve_media_type(content_type: Optional[str], current: Optional[MediaType]) -> MediaType:
+    """根据内容类型确定媒体类型，同一帖子不允许混合图片和视频"""
+    if content_type in settings.ALLOWED_IMAGE_TYPES:
+        media_type = MediaType.IMAGE
+    elif content_type in settings.ALLOWED_VIDEO_TYPES:
+        media_type = MediaType.VIDEO
+    else:
+        raise HTTPException(status_code=400, detail=f"不支持的文件类型: {content_type}")
+
+    if current and current != media_type:
+        raise HTTPException(status_code=400, detail="不能混合上传不同类型的媒体文件")
+    return media_type
+
+@router.post("/media/uploads", response_model=MediaUploadResponse)
+async def create_media_uploads(
+    *,
+    upload_in: MediaUploadRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> Any:
+    """
+    申请媒体直传地址
+
+    返回每个文件的预签名PUT地址，客户端直接上传到对象存储，
+    然后把 object_key 提交给 POST /posts/media 创建帖子
+    """
+    if len(upload_in.files) > settings.MAX_MEDIA_FILES_PER_POST:
+        raise HTTPException(status_code=400, detail=f"单个帖子最多上传 {settings.MAX_MEDIA_FILES_PER_POST} 个文件")
+
+    media_type = None
+    for file in upload_in.files:
+        media_type = resolve_media_type(file.content_type, media_type)
+        if file.size > max_upload_size(file.content_type):
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=str(UploadTooLargeError(max_upload_size(file.content_type))),
+            )
+
+    expires = timedelta(seconds=settings.MEDIA_UPLOAD_URL_EXPIRE_SECONDS)
+    expires_at = datetime.utcnow() + expires
+    uploads = []
+    for file in upload_in.files:
+        extension = mimetypes.guess_extension(file.content_type) or ""
+        object_key = f"{media_key_prefix(current_user['id'])}{uuid.uuid4().hex}{extension}"
+        uploads.append(MediaUploadTicket(
+            object_key=object_key,
+            upload_url=storage.presigned_put_url(object_key, expires),
+            headers={"Content-Type": file.content_type},
+            expires_at=expires_at,
+        ))
+
+    return MediaUploadResponse(uploads=uploads)
+
+async def verify_uploaded_media(object_keys: List[str], user_id: int) -> Tuple[List[Dict[str, Any]], List[Object]]:
+    """
+    通过HEAD请求校验直传的对象：归属、是否重复、是否存在、大小和内容类型
+
+    未被引用的不合格对象会被删除。
+
+    返回:
+        (与 object_keys 顺序一致的媒体信息列表, 对象信息列表，用于登记引用)
+    """
+    prefix = media_key_prefix(user_id)
+    if any(not key.startswith(prefix) or ".." in key for key in object_keys):
+        raise HTTPException(status_code=403, detail="无权使用该媒体文件")
+    if len(set(object_keys)) != len(object_keys):
+        raise HTTPException(status_code=400, detail="同一个媒体文件不能重复提交")
+
+    objects = await asyncio.gather(*(storage.stat_file(key) for key in object_keys))
+
+    media_type = None
+    for key, obj in zip(object_keys, objects):
+        if obj is None:
+            raise HTTPException(status_code=400, detail=f"媒体文件尚未上传: {key}")
+        if obj.size > max_upload_size(obj.content_type):
+            await storage.discard_unreferenced(key)
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=str(UploadTooLargeError(max_upload_size(obj.content_type))),
+            )
+        try:
+            media_type = resolve_media_type(obj.content_type, media_type)
+        except HTTPException:
+            await storage.discard_unreferenced(key)
+            raise
+
+    return [{"url": storage.get_object_url(key), "type": media_type.value} for key in object_keys], objects
+
+def read_upload(file: UploadFile) -> Callable[[], Awaitable[bytes]]:
+    """返回读取整个上传文件的协程函数"""
+    async def load() -> bytes:
+        await file.seek(0)
+        return await file.read()
+    return load
+
+async def add_image_derivatives(
+    file_list: List[Dict[str, Any]], loaders: List[Callable[[], Awaitable[bytes]]]
+) -> None:
+    """
+    为图片生成衍生图和 blurhash 并写入对应的媒体条目，处理失败的图片只保留原图
+
+    相同内容之前已处理过时直接复用保存的结果，不再读取和解码
+    """
+    paths = [storage.object_path(media["url"]) for media in file_list]
+    processed = await storage.get_media_attributes(paths)
+
+    async def process(path: str, load: Callable[[], Awaitable[bytes]]) -> Optional[Dict[str, Any]]:
+        if path in processed:
+            return processed[path]
+        result = await media_processor.process_image(load, path, settings.IMAGE_DERIVATIVE_WIDTHS)
+        if result:
+            await storage.set_media_attributes(path, result)
+        return result
+
+    results = await asyncio.gather(*(process(path, load) for path, load in zip(paths, loaders)))
+    for media, result in zip(file_list, results):
+        if result:
+            media.update(result)
+
 @router.post("/media", response_model=PostSchema)
 async def create_media_post(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     visibility: Visibility = Form(Visibility.PUBLIC),
     location: Optional[str] = Form(None),
     tag_names: Optional[str] = Form(""),
-    files: List[UploadFile] = File(...),
+    object_keys: Optional[List[str]] = Form(None),
+    files: Optional[List[UploadFile]] = File(None),
     current_user: Dict[str, Any] = Depends(get_current_user),
 ) -> Any:
-    if not files or not any(file.filename for file in files):
+    """
+    创建媒体帖子
+
+    推荐先通过 POST /posts/media/uploads 直传到对象存储，再提交 object_keys；
+    仍兼容通过 files 经本服务上传，两者不能同时使用
+    """
+    object_keys = [key for key in (object_keys or []) if key]
+    files = [file for file in (files or []) if file.filename]
+    if object_keys and files:
+        raise HTTPException(status_code=400, detail="不能同时提交 object_keys 和 files")
+    if not object_keys and not files:
         raise HTTPException(status_code=400, detail="请上传至少一个有效文件")
+    if len(object_keys) + len(files) > settings.MAX_MEDIA_FILES_PER_POST:
+        raise HTTPException(status_code=400, detail=f"单个帖子最多上传 {settings.MAX_MEDIA_FILES_PER_POST} 个文件")
 
-    post = Post(
-        user_id=current_user["id"],
-        visibility=visibility,
-        location=location,
-        content=None,
-        media_type=MediaType.NONE,
-        media_urls=[]
-    )
+    if object_keys:
+        file_list, uploaded_objects = await verify_uploaded_media(object_keys, current_user["id"])
+    else:
+        media_type = None
 
-    file_list = []
-    media_type = None
+        # 先校验全部文件，再并发上传
+        for file in files:
+            media_type = resolve_media_type(file.content_type, media_type)
 
-    for file in files:
-        if not file.filename:
-            continue
-
-        if file.content_type in settings.ALLOWED_IMAGE_TYPES:
-            if media_type and media_type != MediaType.IMAGE:
-                raise HTTPException(status_code=400, detail="不能混合上传不同类型的媒体文件")
-            media_type = MediaType.IMAGE
-        elif file.content_type in settings.ALLOWED_VIDEO_TYPES:
-            if media_type and media_type != MediaType.VIDEO:
-                raise HTTPException(status_code=400, detail="不能混合上传不同类型的媒体文件")
-            media_type = MediaType.VIDEO
-        else:
-            raise HTTPException(status_code=400, detail=f"不支持的文件类型: {file.content_type}")
-
-        object_name = f"user_{current_user['id']}/post_{datetime.now().strftime('%Y%m%d%H%M%S')}_{len(file_list)}"
-        file_url = await storage.upload_file(file=file, folder="posts", object_name=object_name, tags={"user_id": str(current_user["id"])})
-        file_info = {"url": file_url, "type": media_type.value}
-        file_list.append(file_info)
-
-    post.media_type = media_type or MediaType.NONE
-    post.media_urls = file_list
-
-    for tag_name in tag_names.split(","):
-        tag_name = tag_name.strip().lower()
-        if not tag_name:
-            continue
-        tag = db.query(Tag).filter(Tag.name == tag_name).first()
-        if not tag:
-            tag = Tag(name=tag_name, post_count=1)
-            db.add(tag)
-        else:
-            tag.post_count += 1
-        post.tags.append(tag)
+        # 按内容寻址存储，重复的内容不再上传；任一文件失败时已上传的对象会被释放
+        try:
+            file_urls = await storage.upload_files(files, folder="posts", tags={"user_id": str(current_user["id"])})
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+        file_list = [{"url": file_url, "type": media_type.value} for file_url in file_urls]
 
-    db.add(post)
-    db.commit()
-    db.refresh(post)
+    # 从这里开始任一步骤失败（生成衍生图、保存帖子）都要释放已上传的对象
+    try:
+        if file_list[0]["type"] == MediaType.IMAGE.value:
+            if object_keys:
+                loaders = [functools.partial(storage.get_bytes, key) for key in object_keys]
+            else:
+                loaders = [read_upload(file) for file in files]
+            await add_image_derivatives(file_list, loaders)
+
+        post = Post(
+            user_id=current_user["id"],
+            visibility=visibility,
+            location=location,
+            content=None,
+            media_type=MediaType(file_list[0]["type"]),
+            media_urls=file_list
+        )
+        db.add(post)
+        await db.flush()
+        await add_post_tags(db, post.id, normalize_tag_names((tag_names or "").split(",")))
+        if object_keys:
+            # 直传对象随帖子一起登记引用，多个帖子引用同一对象时删除其中一个不会删掉对象
+            await storage.acquire_uploaded(db, uploaded_objects)
+        add_post_event(db, "created", post, current_user)
+        await db.commit()
+    except Exception:
+        # 帖子未保存，释放本次经服务上传的对象（直传对象的登记随事务回滚，对象保留，客户端可重试）
+        await db.rollback()
+        if files:
+            await storage.delete_files([storage.object_path(media["url"]) for media in file_list])
+        raise
+    post = await load_post(db, post.id)
+    await count_strategy.invalidate("posts")
+    await timeline_service.schedule_fan_out(post.id, post.user_id, post.visibility)
 
     return build_post_schema(post, user_info=current_user)
 
-
 # @router.post("/", response_model=PostSchema)
 # async def create_post(
 #     *,
@@ -277,95 +424,131 @@ async def create_media_post(
 
 @router.get("/", response_model=PostPage)
 async def read_posts(
-    db: Session = Depends(get_db),
-    pagination: Dict[str, int] = Depends(get_pagination_params),
+    db: AsyncSession = Depends(get_async_db),
+    pagination: Dict[str, Any] = Depends(get_pagination_params),
     user_id: Optional[int] = Query(None),
     tag: Optional[str] = Query(None),
     visibility: Optional[Visibility] = Query(None),
     current_user: Dict[str, Any] = Depends(get_current_user),
-    user_client: httpx.AsyncClient = Depends(get_user_service_client),
 ) -> Any:
-    page = pagination["page"]
-    size = pagination["size"]
-    skip = (page - 1) * size
-
-    query = db.query(Post)
+    query = select(Post).options(selectinload(Post.tags))
 
     if user_id:
-        query = query.filter(Post.user_id == user_id)
+        query = query.where(Post.user_id == user_id)
     if tag:
-        query = query.join(Post.tags).filter(Tag.name == tag)
+        query = query.join(Post.tags).where(Tag.name == tag)
     if visibility:
         if visibility == Visibility.PRIVATE and not (current_user["id"] == user_id or current_user.get("is_superuser")):
             raise HTTPException(status_code=403, detail="无权查看私有帖子")
-        query = query.filter(Post.visibility == visibility)
+        query = query.where(Post.visibility == visibility)
     else:
-        query = query.filter((Post.visibility == Visibility.PUBLIC) | (Post.user_id == current_user["id"]))
+        query = query.where((Post.visibility == Visibility.PUBLIC) | (Post.user_id == current_user["id"]))
+
+    count_filters = {
+        "user_id": user_id,
+        "tag": tag,
+        "visibility": visibility,
+        # 未指定可见性时结果包含当前用户自己的非公开帖子
+        "viewer": None if visibility else current_user["id"],
+    }
+    posts, page_info = await paginate(
+        db, query, pagination, Post.created_at, Post.id,
+        count_scope="posts", count_filters=count_filters,
+    )
+
+    users = await user_profile_cache.get_many(post.user_id for post in posts)
+    reactions = await load_user_reactions(db, current_user["id"], post_ids=[post.id for post in posts])
+
+    items = [
+        build_post_schema(post, user_info=users.get(post.user_id), reaction_type=reactions.posts.get(post.id))
+        for post in posts
+    ]
+
+    return {"items": items, **page_info}
 
-    query = query.order_by(Post.created_at.desc())
-    total = query.count()
-    posts = query.offset(skip).limit(size).all()
 
-    user_ids = list(set(post.user_id for post in posts))
-    users = {}
-    if user_ids:
+@router.get("/feed", response_model=PostPage)
+async def read_feed(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    size: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> Any:
+    """
+    获取首页时间线（自己和关注的人的帖子，新到旧）
+
+    帖子ID从预先写入的时间线缓存读取，再一次查询批量加载帖子
+    """
+    before_id = None
+    if cursor:
         try:
-            response = await user_client.get("/users/batch", params={"ids": ",".join(map(str, user_ids))})
-            if response.status_code == 200:
-                users = {user["id"]: user for user in response.json()}
-        except httpx.RequestError:
-            pass
+            before_id = int(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+
+    post_ids, has_more = await timeline_service.read(db, current_user["id"], before_id, size)
+
+    posts = {}
+    if post_ids:
+        result = await db.execute(select(Post).options(selectinload(Post.tags)).where(Post.id.in_(post_ids)))
+        posts = {post.id: post for post in result.scalars().all()}
+    # 保持时间线顺序；跳过已删除或扇出后改为仅自己可见的帖子
+    ordered = [
+        posts[post_id] for post_id in post_ids
+        if post_id in posts and (posts[post_id].visibility != Visibility.PRIVATE or posts[post_id].user_id == current_user["id"])
+    ]
 
-    items = []
-    for post in posts:
-        reaction = db.query(Reaction).filter(Reaction.post_id == post.id, Reaction.user_id == current_user["id"]).first()
-        post_dict = build_post_schema(post, user_info=users.get(post.user_id), reaction=reaction)
-        items.append(post_dict)
+    users = await user_profile_cache.get_many(post.user_id for post in ordered)
+    reactions = await load_user_reactions(db, current_user["id"], post_ids=[post.id for post in ordered])
 
-    pages = (total + size - 1) // size
-    return {"items": items, "total": total, "page": page, "size": size, "pages": pages}
+    items = [
+        build_post_schema(post, user_info=users.get(post.user_id), reaction_type=reactions.posts.get(post.id))
+        for post in ordered
+    ]
+
+    return {
+        "items": items,
+        "size": size,
+        "next_cursor": str(post_ids[-1]) if has_more else None,
+    }
 
 
 @router.get("/{post_id}", response_model=PostDetail)
 async def read_post(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     post_id: int = Path(..., gt=0),
     current_user: Dict[str, Any] = Depends(get_current_user),
-    user_client: httpx.AsyncClient = Depends(get_user_service_client),
 ) -> Any:
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await load_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="帖子不存在")
 
     if post.visibility != Visibility.PUBLIC and post.user_id != current_user["id"] and not current_user.get("is_superuser"):
         raise HTTPException(status_code=403, detail="无权查看该帖子")
 
-    post.view_count += 1
-    db.commit()
+    # 浏览数由后台任务批量写回，读取帖子不开写事务
+    view = await view_counter.record(post.id, current_user["id"])
 
-    user_info = None
-    try:
-        response = await user_client.get(f"/users/id/{post.user_id}")
-        if response.status_code == 200:
-            user_info = response.json()
-    except httpx.RequestError:
-        pass
-
-    reaction = db.query(Reaction).filter(Reaction.post_id == post.id, Reaction.user_id == current_user["id"]).first()
-    post_detail = build_post_schema(post, user_info=user_info, reaction=reaction)
+    user_info = await user_profile_cache.get_one(post.user_id)
+
+    reactions = await load_user_reactions(db, current_user["id"], post_ids=[post.id])
+    post_schema = build_post_schema(post, user_info=user_info, reaction_type=reactions.posts.get(post.id))
+    post_detail = PostDetail(**post_schema.model_dump(), unique_view_count=view.unique_viewers)
+    post_detail.view_count += view.pending
     return post_detail
 
 
 @router.put("/{post_id}", response_model=PostSchema)
 async def update_post(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     post_id: int = Path(..., gt=0),
     post_in: PostUpdate,
     current_user: Dict[str, Any] = Depends(get_current_user),
 ) -> Any:
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await load_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="帖子不存在")
 
@@ -373,25 +556,14 @@ async def update_post(
         raise HTTPException(status_code=403, detail="无权修改该帖子")
 
     update_data = post_in.dict(exclude_unset=True)
+    tags_changed = "tag_names" in update_data
 
-    if "tag_names" in update_data:
-        for tag in post.tags:
-            tag.post_count -= 1
-            if tag.post_count <= 0:
-                db.delete(tag)
-        post.tags = []
-
-        for tag_name in update_data["tag_names"]:
-            tag_name = tag_name.strip().lower()
-            if not tag_name:
-                continue
-            tag = db.query(Tag).filter(Tag.name == tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name, post_count=1)
-                db.add(tag)
-            else:
-                tag.post_count += 1
-            post.tags.append(tag)
+    if tags_changed:
+        # 只处理增删的标签，未变化的标签不改动计数
+        current_names = {tag.name for tag in post.tags}
+        new_names = normalize_tag_names(update_data["tag_names"] or [])
+        await remove_post_tags(db, post.id, sorted(current_names - set(new_names)))
+        await add_post_tags(db, post.id, [name for name in new_names if name not in current_names])
 
         del update_data["tag_names"]
 
@@ -400,8 +572,11 @@ async def update_post(
 
     post.is_edited = True
     db.add(post)
-    db.commit()
-    db.refresh(post)
+    add_post_event(db, "updated", post, current_user)
+    await db.commit()
+    post = await load_post(db, post.id)
+    if "visibility" in update_data or tags_changed:
+        await count_strategy.invalidate("posts")
 
     return build_post_schema(post, user_info=current_user)
 
@@ -409,11 +584,11 @@ async def update_post(
 @router.post("/{post_id}/pin", response_model=PostSchema)
 async def pin_post(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     post_id: int = Path(..., gt=0),
     current_user: Dict[str, Any] = Depends(get_current_user),
 ) -> Any:
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await load_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="帖子不存在")
 
@@ -422,7 +597,7 @@ async def pin_post(
 
     post.is_pinned = not post.is_pinned
     db.add(post)
-    db.commit()
-    db.refresh(post)
+    await db.commit()
+    post = await load_post(db, post.id)
 
     return build_post_schema(post, user_info=current_user)
@@ -1,119 +1,122 @@
 from typing import Any, Dict, List, Optional
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Path, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Response, status
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
 
-from app.api.deps import get_current_user, get_user_service_client
-from app.db.session import get_db
+from app.api.deps import get_current_user
+from app.db.session import get_async_db
 from app.models.post import Post
 from app.models.comment import Comment
-from app.models.reaction import Reaction, ReactionType
+from app.models.reaction import Reaction, ReactionCounter, ReactionType
 from app.schemas.reaction import (
     ReactionCreate, ReactionUpdate, Reaction as ReactionSchema,
-    ReactionSummary, ReactionCount
+    ReactionSummary, ReactionCount, UserReactionState
 )
 from app.core.config import settings
+from app.events.outbox import add_reaction_event
+from app.services.counters import apply_counter_delta, apply_reaction_count_delta
+from app.services.reaction_state import load_user_reactions
+from app.services.reaction_toggle import toggle_reaction
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.user_cache import user_profile_cache
 
 router = APIRouter()
 
-@router.post("/", response_model=ReactionSchema)
+@router.post("/", response_model=Optional[ReactionSchema])
 async def create_or_update_reaction(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     reaction_in: ReactionCreate,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
     """
     创建或更新反应（点赞、喜欢等）
+
+    已有相同类型的反应时取消反应并返回空；反应的增删改和点赞数更新在一条语句中完成
     """
-    # 验证目标存在（帖子或评论）
     if reaction_in.post_id:
-        target = db.query(Post).filter(Post.id == reaction_in.post_id).first()
-        if not target:
-            raise HTTPException(
-                status_code=404,
-                detail="帖子不存在"
-            )
-        target_type = "post"
+        target_type, target_id = "post", reaction_in.post_id
     elif reaction_in.comment_id:
-        target = db.query(Comment).filter(Comment.id == reaction_in.comment_id).first()
-        if not target:
-            raise HTTPException(
-                status_code=404,
-                detail="评论不存在"
-            )
-        target_type = "comment"
+        target_type, target_id = "comment", reaction_in.comment_id
     else:
         raise HTTPException(
             status_code=400,
             detail="必须指定帖子ID或评论ID"
         )
     
-    # 检查是否已存在反应
-    if target_type == "post":
-        existing_reaction = db.query(Reaction).filter(
-            Reaction.post_id == reaction_in.post_id,
-            Reaction.user_id == current_user["id"]
-        ).first()
-    else:
-        existing_reaction = db.query(Reaction).filter(
-            Reaction.comment_id == reaction_in.comment_id,
-            Reaction.user_id == current_user["id"]
-        ).first()
+    result = await toggle_reaction(db, current_user["id"], reaction_in.type, target_type, target_id)
     
-    # 如果已存在且类型相同，则删除（取消反应）
-    if existing_reaction and existing_reaction.type == reaction_in.type:
-        db.delete(existing_reaction)
-        
-        # 更新目标的点赞数
-        if target_type == "post":
-            target.like_count = max(0, target.like_count - 1)
-        else:
-            target.like_count = max(0, target.like_count - 1)
-            
-        db.add(target)
-        db.commit()
-        
-        # 返回删除后的空反应
-        return None
+    # 验证目标存在（帖子或评论）
+    if not result.target_found:
+        await db.rollback()
+        raise HTTPException(
+            status_code=404,
+            detail="帖子不存在" if target_type == "post" else "评论不存在"
+        )
     
-    # 如果已存在但类型不同，则更新类型
-    if existing_reaction:
-        existing_reaction.type = reaction_in.type
-        db.add(existing_reaction)
-        db.commit()
-        db.refresh(existing_reaction)
-        return existing_reaction
+    if result.reaction is not None:
+        add_reaction_event(db, "created" if result.delta > 0 else "updated", result.reaction, current_user)
+    else:
+        add_reaction_event(db, "deleted", {
+            "user_id": current_user["id"],
+            "type": reaction_in.type,
+            f"{target_type}_id": target_id,
+        }, current_user)
+    await db.commit()
     
-    # 否则创建新反应
-    reaction = Reaction(
-        user_id=current_user["id"],
-        type=reaction_in.type,
-        post_id=reaction_in.post_id,
-        comment_id=reaction_in.comment_id
+    # 取消反应时返回空
+    return result.reaction
+
+def parse_id_list(ids: Optional[str], name: str) -> List[int]:
+    """
+    解析逗号分隔的ID列表
+    """
+    if not ids:
+        return []
+    try:
+        id_list = [int(id.strip()) for id in ids.split(",") if id.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"无效的{name}格式"
+        )
+    if len(id_list) > settings.MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{name}数量不能超过{settings.MAX_PAGE_SIZE}个"
+        )
+    return id_list
+
+@router.get("/me", response_model=UserReactionState)
+async def read_my_reactions(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    post_ids: Optional[str] = Query(None, description="帖子ID列表，以逗号分隔"),
+    comment_ids: Optional[str] = Query(None, description="评论ID列表，以逗号分隔"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> Any:
+    """
+    批量获取当前用户对多个帖子和评论的反应
+    """
+    state = await load_user_reactions(
+        db,
+        current_user["id"],
+        post_ids=parse_id_list(post_ids, "帖子ID"),
+        comment_ids=parse_id_list(comment_ids, "评论ID"),
     )
     
-    db.add(reaction)
-    
-    # 更新目标的点赞数
-    if target_type == "post":
-        target.like_count += 1
-    else:
-        target.like_count += 1
-        
-    db.add(target)
-    db.commit()
-    db.refresh(reaction)
-    
-    return reaction
+    return {
+        "posts": state.posts,
+        "comments": state.comments
+    }
 
 @router.get("/post/{post_id}/summary", response_model=ReactionSummary)
 async def get_post_reaction_summary(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     post_id: int = Path(..., gt=0),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
@@ -121,26 +124,29 @@ async def get_post_reaction_summary(
     获取帖子的反应（点赞等）统计
     """
     # 验证帖子是否存在
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.get(Post, post_id)
     if not post:
         raise HTTPException(
             status_code=404,
             detail="帖子不存在"
         )
     
-    # 获取反应统计
-    reactions_count = db.query(
-        Reaction.type, 
-        func.count(Reaction.id).label("count")
-    ).filter(
-        Reaction.post_id == post_id
-    ).group_by(Reaction.type).all()
+    # 获取反应统计（读取预先聚合的反应数，行数不超过反应类型数）
+    reactions_count = (await db.execute(
+        select(ReactionCounter.type, ReactionCounter.count).where(
+            ReactionCounter.target_type == "post",
+            ReactionCounter.target_id == post_id,
+            ReactionCounter.count > 0
+        )
+    )).all()
     
     # 获取当前用户的反应
-    user_reaction = db.query(Reaction).filter(
-        Reaction.post_id == post_id,
-        Reaction.user_id == current_user["id"]
-    ).first()
+    user_reaction = (await db.execute(
+        select(Reaction).where(
+            Reaction.post_id == post_id,
+            Reaction.user_id == current_user["id"]
+        )
+    )).scalars().first()
     
     # 构建返回结果
     counts = [
@@ -160,7 +166,7 @@ async def get_post_reaction_summary(
 @router.get("/comment/{comment_id}/summary", response_model=ReactionSummary)
 async def get_comment_reaction_summary(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     comment_id: int = Path(..., gt=0),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
@@ -168,26 +174,29 @@ async def get_comment_reaction_summary(
     获取评论的反应（点赞等）统计
     """
     # 验证评论是否存在
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
+    comment = await db.get(Comment, comment_id)
     if not comment:
         raise HTTPException(
             status_code=404,
             detail="评论不存在"
         )
     
-    # 获取反应统计
-    reactions_count = db.query(
-        Reaction.type, 
-        func.count(Reaction.id).label("count")
-    ).filter(
-        Reaction.comment_id == comment_id
-    ).group_by(Reaction.type).all()
+    # 获取反应统计（读取预先聚合的反应数，行数不超过反应类型数）
+    reactions_count = (await db.execute(
+        select(ReactionCounter.type, ReactionCounter.count).where(
+            ReactionCounter.target_type == "comment",
+            ReactionCounter.target_id == comment_id,
+            ReactionCounter.count > 0
+        )
+    )).all()
     
     # 获取当前用户的反应
-    user_reaction = db.query(Reaction).filter(
-        Reaction.comment_id == comment_id,
-        Reaction.user_id == current_user["id"]
-    ).first()
+    user_reaction = (await db.execute(
+        select(Reaction).where(
+            Reaction.comment_id == comment_id,
+            Reaction.user_id == current_user["id"]
+        )
+    )).scalars().first()
     
     # 构建返回结果
     counts = [
@@ -207,19 +216,22 @@ async def get_comment_reaction_summary(
 @router.get("/post/{post_id}/users", response_model=List[Dict[str, Any]])
 async def get_post_reaction_users(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     post_id: int = Path(..., gt=0),
     reaction_type: Optional[ReactionType] = Query(None, description="筛选特定类型的反应"),
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    current_user: Dict[str, Any] = Depends(get_current_user),
-    user_client: httpx.AsyncClient = Depends(get_user_service_client)
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值，传入时忽略 skip"),
+    response: Response,
+    current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
     """
     获取对帖子做出反应的用户列表
+
+    还有更多数据时，通过响应头 X-Next-Cursor 返回下一页游标
     """
     # 验证帖子是否存在
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.get(Post, post_id)
     if not post:
         raise HTTPException(
             status_code=404,
@@ -227,14 +239,24 @@ async def get_post_reaction_users(
         )
     
     # 构建查询
-    query = db.query(Reaction).filter(Reaction.post_id == post_id)
+    query = select(Reaction).where(Reaction.post_id == post_id)
     
     # 如果指定了反应类型，应用筛选
     if reaction_type:
-        query = query.filter(Reaction.type == reaction_type)
+        query = query.where(Reaction.type == reaction_type)
+    
+    # 游标模式按 (created_at, id) 定位，否则按偏移量分页
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(tuple_(Reaction.created_at, Reaction.id) < tuple_(cursor_created_at, cursor_id))
+        skip = 0
     
-    # 按时间排序并应用分页
-    reactions = query.order_by(Reaction.created_at.desc()).offset(skip).limit(limit).all()
+    # 按时间排序，多取一条用于判断是否还有下一页
+    query = query.order_by(Reaction.created_at.desc(), Reaction.id.desc())
+    reactions = list((await db.execute(query.offset(skip).limit(limit + 1))).scalars().all())
+    if len(reactions) > limit:
+        reactions = reactions[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(reactions[-1].created_at, reactions[-1].id)
     
     # 获取用户ID列表
     user_ids = [reaction.user_id for reaction in reactions]
@@ -245,24 +267,13 @@ async def get_post_reaction_users(
     
     # 批量获取用户信息
     try:
-        response = await user_client.get("/users/batch", params={"ids": ",".join(map(str, user_ids))})
-        if response.status_code != 200:
-            # 如果批量获取失败，尝试单个获取
-            users = []
-            for user_id in user_ids:
-                try:
-                    user_response = await user_client.get(f"/users/id/{user_id}")
-                    if user_response.status_code == 200:
-                        users.append(user_response.json())
-                except httpx.RequestError:
-                    continue
-        else:
-            users = response.json()
+        profiles = await user_profile_cache.get_many(user_ids, raise_on_error=True)
     except httpx.RequestError:
         raise HTTPException(
             status_code=503,
             detail="无法连接到用户服务"
         )
+    users = [profiles[user_id] for user_id in dict.fromkeys(user_ids) if user_id in profiles]
     
     # 构建用户和反应类型的映射
     user_reactions = {}
@@ -278,7 +289,7 @@ async def get_post_reaction_users(
 @router.delete("/{reaction_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_reaction(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     reaction_id: int = Path(..., gt=0),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> None:
@@ -286,7 +297,7 @@ async def delete_reaction(
     删除反应（取消点赞等）
     """
     # 获取反应
-    reaction = db.query(Reaction).filter(Reaction.id == reaction_id).first()
+    reaction = await db.get(Reaction, reaction_id)
     if not reaction:
         raise HTTPException(
             status_code=404,
@@ -300,19 +311,31 @@ async def delete_reaction(
             detail="无权删除该反应"
         )
     
-    # 更新目标的点赞数
-    if reaction.post_id:
-        post = db.query(Post).filter(Post.id == reaction.post_id).first()
-        if post:
-            post.like_count = max(0, post.like_count - 1)
-            db.add(post)
-    elif reaction.comment_id:
-        comment = db.query(Comment).filter(Comment.id == reaction.comment_id).first()
-        if comment:
-            comment.like_count = max(0, comment.like_count - 1)
-            db.add(comment)
+    # 先删除反应，只有确实删除了行的请求才更新计数，并发的重复删除不会重复扣减
+    deleted = (await db.execute(
+        delete(Reaction)
+        .where(Reaction.id == reaction_id)
+        .returning(Reaction.id, Reaction.user_id, Reaction.type, Reaction.post_id, Reaction.comment_id)
+        .execution_options(synchronize_session=False)
+    )).one_or_none()
+    if deleted is None:
+        await db.rollback()
+        return None
+    
+    # 更新目标的点赞数和按类型汇总的反应数
+    if deleted.post_id:
+        await apply_counter_delta(db, Post.like_count, deleted.post_id, -1)
+        await apply_reaction_count_delta(db, "post", deleted.post_id, deleted.type, -1)
+    elif deleted.comment_id:
+        await apply_counter_delta(db, Comment.like_count, deleted.comment_id, -1)
+        await apply_reaction_count_delta(db, "comment", deleted.comment_id, deleted.type, -1)
     
-    # 删除反应
-    db.delete(reaction)
-    db.commit()
+    add_reaction_event(db, "deleted", {
+        "id": deleted.id,
+        "user_id": deleted.user_id,
+        "type": deleted.type,
+        "post_id": deleted.post_id,
+        "comment_id": deleted.comment_id,
+    }, current_user)
+    await db.commit()
     
\ No newline at end of file
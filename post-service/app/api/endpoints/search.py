@@ -5,15 +5,36 @@ from datetime import datetime, date
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Path
 from sqlalchemy.orm import Session
-import httpx
 
-from app.api.deps import get_current_user, get_pagination_params, get_user_service_client
+from app.api.deps import get_current_user, get_pagination_params
+from app.core.config import settings
 from app.db.session import get_db
 from app.utils.elasticsearch import es_service
 from app.schemas.search import SearchResponse, SearchRequest
+from app.utils.user_cache import user_profile_cache
 
 router = APIRouter()
 
+async def attach_users(items: List[Dict[str, Any]]) -> None:
+    """
+    为搜索结果批量附加作者信息（优先读取用户资料缓存）
+    """
+    users = await user_profile_cache.get_many(item.get("user_id") for item in items)
+    for item in items:
+        user_id = item.get("user_id")
+        if user_id in users:
+            item["user"] = users[user_id]
+
+def check_result_window(pagination: Dict[str, Any]) -> None:
+    """
+    页码模式的 from + size 不能超过 max_result_window，更深的翻页需使用游标模式
+    """
+    if pagination["mode"] == "page" and pagination["page"] * pagination["size"] > settings.SEARCH_MAX_RESULT_WINDOW:
+        raise HTTPException(
+            status_code=400,
+            detail=f"页码模式最多返回前 {settings.SEARCH_MAX_RESULT_WINDOW} 条结果，更深的翻页请使用游标模式（mode=cursor）"
+        )
+
 @router.get("/", response_model=SearchResponse)
 async def search_posts(
     query: str = Query(None, description="搜索关键词"),
@@ -21,14 +42,17 @@ async def search_posts(
     user_id: Optional[int] = Query(None, description="按用户ID筛选"),
     from_date: Optional[date] = Query(None, description="起始日期"),
     to_date: Optional[date] = Query(None, description="结束日期"),
-    pagination: Dict[str, int] = Depends(get_pagination_params),
-    current_user: Dict[str, Any] = Depends(get_current_user),
-    user_client: httpx.AsyncClient = Depends(get_user_service_client)
+    pagination: Dict[str, Any] = Depends(get_pagination_params),
+    current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
     """
     搜索帖子
+
+    页码模式（mode=page）最多翻到前 SEARCH_MAX_RESULT_WINDOW 条；
+    游标模式（mode=cursor）在时间点快照上用 search_after 翻页，适合无限滚动，深度不限
     """
     # 计算分页参数
+    check_result_window(pagination)
     page = pagination["page"]
     size = pagination["size"]
     
@@ -50,50 +74,28 @@ async def search_posts(
         from_date=from_date_str,
         to_date=to_date_str,
         page=page,
-        size=size
+        size=size,
+        cursor_mode=pagination["mode"] == "cursor",
+        cursor=pagination["cursor"],
+        include_total=pagination["include_total"]
     )
     
-    # 如果需要，获取用户信息
-    if search_results["items"]:
-        try:
-            # 收集所有用户ID
-            user_ids = set()
-            for item in search_results["items"]:
-                if "user_id" in item and item["user_id"]:
-                    user_ids.add(item["user_id"])
-            
-            if user_ids:
-                # 批量获取用户信息
-                user_id_list = ",".join(map(str, user_ids))
-                response = await user_client.get("/users/batch", params={"ids": user_id_list})
-                
-                if response.status_code == 200:
-                    users = response.json()
-                    users_dict = {user["id"]: user for user in users}
-                    
-                    # 为搜索结果添加完整的用户信息
-                    for item in search_results["items"]:
-                        user_id = item.get("user_id")
-                        if user_id in users_dict:
-                            item["user"] = users_dict[user_id]
-        
-        except Exception as e:
-            # 记录错误但继续处理
-            print(f"获取用户信息失败: {str(e)}")
+    # 为搜索结果添加完整的用户信息
+    await attach_users(search_results["items"])
     
     return search_results
 
 @router.post("/", response_model=SearchResponse)
 async def search_posts_advanced(
     search_request: SearchRequest,
-    pagination: Dict[str, int] = Depends(get_pagination_params),
-    current_user: Dict[str, Any] = Depends(get_current_user),
-    user_client: httpx.AsyncClient = Depends(get_user_service_client)
+    pagination: Dict[str, Any] = Depends(get_pagination_params),
+    current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Any:
     """
     高级搜索帖子（POST请求，支持更复杂的搜索条件）
     """
     # 计算分页参数
+    check_result_window(pagination)
     page = pagination["page"]
     size = pagination["size"]
     
@@ -115,35 +117,13 @@ async def search_posts_advanced(
         from_date=from_date_str,
         to_date=to_date_str,
         page=page,
-        size=size
+        size=size,
+        cursor_mode=pagination["mode"] == "cursor",
+        cursor=pagination["cursor"],
+        include_total=pagination["include_total"]
     )
     
-    # 如果需要，获取用户信息
-    if search_results["items"]:
-        try:
-            # 收集所有用户ID
-            user_ids = set()
-            for item in search_results["items"]:
-                if "user_id" in item and item["user_id"]:
-                    user_ids.add(item["user_id"])
-            
-            if user_ids:
-                # 批量获取用户信息
-                user_id_list = ",".join(map(str, user_ids))
-                response = await user_client.get("/users/batch", params={"ids": user_id_list})
-                
-                if response.status_code == 200:
-                    users = response.json()
-                    users_dict = {user["id"]: user for user in users}
-                    
-                    # 为搜索结果添加完整的用户信息
-                    for item in search_results["items"]:
-                        user_id = item.get("user_id")
-                        if user_id in users_dict:
-                            item["user"] = users_dict[user_id]
-        
-        except Exception as e:
-            # 记录错误但继续处理
-            print(f"获取用户信息失败: {str(e)}")
+    # 为搜索结果添加完整的用户信息
+    await attach_users(search_results["items"])
     
     return search_results
\ No newline at end of file
@@ -0,0 +1,142 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, status
+
+from app.api.deps import get_current_user
+from app.core.config import settings
+from app.schemas.post import UploadSessionCreate, UploadSessionStatus
+from app.services.upload_sessions import (
+    UploadSession, UploadSessionError, UploadSessionUnavailable, upload_sessions
+)
+from app.utils.storage import UploadTooLargeError, max_upload_size
+
+router = APIRouter()
+
+
+def build_status(session: UploadSession, completed: bool = False) -> UploadSessionStatus:
+    """把会话状态转换为响应"""
+    return UploadSessionStatus(
+        session_id=session.session_id,
+        object_key=session.object_key,
+        size=session.size,
+        chunk_size=session.chunk_size,
+        total_chunks=session.total_chunks,
+        received_chunks=session.received,
+        offset=session.size if completed else session.offset,
+        next_chunk=None if completed else session.next_chunk,
+        completed=completed,
+    )
+
+
+def raise_unavailable():
+    raise HTTPException(status_code=503, detail="上传服务暂不可用，请稍后重试")
+
+
+def raise_not_found():
+    raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+
+
+@router.post("", response_model=UploadSessionStatus, status_code=201)
+async def create_upload_session(
+    *,
+    session_in: UploadSessionCreate,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> Any:
+    """
+    创建可续传的分块上传会话
+
+    之后按 chunk_size 切块，用 PUT /chunks/{n} 上传（可以乱序、重试），
+    中断后用 GET 查询 offset / next_chunk 继续，全部上传后调用 /complete
+    """
+    if session_in.content_type not in settings.ALLOWED_IMAGE_TYPES + settings.ALLOWED_VIDEO_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的文件类型: {session_in.content_type}")
+    limit = max_upload_size(session_in.content_type)
+    if session_in.size > limit:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(UploadTooLargeError(limit)))
+
+    try:
+        session = await upload_sessions.create(
+            current_user["id"], session_in.filename, session_in.content_type, session_in.size
+        )
+    except UploadSessionUnavailable:
+        raise_unavailable()
+    return build_status(session)
+
+
+@router.get("/{session_id}", response_model=UploadSessionStatus)
+async def get_upload_session(
+    *,
+    session_id: str = Path(...),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> Any:
+    """查询已收到的块和可续传的位置"""
+    try:
+        session = await upload_sessions.get(session_id, current_user["id"])
+    except UploadSessionUnavailable:
+        raise_unavailable()
+    if session is None:
+        raise_not_found()
+    return build_status(session)
+
+
+@router.put("/{session_id}/chunks/{number}", response_model=UploadSessionStatus)
+async def put_upload_chunk(
+    *,
+    request: Request,
+    session_id: str = Path(...),
+    number: int = Path(..., ge=1),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> Any:
+    """上传第 number 块（请求体为块的原始字节），重复上传同一块会覆盖"""
+    # 块大小有上限，读入内存后作为一个分片上传
+    data = bytearray()
+    async for piece in request.stream():
+        data.extend(piece)
+        if len(data) > settings.UPLOAD_CHUNK_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"块大小不能超过 {settings.UPLOAD_CHUNK_SIZE} 字节",
+            )
+
+    try:
+        session = await upload_sessions.put_chunk(session_id, current_user["id"], number, bytes(data))
+    except UploadSessionUnavailable:
+        raise_unavailable()
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if session is None:
+        raise_not_found()
+    return build_status(session)
+
+
+@router.post("/{session_id}/complete", response_model=UploadSessionStatus)
+async def complete_upload_session(
+    *,
+    session_id: str = Path(...),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> Any:
+    """合并所有块，返回的 object_key 可用于 POST /posts/media"""
+    try:
+        session = await upload_sessions.complete(session_id, current_user["id"])
+    except UploadSessionUnavailable:
+        raise_unavailable()
+    except UploadSessionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if session is None:
+        raise_not_found()
+    return build_status(session, completed=True)
+
+
+@router.delete("/{session_id}", status_code=204)
+async def abort_upload_session(
+    *,
+    session_id: str = Path(...),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> None:
+    """放弃上传"""
+    try:
+        found = await upload_sessions.abort(session_id, current_user["id"])
+    except UploadSessionUnavailable:
+        raise_unavailable()
+    if not found:
+        raise_not_found()
@@ -13,6 +13,15 @@ class Settings(BaseSettings):
     # 数据库配置
     DATABASE_URL: str
     
+    # 数据库连接池（每个引擎、每个工作进程独立）
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0  # 等待可用连接的超时（秒）
+    DB_POOL_RECYCLE: int = 1800  # 连接最大存活时间（秒）
+    DB_POOL_PRE_PING: bool = True  # 取出连接前检测是否可用
+    DB_STATEMENT_TIMEOUT_MS: int = 15000  # 服务端语句超时（毫秒），0 表示不限制
+    DB_PGBOUNCER_MODE: bool = False  # 经 PgBouncer（事务模式）连接：不在本地池化，禁用预编译语句缓存
+    
     # JWT 配置 (从用户服务获取)
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
@@ -32,6 +41,7 @@ class Settings(BaseSettings):
     # Redis配置
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
+    REDIS_SOCKET_TIMEOUT: float = 1.0  # 缓存访问超时（秒）
     
     # Kafka配置
     KAFKA_BOOTSTRAP_SERVERS: str = "kafka:9092"
@@ -40,11 +50,17 @@ class Settings(BaseSettings):
     KAFKA_TOPIC_REACTIONS: str = "social.reactions"
     KAFKA_TOPIC_NOTIFICATIONS: str = "user.notifications"
     KAFKA_TOPIC_LOGS: str = "service.logs"
+    KAFKA_TOPIC_USERS: str = "user.events"  # 用户资料变更事件
     
     # Elasticsearch配置
     ELASTICSEARCH_HOST: str = "elasticsearch"
     ELASTICSEARCH_PORT: int = 9200
-    ELASTICSEARCH_INDEX_POSTS: str = "posts"
+    ELASTICSEARCH_INDEX_POSTS: str = "posts"  # 帖子索引的别名，重建索引时原子切换到新索引
+    ELASTICSEARCH_NUMBER_OF_SHARDS: int = 1
+    ELASTICSEARCH_NUMBER_OF_REPLICAS: int = 0
+    ELASTICSEARCH_REFRESH_INTERVAL: str = "1s"
+    SEARCH_PIT_KEEP_ALIVE: str = "2m"  # 游标翻页的时间点快照在两次翻页之间的保留时间
+    SEARCH_MAX_RESULT_WINDOW: int = 10000  # 页码模式可翻到的最大结果数（与索引的 max_result_window 一致）
     
     # MinIO配置（对象存储）
     MINIO_ENDPOINT: str = "minio:9000"
@@ -52,9 +68,33 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = "minioadmin"
     MINIO_SECURE: bool = False
     MINIO_POST_BUCKET: str = "post-content"
+    STORAGE_MAX_WORKERS: int = 16  # 执行MinIO同步调用的线程数（进程内对象存储最大并发）
+    MINIO_PUBLIC_ENDPOINT: Optional[str] = None  # 客户端访问MinIO的地址，用于签发直传URL，为空时使用 MINIO_ENDPOINT
+    MINIO_REGION: str = "us-east-1"  # 签名用的区域，显式指定以免签发URL时查询存储桶区域
     
     # 用户服务 API
     USER_SERVICE_BASE_URL: str = "http://user-service:8000/api/v1"
+    USER_SERVICE_TOKEN: str = ""  # 服务间调用令牌（请求头 X-Service-Token），与用户服务的 SERVICE_TOKEN 相同
+    
+    # 用户服务 HTTP 连接池
+    USER_SERVICE_MAX_CONNECTIONS: int = 100
+    USER_SERVICE_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    USER_SERVICE_KEEPALIVE_EXPIRY: float = 30.0  # 空闲连接保留秒数
+    USER_SERVICE_HTTP2: bool = False
+    USER_SERVICE_TIMEOUT: float = 10.0  # 读写超时（秒）
+    USER_SERVICE_CONNECT_TIMEOUT: float = 3.0
+    USER_SERVICE_POOL_TIMEOUT: float = 5.0  # 等待连接池分配连接的超时
+    
+    # 身份缓存（避免每个请求都调用 /users/me）
+    IDENTITY_CACHE_MAX_SIZE: int = 10000
+    IDENTITY_CACHE_TTL: int = 60  # 秒，且不超过令牌剩余有效期
+    IDENTITY_CACHE_REDIS_ENABLED: bool = True  # 是否启用Redis二级缓存
+    
+    # 用户资料缓存（帖子/评论/搜索结果的作者信息）
+    USER_PROFILE_CACHE_MAX_SIZE: int = 50000
+    USER_PROFILE_CACHE_TTL: int = 300  # 秒
+    USER_PROFILE_NEGATIVE_TTL: int = 30  # 不存在用户的缓存时间（秒）
+    USER_PROFILE_FAILURE_TTL: int = 5  # 用户服务调用失败后，这些用户在进程内暂不重试的时间（秒）
     
     # API 文档
     DOCS_URL: Optional[str] = "/docs"
@@ -70,6 +110,20 @@ class Settings(BaseSettings):
     
     # 上传文件配置
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_PART_SIZE: int = 5 * 1024 * 1024  # 流式上传到MinIO的分片大小（不小于5MB）
+    MEDIA_UPLOAD_CONCURRENCY: int = 10  # 单个请求并发上传的文件数上限
+    MAX_MEDIA_FILES_PER_POST: int = 10  # 单个帖子的媒体文件数上限
+    MEDIA_UPLOAD_URL_EXPIRE_SECONDS: int = 900  # 直传URL的有效期（秒）
+    MAX_VIDEO_UPLOAD_SIZE: int = 500 * 1024 * 1024  # 直传/分块上传的视频大小上限（500MB）
+    UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024  # 分块上传的块大小，对应MinIO分片（不小于5MB）
+    UPLOAD_SESSION_TTL: int = 86400  # 分块上传会话的有效期（秒），每次上传块后续期
+    
+    # 图片衍生图配置
+    IMAGE_PROCESS_WORKERS: int = 2  # 生成衍生图的进程数，为0时不生成
+    IMAGE_DERIVATIVE_WIDTHS: List[int] = [320, 640, 1080]  # 衍生图的最大宽度
+    IMAGE_DERIVATIVE_FORMATS: List[str] = ["webp", "jpeg"]  # 衍生图格式（webp / jpeg）
+    IMAGE_DERIVATIVE_QUALITY: int = 80  # 衍生图编码质量
+    IMAGE_MAX_PIXELS: int = 50_000_000  # 允许解码的最大像素数
     ALLOWED_IMAGE_TYPES: List[str] = ["image/jpeg", "image/png", "image/gif", "image/webp"]
     ALLOWED_VIDEO_TYPES: List[str] = ["video/mp4", "video/mpeg", "video/quicktime"]
     
@@ -77,6 +131,39 @@ class Settings(BaseSettings):
     DEFAULT_PAGE_SIZE: int = 20
     MAX_PAGE_SIZE: int = 100
     
+    # 分页总数统计
+    COUNT_EXACT_THRESHOLD: int = 1000  # 超过该数量时返回估计值
+    COUNT_CACHE_TTL: int = 300  # Redis中缓存总数的时间（秒）
+    
+    # 浏览数写回
+    VIEW_COUNT_FLUSH_INTERVAL: float = 5.0  # 累计增量写回数据库的间隔（秒）
+    VIEW_COUNT_FLUSH_BATCH_SIZE: int = 1000  # 每条 UPDATE 写回的帖子数
+    VIEW_COUNT_UNIQUE_VIEWERS: bool = True  # 是否用 HyperLogLog 统计去重浏览人数
+    
+    # 计数对账
+    COUNTER_RECONCILE_INTERVAL: float = 600.0  # 重新计算点赞/评论/回复数和按类型的反应数的间隔（秒），0 表示不执行
+    COUNTER_RECONCILE_BATCH_SIZE: int = 5000  # 每批对账的ID范围
+    COUNTER_RECONCILE_LOCK_TTL: int = 60  # 对账锁的过期时间（秒），执行期间每批续期
+    
+    # 首页时间线
+    FEED_MAX_LENGTH: int = 800  # 每个用户缓存的帖子ID数量上限
+    FEED_TTL: int = 7 * 24 * 3600  # 未读取的时间线过期时间（秒）
+    FEED_FANOUT_PAGE_SIZE: int = 1000  # 扇出时每次从用户服务获取的关注者数量
+    FEED_CELEBRITY_THRESHOLD: int = 10000  # 关注者数量达到该值的作者改为读取时拉取
+    FEED_FANOUT_WORKERS: int = 8  # 并发扇出的工作协程数
+    FEED_FANOUT_QUEUE_SIZE: int = 1000  # 等待扇出的帖子数上限，满时发帖请求等待
+    FEED_FANOUT_SHUTDOWN_TIMEOUT: float = 10.0  # 停止时等待队列清空的时间（秒）
+    
+    # 事务性发件箱（帖子/评论/反应事件转发到Kafka）
+    OUTBOX_BATCH_SIZE: int = 500  # 每批转发的事件数
+    OUTBOX_POLL_INTERVAL: float = 0.5  # 发件箱已清空时的轮询间隔（秒）
+    OUTBOX_RETRY_INTERVAL: float = 5.0  # Kafka发送失败后的重试间隔（秒）
+    
+    # 搜索索引批量写入
+    SEARCH_INDEX_FLUSH_INTERVAL: float = 1.0  # 合并变更并批量写入的间隔（秒）
+    SEARCH_INDEX_BATCH_SIZE: int = 500  # 每次 bulk 请求写入的帖子数
+    SEARCH_INDEX_QUEUE_RETENTION: int = 24 * 3600  # 已写入的登记保留时间（秒），重建索引需在此时间内完成
+    
     # 服务主机和端口
     HOST: str = "0.0.0.0"
     PORT: int = 8000
@@ -2,4 +2,7 @@
 from app.db.session import Base
 from app.models.post import Post
 from app.models.comment import Comment
-from app.models.reaction import Reaction
\ No newline at end of file
+from app.models.reaction import Reaction, ReactionCounter
+from app.models.media import MediaObject
+from app.models.outbox import OutboxEvent
+from app.models.search_index import SearchIndexEntry
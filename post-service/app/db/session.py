@@ -1,15 +1,70 @@
+from typing import Any, AsyncGenerator, Dict
+from uuid import uuid4
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from app.core.config import settings
+from app.db.metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool
+
+
+def _engine_options(async_driver: bool) -> Dict[str, Any]:
+    """
+    根据配置生成引擎参数
+
+    参数:
+        async_driver: 是否为 asyncpg 异步引擎
+
+    返回:
+        传给 create_engine / create_async_engine 的关键字参数
+    """
+    if settings.DB_PGBOUNCER_MODE:
+        # 连接由 PgBouncer 池化，本地不保留连接；事务模式下连接会在事务间切换，
+        # 不能使用预编译语句缓存，语句超时需在数据库角色上设置（ALTER ROLE ... SET statement_timeout）
+        options: Dict[str, Any] = {"poolclass": NullPool}
+        if async_driver:
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        return options
 
-# 创建 SQLAlchemy 引擎
-engine = create_engine(settings.DATABASE_URL)
+    options = {
+        "poolclass": InstrumentedAsyncQueuePool if async_driver else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if async_driver:
+            options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+# 创建 SQLAlchemy 同步引擎（健康检查、迁移和脚本使用）
+engine = create_engine(settings.DATABASE_URL, **_engine_options(async_driver=False))
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建异步引擎（asyncpg），请求处理使用，避免查询阻塞事件循环
+async_engine = create_async_engine(
+    make_url(settings.DATABASE_URL).set(drivername="postgresql+asyncpg"),
+    **_engine_options(async_driver=True),
+)
+
+# 创建异步会话工厂（提交后不过期，避免在响应序列化时触发隐式加载）
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # 创建基础模型类
 Base = declarative_base()
 
@@ -19,4 +74,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# 异步依赖注入函数，用于路由中
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
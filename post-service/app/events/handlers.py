@@ -1,66 +1,82 @@
-# app/events/handlers.py
-
 import logging
-from typing import Dict, Any
+from typing import Any, Callable, Dict, List, Tuple
 
-from app.utils.elasticsearch import es_service
-from app.events.kafka_producer import kafka_producer
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-async def handle_post_event(event_type: str, post_data: Dict[str, Any]) -> None:
+
+def handle_post_event(event_type: str, post_data: Dict[str, Any]) -> List[int]:
     """
-    处理帖子事件，并更新搜索索引
-    
+    处理帖子事件，帖子需要重新索引（创建、修改、删除都按最新状态写入）
+
     参数:
         event_type: 事件类型 (created, updated, deleted)
         post_data: 帖子数据
+
+    返回:
+        需要重新索引的帖子ID
+    """
+    return [post_data["id"]]
+
+
+def handle_comment_event(event_type: str, comment_data: Dict[str, Any]) -> List[int]:
+    """
+    处理评论事件，评论数变化时所属帖子需要重新索引
+
+    参数:
+        event_type: 事件类型 (created, updated, deleted)
+        comment_data: 评论数据
+
+    返回:
+        需要重新索引的帖子ID
+    """
+    if event_type in ("created", "deleted"):
+        return [comment_data["post_id"]]
+    return []
+
+
+def handle_reaction_event(event_type: str, reaction_data: Dict[str, Any]) -> List[int]:
+    """
+    处理反应事件，帖子点赞数变化时帖子需要重新索引
+
+    参数:
+        event_type: 事件类型 (created, updated, deleted)
+        reaction_data: 反应数据
+
+    返回:
+        需要重新索引的帖子ID
+    """
+    if event_type in ("created", "deleted") and reaction_data.get("post_id"):
+        return [reaction_data["post_id"]]
+    return []
+
+
+# 主题 -> (消息中的数据字段, 处理函数)
+EVENT_HANDLERS: Dict[str, Tuple[str, Callable[[str, Dict[str, Any]], List[int]]]] = {
+    settings.KAFKA_TOPIC_POSTS: ("post", handle_post_event),
+    settings.KAFKA_TOPIC_COMMENTS: ("comment", handle_comment_event),
+    settings.KAFKA_TOPIC_REACTIONS: ("reaction", handle_reaction_event),
+}
+
+
+def dispatch_event(topic: str, message: Dict[str, Any]) -> List[int]:
+    """
+    把发件箱中的事件交给进程内的处理函数
+
+    参数:
+        topic: Kafka主题
+        message: 消息内容 {"event_type", "post" / "comment" / "reaction"}
+
+    返回:
+        需要重新索引的帖子ID（格式错误的事件记录日志后跳过）
     """
-    # 根据事件类型更新Elasticsearch索引
+    entry = EVENT_HANDLERS.get(topic)
+    if entry is None:
+        return []
+    field, handler = entry
     try:
-        if event_type == "created":
-            await es_service.index_post(post_data)
-            logger.info(f"已索引新帖子: ID={post_data.get('id')}")
-        elif event_type == "updated":
-            await es_service.update_post_index(post_data)
-            logger.info(f"已更新帖子索引: ID={post_data.get('id')}")
-        elif event_type == "deleted":
-            await es_service.delete_post_index(post_data.get('id'))
-            logger.info(f"已删除帖子索引: ID={post_data.get('id')}")
+        return handler(message["event_type"], message[field])
     except Exception as e:
-        logger.error(f"处理搜索索引失败: {str(e)}")
-    
-    # 发送事件到Kafka
-    await kafka_producer.send_post_event(event_type, post_data)
-
-# app/api/endpoints/posts.py 中需要修改的部分
-
-# 在创建帖子的方法中添加:
-# 在 return result 前添加:
-# 异步索引帖子
-asyncio.create_task(handle_post_event("created", jsonable_encoder(result)))
-
-# 在更新帖子的方法中添加:
-# 在 return post 前添加:
-# 异步更新帖子索引
-asyncio.create_task(handle_post_event("updated", jsonable_encoder(post)))
-
-# 在删除帖子的方法中添加:
-# 在 return {"message": "帖子已删除"} 前添加:
-# 异步删除帖子索引
-post_data = jsonable_encoder(post)
-asyncio.create_task(handle_post_event("deleted", post_data))
-
-# app/main.py 的启动和关闭事件中添加:
-
-@app.on_event("startup")
-async def startup_event():
-    logger.info("服务启动中...")
-    await kafka_producer.start()
-    await es_service.connect()  # 启动Elasticsearch连接
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    logger.info("服务关闭中...")
-    await kafka_producer.stop()
-    await es_service.close()  # 关闭Elasticsearch连接
\ No newline at end of file
+        logger.error(f"处理主题 {topic} 的事件时发生错误: {str(e)}")
+        return []
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiokafka import AIOKafkaConsumer
+from aiokafka.errors import KafkaConnectionError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class KafkaConsumer:
+    """
+    Kafka 消费者，用于接收其他服务的事件
+
+    不加入消费组（group_id=None），每个进程都会收到全部事件，
+    以便各自失效进程内缓存。
+    """
+
+    def __init__(self, topics: List[str], handler_map: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]]):
+        """
+        初始化 Kafka 消费者
+
+        参数:
+            topics: 要订阅的主题列表
+            handler_map: 主题到处理函数的映射
+        """
+        self.topics = topics
+        self.handler_map = handler_map
+        self.consumer = None
+        self.running = False
+        self.task = None
+
+    async def start(self):
+        """启动消费者，连接失败时不影响服务启动"""
+        if self.consumer is not None:
+            return
+
+        try:
+            self.consumer = AIOKafkaConsumer(
+                *self.topics,
+                bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+                group_id=None,
+                auto_offset_reset="latest",
+                value_deserializer=lambda m: json.loads(m.decode('utf-8'))
+            )
+            await self.consumer.start()
+            self.running = True
+            self.task = asyncio.create_task(self.consume_loop())
+            logger.info(f"Kafka 消费者已启动，订阅主题: {', '.join(self.topics)}")
+        except KafkaConnectionError as e:
+            logger.error(f"Kafka 消费者启动失败: {str(e)}")
+            self.consumer = None
+            self.running = False
+
+    async def consume_loop(self):
+        """消费循环"""
+        try:
+            async for message in self.consumer:
+                handler = self.handler_map.get(message.topic)
+                if handler is None:
+                    continue
+                try:
+                    await handler(message.value)
+                except Exception as e:
+                    logger.error(f"处理主题 {message.topic} 的消息时发生错误: {str(e)}")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"消费消息时发生错误: {str(e)}")
+            self.running = False
+
+    async def stop(self):
+        """停止消费者"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        if self.consumer is not None:
+            try:
+                await self.consumer.stop()
+            except Exception as e:
+                logger.error(f"停止Kafka消费者时发生错误: {str(e)}")
+            self.consumer = None
+            self.running = False
+            logger.info("Kafka 消费者已停止")
+
+
+# 用户事件处理函数
+async def process_user_event(message: Dict[str, Any]):
+    """
+    处理来自用户主题的消息，失效相关缓存和时间线
+    """
+    from app.services.timeline import timeline_service
+    from app.utils.identity import identity_resolver
+    from app.utils.user_cache import user_profile_cache
+
+    # 关注关系变化后重建关注者的首页时间线
+    if message.get("type") in ("follow", "unfollow") and "follower_id" in message:
+        await timeline_service.invalidate(int(message["follower_id"]))
+        return
+
+    if message.get("type") != "user_updated" or "user_id" not in message:
+        return
+
+    user_id = int(message["user_id"])
+    await identity_resolver.invalidate(user_id)
+    await user_profile_cache.invalidate(user_id)
+
+
+# 创建 Kafka 消费者实例
+kafka_consumer = KafkaConsumer(
+    topics=[settings.KAFKA_TOPIC_USERS],
+    handler_map={
+        settings.KAFKA_TOPIC_USERS: process_user_event,
+    }
+)
@@ -1,6 +1,6 @@
 import json
 import asyncio
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
 from aiokafka import AIOKafkaProducer
 from loguru import logger
@@ -32,6 +32,23 @@ class KafkaProducer:
             except Exception as e:
                 logger.error(f"Kafka生产者启动失败: {str(e)}")
                 self.is_ready = False
+                # 释放未启动的生产者，以便稍后重新连接
+                try:
+                    await self.producer.stop()
+                except Exception:
+                    pass
+                self.producer = None
+    
+    async def ensure_ready(self) -> bool:
+        """
+        生产者未就绪时尝试重新连接
+        
+        返回:
+            是否就绪
+        """
+        if not self.is_ready:
+            await self.start()
+        return self.is_ready
     
     async def stop(self):
         """停止Kafka生产者"""
@@ -68,6 +85,31 @@ class KafkaProducer:
             logger.error(f"发送消息到主题 {topic} 失败: {str(e)}")
             return False
     
+    async def send_batch(self, messages: List[Tuple[str, Dict[str, Any], Optional[str]]]) -> bool:
+        """
+        批量发送消息，全部写入生产者缓冲后再统一等待确认
+        
+        参数:
+            messages: (主题, 消息, 键) 列表
+        
+        返回:
+            是否全部成功发送（失败时可能已发送部分消息）
+        """
+        if not self.is_ready:
+            logger.warning(f"Kafka生产者未就绪，无法发送 {len(messages)} 条消息")
+            return False
+        
+        try:
+            futures = [
+                await self.producer.send(topic, message, key=key.encode('utf-8') if key else None)
+                for topic, message, key in messages
+            ]
+            await asyncio.gather(*futures)
+            return True
+        except Exception as e:
+            logger.error(f"批量发送 {len(messages)} 条消息失败: {str(e)}")
+            return False
+    
     async def send_post_event(self, event_type: str, post_data: Dict[str, Any]) -> bool:
         """
         发送帖子相关事件
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+from prometheus_client import Counter
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.events.handlers import dispatch_event
+from app.events.kafka_producer import kafka_producer
+from app.models.comment import Comment
+from app.models.outbox import OutboxEvent
+from app.models.post import Post
+from app.services.search_indexer import search_indexer
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_EVENTS_RELAYED = Counter(
+    "outbox_events_relayed_total",
+    "从发件箱发送到Kafka的事件数",
+)
+OUTBOX_RELAY_FAILURES = Counter(
+    "outbox_relay_failures_total",
+    "发件箱转发失败、等待重试的批次数",
+)
+
+
+def user_brief(current_user: Dict[str, Any]) -> Dict[str, Any]:
+    """事件中附带的操作者信息"""
+    return {
+        "id": current_user["id"],
+        "username": current_user["username"],
+        "full_name": current_user.get("full_name"),
+        "avatar_url": current_user.get("avatar_url"),
+    }
+
+
+def add_event(db: AsyncSession, topic: str, key: Any, message: Dict[str, Any]) -> None:
+    """
+    把事件写入发件箱，随调用方的事务一起提交
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        topic: Kafka主题
+        key: 消息键
+        message: 消息内容
+    """
+    db.add(OutboxEvent(topic=topic, key=str(key) if key is not None else None, message=jsonable_encoder(message)))
+
+
+def add_post_event(db: AsyncSession, event_type: str, post: Post, current_user: Dict[str, Any]) -> None:
+    """
+    写入帖子事件（帖子需已 flush 以获得ID）
+
+    参数:
+        db: 数据库会话
+        event_type: 事件类型 (created, updated, deleted)
+        post: 帖子
+        current_user: 操作者
+    """
+    add_event(db, settings.KAFKA_TOPIC_POSTS, post.id, {
+        "event_type": event_type,
+        "post": {
+            "id": post.id,
+            "user_id": post.user_id,
+            "content": post.content or "",
+            "visibility": post.visibility,
+            "location": post.location,
+            "media_type": post.media_type,
+            "user": user_brief(current_user),
+        },
+    })
+
+
+def add_comment_event(db: AsyncSession, event_type: str, comment: Comment, current_user: Dict[str, Any]) -> None:
+    """
+    写入评论事件（评论需已 flush 以获得ID）
+
+    参数:
+        db: 数据库会话
+        event_type: 事件类型 (created, updated, deleted)
+        comment: 评论
+        current_user: 操作者
+    """
+    add_event(db, settings.KAFKA_TOPIC_COMMENTS, comment.id, {
+        "event_type": event_type,
+        "comment": {
+            "id": comment.id,
+            "user_id": comment.user_id,
+            "post_id": comment.post_id,
+            "parent_id": comment.parent_id,
+            "content": comment.content,
+            "user": user_brief(current_user),
+        },
+    })
+
+
+def add_reaction_event(db: AsyncSession, event_type: str, reaction: Dict[str, Any], current_user: Dict[str, Any]) -> None:
+    """
+    写入反应事件
+
+    参数:
+        db: 数据库会话
+        event_type: 事件类型 (created, updated, deleted)
+        reaction: 反应数据 {"id", "user_id", "type", "post_id", "comment_id"}，取消反应时可以没有 id
+        current_user: 操作者
+    """
+    add_event(db, settings.KAFKA_TOPIC_REACTIONS, reaction.get("id"), {
+        "event_type": event_type,
+        "reaction": {
+            "id": reaction.get("id"),
+            "user_id": reaction["user_id"],
+            "type": reaction["type"],
+            "post_id": reaction.get("post_id"),
+            "comment_id": reaction.get("comment_id"),
+            "user": user_brief(current_user),
+        },
+    })
+
+
+class OutboxRelay:
+    """
+    发件箱转发任务
+
+    进程内处理（登记搜索索引）和Kafka投递分两步进行，互不阻塞：
+    1. 按ID顺序取出一批未处理（dispatched 为假）的事件交给处理函数，把涉及的帖子写入
+       搜索索引登记表，并在同一事务中标记为已处理；
+    2. 按ID顺序取出一批事件批量发送到Kafka，发送成功后删除。
+
+    两步都用 SELECT ... FOR UPDATE SKIP LOCKED 取行，多个工作进程可以同时转发，
+    互不等待也不会重复取到同一行。Kafka不可用时事件保留在发件箱中，
+    按 OUTBOX_RETRY_INTERVAL 退避并重新连接生产者，搜索索引不受影响。
+    投递语义为至少一次：批次部分发送成功后失败会重发，消息中的 event_id 可用于去重。
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        # Kafka投递失败后，在该时间（loop.time()）之前不再尝试
+        self._retry_at = 0.0
+
+    async def start(self):
+        """启动后台转发任务"""
+        if self.task is None:
+            self.task = asyncio.create_task(self.relay_loop())
+            logger.info("发件箱转发任务已启动")
+
+    async def stop(self):
+        """停止后台转发任务（未发送的事件留在发件箱中，由下次启动后发送）"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+            logger.info("发件箱转发任务已停止")
+
+    async def relay_loop(self):
+        """转发循环：有积压时连续转发，否则按轮询间隔等待"""
+        try:
+            while True:
+                busy = False
+                try:
+                    busy = await asyncio.shield(self.dispatch_batch()) >= settings.OUTBOX_BATCH_SIZE
+                except Exception as e:
+                    logger.error(f"处理发件箱事件失败: {str(e)}")
+
+                if asyncio.get_running_loop().time() >= self._retry_at:
+                    try:
+                        delivered = await asyncio.shield(self.deliver_batch())
+                    except Exception as e:
+                        logger.error(f"转发发件箱事件失败: {str(e)}")
+                        delivered = None
+                    if delivered is None:
+                        self._retry_at = asyncio.get_running_loop().time() + settings.OUTBOX_RETRY_INTERVAL
+                    elif delivered >= settings.OUTBOX_BATCH_SIZE:
+                        busy = True
+
+                if not busy:
+                    await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL)
+        except asyncio.CancelledError:
+            pass
+
+    async def dispatch_batch(self) -> int:
+        """
+        把一批未处理的事件交给进程内的处理函数
+
+        涉及的帖子与事件的已处理标记在同一事务中写入登记表，
+        由搜索索引写入器写入成功后才算完成，进程崩溃或Elasticsearch不可用都不会丢失
+
+        返回:
+            处理的事件数
+        """
+        async with AsyncSessionLocal() as db:
+            events = (await db.execute(
+                select(OutboxEvent)
+                .where(OutboxEvent.dispatched == False)
+                .order_by(OutboxEvent.id)
+                .limit(settings.OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not events:
+                await db.rollback()
+                return 0
+
+            post_ids = set()
+            for event in events:
+                post_ids.update(dispatch_event(event.topic, event.message))
+            await search_indexer.enqueue(db, post_ids)
+
+            await db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_([event.id for event in events]))
+                .values(dispatched=True)
+            )
+            await db.commit()
+        return len(events)
+
+    async def deliver_batch(self) -> Optional[int]:
+        """
+        把一批事件发送到Kafka
+
+        返回:
+            发送的事件数，Kafka不可用或发送失败时返回 None
+        """
+        if not await kafka_producer.ensure_ready():
+            OUTBOX_RELAY_FAILURES.inc()
+            return None
+
+        async with AsyncSessionLocal() as db:
+            # 只发送已处理的事件，保证搜索索引先于删除登记
+            events = (await db.execute(
+                select(OutboxEvent)
+                .where(OutboxEvent.dispatched == True)
+                .order_by(OutboxEvent.id)
+                .limit(settings.OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not events:
+                await db.rollback()
+                return 0
+
+            delivered = await kafka_producer.send_batch([
+                (event.topic, {**event.message, "event_id": event.id}, event.key)
+                for event in events
+            ])
+            if not delivered:
+                await db.rollback()
+                OUTBOX_RELAY_FAILURES.inc()
+                return None
+
+            await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([event.id for event in events])))
+            await db.commit()
+
+        OUTBOX_EVENTS_RELAYED.inc(len(events))
+        return len(events)
+
+
+# 创建发件箱转发任务单例
+outbox_relay = OutboxRelay()
@@ -10,7 +10,19 @@ from app.api import api_router
 from app.core.config import settings
 from app.utils.logging import setup_logging
 from app.events.kafka_producer import kafka_producer
+from app.events.kafka_consumer import kafka_consumer
+from app.events.outbox import outbox_relay
 from app.utils.elasticsearch import es_service
+from app.utils.http_client import user_service_client
+from app.utils.redis_client import redis_service
+from app.utils.storage import storage
+from app.db.session import async_engine, engine
+from app.db.metrics import register_pool_metrics
+from app.services.counters import counter_reconciler
+from app.services.media_processing import media_processor
+from app.services.search_indexer import search_indexer
+from app.services.timeline import timeline_service
+from app.services.view_counter import view_counter
 
 # 设置日志
 logger = setup_logging()
@@ -71,26 +83,90 @@ def root():
 async def startup_event():
     logger.info("服务启动中...")
     
+    # 注册数据库连接池指标
+    register_pool_metrics(engine, "sync")
+    register_pool_metrics(async_engine.sync_engine, "async")
+    
     # 启动Kafka生产者
     await kafka_producer.start()
     
+    # 创建用户服务HTTP连接池
+    await user_service_client.start()
+    
+    # 连接到Redis（缓存）
+    await redis_service.connect()
+    
+    # 确保对象存储桶存在
+    await storage.start()
+    
+    # 启动图片处理进程池
+    await media_processor.start()
+    
+    # 启动Kafka消费者（用户事件，用于缓存失效）
+    await kafka_consumer.start()
+    
+    # 启动浏览数写回任务
+    await view_counter.start()
+    
+    # 启动计数对账任务
+    await counter_reconciler.start()
+    
+    # 启动时间线扇出工作协程
+    await timeline_service.start()
+    
     # 连接到Elasticsearch
     await es_service.connect()
     if es_service.is_ready:
         logger.info("Elasticsearch连接成功")
     else:
         logger.warning("无法连接到Elasticsearch，搜索功能将不可用")
+    
+    # 启动搜索索引批量写入任务和发件箱转发任务
+    await search_indexer.start()
+    await outbox_relay.start()
 
 # 关闭事件
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("服务关闭中...")
     
+    # 停止发件箱转发任务，写入剩余的搜索索引变更（在关闭Kafka和Elasticsearch之前）
+    await outbox_relay.stop()
+    await search_indexer.stop()
+    
     # 停止Kafka生产者
     await kafka_producer.stop()
     
     # 关闭Elasticsearch连接
     await es_service.close()
+    
+    # 停止Kafka消费者
+    await kafka_consumer.stop()
+    
+    # 等待队列中的时间线扇出完成并停止工作协程
+    await timeline_service.stop()
+    
+    # 停止计数对账任务
+    await counter_reconciler.stop()
+    
+    # 停止浏览数写回任务（在关闭Redis和数据库之前写回剩余增量）
+    await view_counter.stop()
+    
+    # 关闭Redis连接
+    await redis_service.close()
+    
+    # 关闭用户服务HTTP连接池
+    await user_service_client.close()
+    
+    # 停止图片处理进程池
+    await media_processor.stop()
+    
+    # 关闭对象存储线程池
+    await storage.close()
+    
+    # 关闭数据库连接池
+    await async_engine.dispose()
+    engine.dispose()
 
 # 如果直接运行此脚本，则启动应用
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -31,4 +31,10 @@ class Comment(Base):
     
     # 审计字段
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # 键集分页：帖子下的顶级评论/回复、用户的评论
+        Index('ix_comments_post_parent_created_at_id', 'post_id', 'parent_id', created_at.desc(), id.desc()),
+        Index('ix_comments_user_id_created_at_id', 'user_id', created_at.desc(), id.desc()),
+    )
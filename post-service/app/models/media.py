@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, JSON
+from sqlalchemy.sql import func
+
+from app.db.session import Base
+
+class MediaObject(Base):
+    """
+    内容寻址的媒体对象：相同内容（SHA-256）只存一份，按引用计数删除
+    """
+    __tablename__ = "media_objects"
+
+    digest = Column(String(64), primary_key=True)  # SHA-256 十六进制
+    path = Column(String, nullable=False, unique=True)  # MinIO 中的对象路径
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=False)
+    ref_count = Column(Integer, nullable=False, server_default="0")
+    attributes = Column(JSON, nullable=True)  # 处理结果（尺寸、blurhash、衍生图），重复上传时直接复用
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, String, BigInteger, Boolean, DateTime, JSON, Index, text
+from sqlalchemy.sql import func
+
+from app.db.session import Base
+
+class OutboxEvent(Base):
+    """
+    事务性发件箱：帖子/评论/反应的变更事件与业务数据在同一事务中写入，
+    由后台转发任务批量发送到Kafka后删除
+    """
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger, primary_key=True)  # 自增，决定转发顺序
+    topic = Column(String, nullable=False)  # Kafka主题
+    key = Column(String, nullable=True)  # Kafka消息键（帖子/评论/反应ID）
+    message = Column(JSON, nullable=False)  # 消息内容 {"event_type", "post" / "comment" / "reaction"}
+    dispatched = Column(Boolean, nullable=False, server_default="false")  # 是否已交给进程内处理（搜索索引）
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Kafka不可用时已处理的事件会积压，未处理事件的扫描只走部分索引
+        Index("ix_outbox_events_undispatched", "id", postgresql_where=text("NOT dispatched")),
+    )
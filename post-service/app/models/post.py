@@ -1,7 +1,7 @@
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, JSON, Index
 from sqlalchemy.dialects.postgresql import ENUM as PgEnum
 
 from app.db.session import Base
@@ -53,6 +53,12 @@ class Post(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # 键集分页：按 (created_at, id) 倒序翻页
+        Index('ix_posts_visibility_created_at_id', 'visibility', created_at.desc(), id.desc()),
+        Index('ix_posts_user_id_created_at_id', 'user_id', created_at.desc(), id.desc()),
+    )
+
 class Tag(Base):
     __tablename__ = "tags"
 
@@ -1,7 +1,7 @@
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, JSON, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, JSON, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import ENUM as PgEnum
 
 from app.db.session import Base
@@ -33,4 +33,14 @@ class Reaction(Base):
         # 限制一个用户对同一帖子或评论只能有一个反应
         UniqueConstraint('user_id', 'post_id', name='uix_user_post_reaction'),
         UniqueConstraint('user_id', 'comment_id', name='uix_user_comment_reaction'),
-    )
\ No newline at end of file
+        # 键集分页：帖子的反应用户列表
+        Index('ix_reactions_post_id_created_at_id', 'post_id', created_at.desc(), id.desc()),
+    )
+class ReactionCounter(Base):
+    """按目标和反应类型预先聚合的反应数，与 reactions 在同一事务中更新"""
+    __tablename__ = "reaction_counts"
+
+    target_type = Column(String(16), primary_key=True)  # post / comment
+    target_id = Column(Integer, primary_key=True)
+    type = Column(reaction_enum, primary_key=True)
+    count = Column(Integer, nullable=False, server_default="0")
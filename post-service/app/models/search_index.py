@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, DateTime, Index, text
+from sqlalchemy.sql import func
+
+from app.db.session import Base
+
+class SearchIndexEntry(Base):
+    """
+    搜索索引登记：需要重新索引的帖子，与发件箱事件的处理在同一事务中写入，
+    写入索引成功后记录 indexed_at，保留 SEARCH_INDEX_QUEUE_RETENTION 秒后清理
+    """
+    __tablename__ = "search_index_queue"
+
+    post_id = Column(Integer, primary_key=True)  # 不加外键，已删除的帖子也要登记以删除文档
+    queued_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())  # 最近一次登记的时间
+    indexed_at = Column(DateTime(timezone=True), nullable=True)  # 写入索引的时间，为空表示待写入
+
+    __table_args__ = (
+        # 待写入的登记按登记时间取出
+        Index("ix_search_index_queue_pending", "queued_at", postgresql_where=text("indexed_at IS NULL")),
+        # 重建索引时按登记时间补齐加载期间的变更
+        Index("ix_search_index_queue_queued_at", "queued_at"),
+        Index("ix_search_index_queue_indexed_at", "indexed_at"),
+    )
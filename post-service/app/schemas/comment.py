@@ -64,7 +64,9 @@ class CommentInDB(Comment):
 # 分页结果
 class CommentPage(BaseModel):
     items: List[Comment]
-    total: int
-    page: int
+    total: Optional[int] = None  # 游标模式下默认不统计总数
+    total_is_estimate: bool = False  # 总数较大时为查询计划估计值
+    page: Optional[int] = None
     size: int
-    pages: int
\ No newline at end of file
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # 游标模式下的下一页游标，没有更多数据时为空
\ No newline at end of file
@@ -20,12 +20,53 @@ class TagInDB(BaseModel):
         from_attributes = True
 
 # 帖子媒体相关Schema
+class PostMediaVariant(BaseModel):
+    url: str
+    width: int
+    height: int
+    format: str  # webp / jpeg
+
 class PostMedia(BaseModel):
     url: str
     type: str  # 媒体类型: image, video, thumbnail等
     width: Optional[int] = None
     height: Optional[int] = None
     duration: Optional[int] = None  # 视频时长（秒）
+    blurhash: Optional[str] = None  # 图片加载前显示的占位图
+    variants: List[PostMediaVariant] = []  # 按宽度缩放的衍生图，客户端按显示尺寸选择
+
+# 直传对象存储：申请上传地址
+class MediaUploadFile(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    content_type: str
+    size: int = Field(..., gt=0)  # 客户端声明的文件大小（字节），创建帖子时以实际对象为准
+
+class MediaUploadRequest(BaseModel):
+    files: List[MediaUploadFile] = Field(..., min_length=1)
+
+class MediaUploadTicket(BaseModel):
+    object_key: str  # 创建帖子时提交的对象键
+    upload_url: str  # 预签名的PUT地址
+    headers: Dict[str, str] = {}  # 上传时需要携带的请求头
+    expires_at: datetime
+
+class MediaUploadResponse(BaseModel):
+    uploads: List[MediaUploadTicket]
+
+# 可续传的分块上传会话
+class UploadSessionCreate(MediaUploadFile):
+    pass
+
+class UploadSessionStatus(BaseModel):
+    session_id: str
+    object_key: str  # 完成后提交给 POST /posts/media 的对象键
+    size: int
+    chunk_size: int  # 除最后一块外每块的大小
+    total_chunks: int
+    received_chunks: List[int] = []  # 已收到的块编号（从1开始）
+    offset: int  # 从文件开头连续收到的字节数
+    next_chunk: Optional[int] = None  # 下一个需要上传的块编号，全部收到时为空
+    completed: bool = False
 
 # 帖子基础Schema
 class PostBase(BaseModel):
@@ -93,6 +134,7 @@ class Post(PostBase):
 class PostDetail(Post):
     # 可能包含热门评论等额外信息
     top_comments: Optional[List[Any]] = None  # 将在API中填充
+    unique_view_count: Optional[int] = None  # 去重浏览人数（估计值），未启用统计时为空
     
     class Config:
         from_attributes = True
@@ -105,7 +147,9 @@ class PostInDB(Post):
 # 分页结果
 class PostPage(BaseModel):
     items: List[Post]
-    total: int
-    page: int
+    total: Optional[int] = None  # 游标模式下默认不统计总数
+    total_is_estimate: bool = False  # 总数较大时为查询计划估计值
+    page: Optional[int] = None
     size: int
-    pages: int
\ No newline at end of file
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # 游标模式下的下一页游标，没有更多数据时为空
\ No newline at end of file
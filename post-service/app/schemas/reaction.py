@@ -1,4 +1,4 @@
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from datetime import datetime
 from pydantic import BaseModel, validator
 
@@ -56,4 +56,9 @@ class ReactionSummary(BaseModel):
     # 是否包含当前用户的反应
     has_reacted: bool = False
     # 当前用户的反应类型
-    current_user_reaction: Optional[ReactionType] = None
\ No newline at end of file
+    current_user_reaction: Optional[ReactionType] = None
+
+# 当前用户对一组帖子/评论的反应状态
+class UserReactionState(BaseModel):
+    posts: Dict[int, ReactionType] = {}
+    comments: Dict[int, ReactionType] = {}
@@ -33,8 +33,10 @@ class SearchResultItem(BaseModel):
 
 # 搜索响应模型
 class SearchResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # 游标模式下默认不统计总数
+    total_is_estimate: bool = False  # 匹配数超过精确统计上限时为下限值
     items: List[Dict[str, Any]]
-    page: int
+    page: Optional[int] = None
     size: int
-    pages: int
\ No newline at end of file
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # 游标模式下的下一页游标，没有更多数据时为空
\ No newline at end of file
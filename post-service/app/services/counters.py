@@ -0,0 +1,412 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import List, NamedTuple, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import Table, and_, delete, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.comment import Comment
+from app.models.post import Post
+from app.models.reaction import Reaction, ReactionCounter, ReactionType
+from app.utils.redis_client import redis_service
+
+logger = logging.getLogger(__name__)
+
+COUNTER_REPAIRED_ROWS = Counter(
+    "counter_reconcile_repaired_rows_total",
+    "对账时修复的计数行数",
+    ["counter"],
+)
+COUNTER_DRIFT = Counter(
+    "counter_reconcile_drift_total",
+    "对账时修复的计数偏差绝对值之和",
+    ["counter"],
+)
+COUNTER_RECONCILE_DURATION = Histogram(
+    "counter_reconcile_duration_seconds",
+    "一轮计数对账的耗时（秒）",
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+COUNTER_RECONCILE_LAST_SUCCESS = Gauge(
+    "counter_reconcile_last_success_timestamp_seconds",
+    "最近一次对账成功完成的时间戳",
+)
+
+
+async def apply_counter_delta(db: AsyncSession, column: InstrumentedAttribute, row_id: int, delta: int) -> None:
+    """
+    以原子增量更新计数列（SET col = GREATEST(col + delta, 0)），不读取行
+
+    并发更新只在数据库中排队加减，不会丢失；不修改 updated_at。
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        column: 计数列，如 Post.like_count
+        row_id: 行ID
+        delta: 增量，可为负数
+    """
+    table = column.class_.__table__
+    counter = table.c[column.key]
+    await db.execute(
+        update(table)
+        .where(table.c.id == row_id)
+        .values({
+            column.key: func.greatest(func.coalesce(counter, 0) + delta, 0),
+            "updated_at": table.c.updated_at,
+        })
+    )
+
+
+async def apply_reaction_count_delta(
+    db: AsyncSession, target_type: str, target_id: int, reaction_type: ReactionType, delta: int
+) -> None:
+    """
+    以原子增量更新 reaction_counts 中某个目标、某种反应的数量
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        target_type: "post" 或 "comment"
+        target_id: 帖子或评论ID
+        reaction_type: 反应类型
+        delta: 增量，可为负数
+    """
+    stmt = pg_insert(ReactionCounter).values(
+        target_type=target_type, target_id=target_id, type=reaction_type, count=delta
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ReactionCounter.target_type, ReactionCounter.target_id, ReactionCounter.type],
+            set_={"count": ReactionCounter.count + stmt.excluded.count},
+        )
+    )
+
+
+# 只有锁仍属于自己（值等于令牌）时才续期或释放，避免误删其他进程在过期后获取的锁
+_EXTEND_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class CounterSpec(NamedTuple):
+    """一个冗余计数列及其数据来源"""
+    name: str  # 指标标签
+    table: Table  # 计数所在的表
+    column: str  # 计数列名
+    source: Table  # 被计数的表（可为别名）
+    foreign_key: str  # 来源表中指向计数行的列
+    source_filter: Optional[ColumnElement]  # 来源行的额外条件
+
+
+_replies = Comment.__table__.alias("replies")
+
+COUNTER_SPECS: List[CounterSpec] = [
+    CounterSpec("post_like_count", Post.__table__, "like_count", Reaction.__table__, "post_id", None),
+    CounterSpec("post_comment_count", Post.__table__, "comment_count", Comment.__table__, "post_id", Comment.__table__.c.is_deleted == False),
+    CounterSpec("comment_like_count", Comment.__table__, "like_count", Reaction.__table__, "comment_id", None),
+    CounterSpec("comment_reply_count", Comment.__table__, "reply_count", _replies, "parent_id", _replies.c.is_deleted == False),
+]
+
+
+class ReactionCountSpec(NamedTuple):
+    """reaction_counts 中一种目标的数据来源"""
+    name: str  # 指标标签
+    target_type: str  # post / comment
+    foreign_key: str  # reactions 中指向目标的列
+
+
+REACTION_COUNT_SPECS: List[ReactionCountSpec] = [
+    ReactionCountSpec("post_reaction_counts", "post", "post_id"),
+    ReactionCountSpec("comment_reaction_counts", "comment", "comment_id"),
+]
+
+# 修复 reaction_counts 时每条语句写入的行数，避免超过参数个数上限
+_REACTION_COUNT_WRITE_CHUNK = 1000
+
+
+class CounterReconciler:
+    """
+    计数对账任务
+
+    定期按ID范围分批，用聚合查询从 reactions / comments 重新计算冗余计数和
+    reaction_counts 中按类型的反应数，只改写与实际不符的行，并导出修复的行数和偏差。
+
+    对账与实时增量并发时，个别行可能被写回稍旧的值，下一轮会再次修正。
+    多个工作进程通过Redis锁保证同一时间只有一个进程执行对账：锁的值为本轮的随机令牌，
+    每批提交后续期，结束后比较令牌再删除；进程崩溃时锁在 COUNTER_RECONCILE_LOCK_TTL 后过期。
+    """
+
+    LOCK_KEY = "counter_reconcile:lock"
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        # 持有对账锁时的令牌，Redis不可用（不加锁执行）时为空
+        self._lock_token: Optional[str] = None
+        self._extend_script = None
+        self._release_script = None
+
+    async def start(self):
+        """启动后台对账任务（间隔为0时不启动）"""
+        if self.task is None and settings.COUNTER_RECONCILE_INTERVAL > 0:
+            self.task = asyncio.create_task(self.reconcile_loop())
+            logger.info("计数对账任务已启动")
+
+    async def stop(self):
+        """停止后台对账任务"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+            logger.info("计数对账任务已停止")
+
+    async def reconcile_loop(self):
+        """定期对账循环"""
+        try:
+            while True:
+                await asyncio.sleep(settings.COUNTER_RECONCILE_INTERVAL)
+                if not await self._acquire_lock():
+                    continue
+                try:
+                    await self.reconcile()
+                except Exception as e:
+                    logger.error(f"计数对账失败: {str(e)}")
+                finally:
+                    await asyncio.shield(self._release_lock())
+        except asyncio.CancelledError:
+            pass
+
+    async def reconcile(self) -> None:
+        """执行一轮全量对账"""
+        start = time.perf_counter()
+        for spec in COUNTER_SPECS:
+            repaired, drift = await self._reconcile_counter(spec)
+            if repaired:
+                logger.warning(f"计数对账修复 {spec.name}: {repaired} 行，偏差合计 {drift}")
+        for reaction_spec in REACTION_COUNT_SPECS:
+            repaired, drift = await self._reconcile_reaction_counts(reaction_spec)
+            if repaired:
+                logger.warning(f"计数对账修复 {reaction_spec.name}: {repaired} 行，偏差合计 {drift}")
+        COUNTER_RECONCILE_DURATION.observe(time.perf_counter() - start)
+        COUNTER_RECONCILE_LAST_SUCCESS.set_to_current_time()
+
+    async def _reconcile_counter(self, spec: CounterSpec):
+        """按ID范围分批对账一个计数列，返回 (修复行数, 偏差绝对值之和)"""
+        batch_size = settings.COUNTER_RECONCILE_BATCH_SIZE
+        repaired, total_drift = 0, 0
+
+        async with AsyncSessionLocal() as db:
+            max_id = (await db.execute(select(func.max(spec.table.c.id)))).scalar()
+            await db.commit()
+            if max_id is None:
+                return 0, 0
+
+            for low in range(0, max_id + 1, batch_size):
+                result = await db.execute(self._repair_stmt(spec, low, low + batch_size))
+                drifts = [drift for _, drift in result.all()]
+                # 每批单独提交，避免长事务持有行锁
+                await db.commit()
+                await self._extend_lock()
+                if drifts:
+                    repaired += len(drifts)
+                    total_drift += sum(abs(drift) for drift in drifts)
+
+        COUNTER_REPAIRED_ROWS.labels(counter=spec.name).inc(repaired)
+        COUNTER_DRIFT.labels(counter=spec.name).inc(total_drift)
+        return repaired, total_drift
+
+    @staticmethod
+    def _repair_stmt(spec: CounterSpec, low: int, high: int):
+        """
+        UPDATE ... FROM (聚合子查询) 修复 [low, high) 范围内不一致的计数，
+        RETURNING 返回 (行ID, 实际值 - 原值)
+        """
+        table = spec.table
+        original = table.alias("original")
+        join_on = spec.source.c[spec.foreign_key] == table.c.id
+        if spec.source_filter is not None:
+            join_on = and_(join_on, spec.source_filter)
+
+        actual = (
+            select(table.c.id.label("id"), func.count(spec.source.c.id).label("actual"))
+            .select_from(table.outerjoin(spec.source, join_on))
+            .where(table.c.id >= low, table.c.id < high)
+            .group_by(table.c.id)
+            .subquery("actual")
+        )
+        stored = func.coalesce(table.c[spec.column], 0)
+        return (
+            update(table)
+            .where(
+                table.c.id == actual.c.id,
+                original.c.id == table.c.id,
+                stored != actual.c.actual,
+            )
+            .values({spec.column: actual.c.actual, "updated_at": table.c.updated_at})
+            .returning(table.c.id, actual.c.actual - func.coalesce(original.c[spec.column], 0))
+        )
+
+    async def _reconcile_reaction_counts(self, spec: ReactionCountSpec) -> Tuple[int, int]:
+        """按目标ID范围分批对账 reaction_counts 中一种目标的反应数，返回 (修复行数, 偏差绝对值之和)"""
+        batch_size = settings.COUNTER_RECONCILE_BATCH_SIZE
+        source = Reaction.__table__.c[spec.foreign_key]
+        repaired, total_drift = 0, 0
+
+        async with AsyncSessionLocal() as db:
+            # 已删除目标的旧计数行也要覆盖到
+            max_id = (await db.execute(select(func.greatest(
+                select(func.max(source)).scalar_subquery(),
+                select(func.max(ReactionCounter.target_id))
+                .where(ReactionCounter.target_type == spec.target_type)
+                .scalar_subquery(),
+            )))).scalar()
+            await db.commit()
+            if max_id is None:
+                return 0, 0
+
+            for low in range(0, max_id + 1, batch_size):
+                drifts = await self._repair_reaction_counts(db, spec, low, low + batch_size)
+                await db.commit()
+                await self._extend_lock()
+                if drifts:
+                    repaired += len(drifts)
+                    total_drift += sum(abs(drift) for drift in drifts)
+
+        COUNTER_REPAIRED_ROWS.labels(counter=spec.name).inc(repaired)
+        COUNTER_DRIFT.labels(counter=spec.name).inc(total_drift)
+        return repaired, total_drift
+
+    @staticmethod
+    async def _repair_reaction_counts(db: AsyncSession, spec: ReactionCountSpec, low: int, high: int) -> List[int]:
+        """
+        修复目标ID在 [low, high) 范围内不一致的反应数
+
+        按 (目标, 反应类型) 从 reactions 聚合，与 reaction_counts 全外连接比较：
+        不一致的行改写为实际值，实际为0的行（反应已全部取消或目标已删除）直接删除
+
+        返回:
+            每个修复行的偏差（实际值 - 原值）
+        """
+        source = Reaction.__table__.c[spec.foreign_key]
+        actual = (
+            select(source.label("target_id"), Reaction.type.label("type"), func.count().label("actual"))
+            .where(source >= low, source < high)
+            .group_by(source, Reaction.type)
+            .subquery("actual")
+        )
+        stored = (
+            select(ReactionCounter.target_id, ReactionCounter.type, ReactionCounter.count)
+            .where(
+                ReactionCounter.target_type == spec.target_type,
+                ReactionCounter.target_id >= low,
+                ReactionCounter.target_id < high,
+            )
+            .subquery("stored")
+        )
+        actual_count = func.coalesce(actual.c.actual, 0)
+        stored_count = func.coalesce(stored.c.count, 0)
+        rows = (await db.execute(
+            select(
+                func.coalesce(actual.c.target_id, stored.c.target_id),
+                func.coalesce(actual.c.type, stored.c.type),
+                actual_count,
+                stored_count,
+            )
+            .select_from(actual.join(
+                stored,
+                and_(actual.c.target_id == stored.c.target_id, actual.c.type == stored.c.type),
+                full=True,
+            ))
+            .where(actual_count != stored_count)
+        )).all()
+
+        updates = [
+            {"target_type": spec.target_type, "target_id": target_id, "type": reaction_type, "count": count}
+            for target_id, reaction_type, count, _ in rows if count > 0
+        ]
+        stale = [(target_id, reaction_type) for target_id, reaction_type, count, _ in rows if count == 0]
+        for i in range(0, len(updates), _REACTION_COUNT_WRITE_CHUNK):
+            stmt = pg_insert(ReactionCounter).values(updates[i:i + _REACTION_COUNT_WRITE_CHUNK])
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[ReactionCounter.target_type, ReactionCounter.target_id, ReactionCounter.type],
+                    set_={"count": stmt.excluded.count},
+                )
+            )
+        for i in range(0, len(stale), _REACTION_COUNT_WRITE_CHUNK):
+            await db.execute(
+                delete(ReactionCounter).where(
+                    ReactionCounter.target_type == spec.target_type,
+                    tuple_(ReactionCounter.target_id, ReactionCounter.type).in_(stale[i:i + _REACTION_COUNT_WRITE_CHUNK]),
+                )
+            )
+        return [count - original for _, _, count, original in rows]
+
+    async def _acquire_lock(self) -> bool:
+        """获取对账锁，Redis不可用时直接执行"""
+        self._lock_token = None
+        if not redis_service.is_ready:
+            return True
+        token = uuid.uuid4().hex
+        try:
+            acquired = await redis_service.client.set(
+                self.LOCK_KEY, token, nx=True, ex=settings.COUNTER_RECONCILE_LOCK_TTL
+            )
+        except Exception as e:
+            logger.warning(f"获取计数对账锁失败: {str(e)}")
+            return True
+        if acquired:
+            self._lock_token = token
+        return bool(acquired)
+
+    async def _extend_lock(self) -> None:
+        """
+        续期对账锁
+
+        锁已过期并被其他进程获取时抛出异常，结束本轮对账；Redis出错时继续执行
+        """
+        if self._lock_token is None:
+            return
+        try:
+            if self._extend_script is None:
+                self._extend_script = redis_service.client.register_script(_EXTEND_LOCK_SCRIPT)
+            extended = await self._extend_script(
+                keys=[self.LOCK_KEY], args=[self._lock_token, settings.COUNTER_RECONCILE_LOCK_TTL]
+            )
+        except Exception as e:
+            logger.warning(f"续期计数对账锁失败: {str(e)}")
+            return
+        if not extended:
+            self._lock_token = None
+            raise RuntimeError("计数对账锁已失效，结束本轮对账")
+
+    async def _release_lock(self) -> None:
+        """释放对账锁（仅当锁仍属于本进程）"""
+        token, self._lock_token = self._lock_token, None
+        if token is None:
+            return
+        try:
+            if self._release_script is None:
+                self._release_script = redis_service.client.register_script(_RELEASE_LOCK_SCRIPT)
+            await self._release_script(keys=[self.LOCK_KEY], args=[token])
+        except Exception as e:
+            logger.warning(f"释放计数对账锁失败: {str(e)}")
+
+
+# 创建计数对账任务单例
+counter_reconciler = CounterReconciler()
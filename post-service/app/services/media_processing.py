@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from prometheus_client import Counter, Histogram
+
+from app.core.config import settings
+from app.utils.imaging import generate_derivatives
+from app.utils.storage import storage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PROCESS_DURATION = Histogram(
+    "image_process_duration_seconds",
+    "单张图片解码、生成衍生图和上传的耗时（秒）",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+IMAGE_PROCESS_FAILURES = Counter(
+    "image_process_failures_total",
+    "生成衍生图失败、回退为原图的图片数",
+)
+
+
+class MediaProcessor:
+    """
+    图片衍生图处理
+
+    解码和编码是CPU密集操作，放到进程池中执行，不占用事件循环和GIL；
+    生成的衍生图再通过存储线程池并发上传。处理失败时调用方保留原图。
+    """
+
+    def __init__(self):
+        self.executor: Optional[ProcessPoolExecutor] = None
+        # 限制同时读入内存等待处理的图片数
+        self.semaphore = asyncio.Semaphore(max(settings.IMAGE_PROCESS_WORKERS, 1) * 2)
+
+    async def start(self):
+        """创建进程池（工作进程数为0时不处理图片）"""
+        if self.executor is None and settings.IMAGE_PROCESS_WORKERS > 0:
+            self.executor = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+            logger.info("图片处理进程池已启动")
+
+    async def stop(self):
+        """关闭进程池"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            logger.info("图片处理进程池已停止")
+
+    async def process_image(
+        self,
+        load: Callable[[], Awaitable[bytes]],
+        path: str,
+        widths: Sequence[int],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        生成并上传图片的衍生图
+
+        参数:
+            load: 读取原图内容的协程函数，拿到处理名额后才调用
+            path: 原图的对象路径，衍生图保存为同目录下的 <原名>_w<宽度>.<扩展名>
+            widths: 衍生图的最大宽度列表
+
+        返回:
+            {"width", "height", "blurhash", "variants"}，未启用或处理失败时返回 None
+        """
+        if self.executor is None:
+            return None
+
+        start = time.perf_counter()
+        async with self.semaphore:
+            try:
+                data = await load()
+                loop = asyncio.get_running_loop()
+                processed = await loop.run_in_executor(
+                    self.executor,
+                    generate_derivatives,
+                    data,
+                    list(widths),
+                    list(settings.IMAGE_DERIVATIVE_FORMATS),
+                    settings.IMAGE_DERIVATIVE_QUALITY,
+                    settings.IMAGE_MAX_PIXELS,
+                )
+            except Exception as e:
+                IMAGE_PROCESS_FAILURES.inc()
+                logger.warning(f"生成衍生图失败 {path}: {str(e)}")
+                return None
+
+        base = storage.derivative_base(path)
+        paths = [f"{base}_w{d.width}.{d.extension}" for d in processed.derivatives]
+        try:
+            urls = await asyncio.gather(*(
+                storage.put_bytes(derivative_path, derivative.data, derivative.content_type)
+                for derivative_path, derivative in zip(paths, processed.derivatives)
+            ))
+        except Exception as e:
+            IMAGE_PROCESS_FAILURES.inc()
+            logger.warning(f"上传衍生图失败 {path}: {str(e)}")
+            await storage.delete_files(paths)
+            return None
+
+        IMAGE_PROCESS_DURATION.observe(time.perf_counter() - start)
+        return {
+            "width": processed.width,
+            "height": processed.height,
+            "blurhash": processed.blurhash,
+            "variants": [
+                {"url": url, "width": d.width, "height": d.height, "format": d.format}
+                for url, d in zip(urls, processed.derivatives)
+            ],
+        }
+
+
+# 创建图片处理单例
+media_processor = MediaProcessor()
@@ -0,0 +1,58 @@
+from typing import Dict, Iterable, NamedTuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.reaction import Reaction, ReactionType
+
+
+class ReactionState(NamedTuple):
+    """某个用户对一页帖子/评论的反应状态"""
+    posts: Dict[int, ReactionType]
+    comments: Dict[int, ReactionType]
+
+
+async def load_user_reactions(
+    db: AsyncSession,
+    user_id: int,
+    post_ids: Iterable[int] = (),
+    comment_ids: Iterable[int] = (),
+) -> ReactionState:
+    """
+    用一次 IN (...) 查询获取用户对一组帖子和评论的反应
+
+    参数:
+        db: 数据库会话
+        user_id: 用户ID
+        post_ids: 帖子ID列表
+        comment_ids: 评论ID列表
+
+    返回:
+        帖子ID、评论ID到反应类型的映射
+    """
+    post_ids = list(set(post_ids))
+    comment_ids = list(set(comment_ids))
+    state = ReactionState(posts={}, comments={})
+
+    conditions = []
+    if post_ids:
+        conditions.append(Reaction.post_id.in_(post_ids))
+    if comment_ids:
+        conditions.append(Reaction.comment_id.in_(comment_ids))
+    if not conditions:
+        return state
+
+    rows = await db.execute(
+        select(Reaction.post_id, Reaction.comment_id, Reaction.type).where(
+            Reaction.user_id == user_id,
+            or_(*conditions)
+        )
+    )
+
+    for post_id, comment_id, reaction_type in rows:
+        if post_id is not None:
+            state.posts[post_id] = reaction_type
+        if comment_id is not None:
+            state.comments[comment_id] = reaction_type
+
+    return state
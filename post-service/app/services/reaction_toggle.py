@@ -0,0 +1,132 @@
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.reaction import ReactionType
+
+
+class ToggleResult(NamedTuple):
+    """反应切换的结果"""
+    target_found: bool  # 帖子/评论是否存在
+    reaction: Optional[Dict[str, Any]]  # 切换后的反应，取消反应时为 None
+    delta: int  # 目标点赞数的变化：新增 +1，取消 -1，改类型 0
+
+
+# 目标类型 -> (目标表, 反应表中的外键列, 唯一约束)
+_TARGETS = {
+    "post": ("posts", "post_id", "uix_user_post_reaction"),
+    "comment": ("comments", "comment_id", "uix_user_comment_reaction"),
+}
+
+# 一条语句完成：校验目标、同类型则删除、否则插入或改类型（依赖唯一约束）、
+# 更新点赞数和按类型汇总的反应数（reaction_counts）。
+# 各 CTE 共用同一快照，因此 upserted 通过 NOT EXISTS (removed) 避免在取消时重新插入，
+# existing 读到的是改类型之前的类型；xmax = 0 表示本次是插入而不是 ON CONFLICT 更新。
+# counted、tallied 未被引用也会执行。
+_TOGGLE_SQL = """
+WITH target AS (
+    SELECT id FROM {table} WHERE id = :target_id
+),
+existing AS (
+    SELECT type FROM reactions WHERE user_id = :user_id AND {column} = :target_id
+),
+removed AS (
+    DELETE FROM reactions
+    WHERE user_id = :user_id
+      AND {column} = :target_id
+      AND type = CAST(:type AS reactiontype)
+    RETURNING id
+),
+upserted AS (
+    INSERT INTO reactions (user_id, type, {column})
+    SELECT :user_id, CAST(:type AS reactiontype), target.id
+    FROM target
+    WHERE NOT EXISTS (SELECT 1 FROM removed)
+    ON CONFLICT ON CONSTRAINT {constraint}
+    DO UPDATE SET type = EXCLUDED.type, updated_at = now()
+    RETURNING id, user_id, type, post_id, comment_id, created_at, (xmax = 0) AS inserted
+),
+delta AS (
+    SELECT (SELECT count(*) FROM upserted WHERE inserted) - (SELECT count(*) FROM removed) AS value
+),
+counted AS (
+    UPDATE {table}
+    SET like_count = GREATEST(COALESCE(like_count, 0) + (SELECT value FROM delta), 0)
+    WHERE id = :target_id AND (SELECT value FROM delta) <> 0
+    RETURNING id
+),
+changes AS (
+    SELECT CAST(:type AS reactiontype) AS type, -1 AS delta FROM removed
+    UNION ALL
+    SELECT upserted.type, 1 FROM upserted WHERE upserted.inserted
+    UNION ALL
+    SELECT changed.type, changed.delta
+    FROM upserted, existing,
+         LATERAL (VALUES (upserted.type, 1), (existing.type, -1)) AS changed (type, delta)
+    WHERE NOT upserted.inserted AND existing.type <> upserted.type
+),
+tallied AS (
+    INSERT INTO reaction_counts (target_type, target_id, type, count)
+    SELECT :target_type, :target_id, type, sum(delta)
+    FROM changes
+    GROUP BY type
+    ON CONFLICT (target_type, target_id, type)
+    DO UPDATE SET count = reaction_counts.count + EXCLUDED.count
+    RETURNING type
+)
+SELECT
+    EXISTS (SELECT 1 FROM target) AS target_found,
+    (SELECT value FROM delta) AS delta,
+    upserted.id, upserted.user_id, upserted.type, upserted.post_id, upserted.comment_id, upserted.created_at
+FROM (SELECT 1) AS one
+LEFT JOIN upserted ON true
+"""
+
+_TOGGLE_STATEMENTS = {
+    target_type: text(_TOGGLE_SQL.format(table=table, column=column, constraint=constraint))
+    for target_type, (table, column, constraint) in _TARGETS.items()
+}
+
+
+async def toggle_reaction(
+    db: AsyncSession,
+    user_id: int,
+    reaction_type: ReactionType,
+    target_type: str,
+    target_id: int,
+) -> ToggleResult:
+    """
+    切换用户对帖子或评论的反应，单条语句完成读写和计数更新
+
+    - 不存在反应：新增，点赞数 +1；
+    - 已有相同类型：取消，点赞数 -1；
+    - 已有不同类型：改为新类型，点赞数不变。
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        user_id: 用户ID
+        reaction_type: 反应类型
+        target_type: "post" 或 "comment"
+        target_id: 帖子或评论ID
+
+    返回:
+        ToggleResult
+    """
+    row = (await db.execute(
+        _TOGGLE_STATEMENTS[target_type],
+        # 数据库枚举标签是成员名（如 LIKE），不是值
+        {"user_id": user_id, "type": reaction_type.name, "target_type": target_type, "target_id": target_id},
+    )).one()
+
+    reaction = None
+    if row.id is not None:
+        reaction = {
+            "id": row.id,
+            "user_id": row.user_id,
+            "type": ReactionType[row.type],
+            "post_id": row.post_id,
+            "comment_id": row.comment_id,
+            "created_at": row.created_at,
+        }
+    return ToggleResult(target_found=row.target_found, reaction=reaction, delta=row.delta)
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from elasticsearch.helpers import async_bulk
+from prometheus_client import Counter, Histogram
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.post import Post, Visibility, post_tag_association
+from app.models.search_index import SearchIndexEntry
+from app.utils.elasticsearch import es_service
+from app.utils.user_cache import user_profile_cache
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_DOCUMENTS = Counter(
+    "search_index_documents_total",
+    "批量写入搜索索引的帖子数",
+    ["op"],  # index / delete
+)
+SEARCH_INDEX_FAILURES = Counter(
+    "search_index_failures_total",
+    "写入搜索索引失败、等待重试的帖子数",
+)
+SEARCH_INDEX_FLUSH_DURATION = Histogram(
+    "search_index_flush_duration_seconds",
+    "一次批量写入搜索索引的耗时（秒）",
+)
+
+# 清理过期登记的间隔（秒）
+_PURGE_INTERVAL = 60
+
+
+def post_select():
+    """索引所需的列，标签名用子查询聚合为数组，避免逐行加载关系"""
+    tags = (
+        select(func.array_agg(post_tag_association.c.tag_name))
+        .where(post_tag_association.c.post_id == Post.id)
+        .scalar_subquery()
+    )
+    return select(
+        Post.id, Post.user_id, Post.content, Post.location, Post.media_type, Post.visibility,
+        Post.comment_count, Post.like_count, Post.created_at, Post.updated_at,
+        tags.label("tags"),
+    )
+
+
+async def post_actions(index: str, rows: Sequence[Any]) -> List[Dict[str, Any]]:
+    """
+    把 post_select() 查询到的行转换为批量写入的动作
+
+    公开帖子写入文档，其他帖子删除文档（帖子可能已改为非公开）；
+    作者资料通过缓存批量获取
+
+    参数:
+        index: 索引名或别名
+        rows: post_select() 的结果行
+
+    返回:
+        bulk API 的动作列表
+    """
+    profiles = await user_profile_cache.get_many(row.user_id for row in rows)
+    actions = []
+    for row in rows:
+        if row.visibility != Visibility.PUBLIC:
+            actions.append({"_op_type": "delete", "_index": index, "_id": row.id})
+            continue
+        actions.append({
+            "_index": index,
+            "_id": row.id,
+            "_source": es_service.build_document({
+                "id": row.id,
+                "user_id": row.user_id,
+                "user": profiles.get(row.user_id),
+                "content": row.content or "",
+                "tags": row.tags or [],
+                "location": row.location or "",
+                "media_type": row.media_type.value,
+                "visibility": row.visibility.value,
+                "comment_count": row.comment_count,
+                "like_count": row.like_count,
+                "created_at": row.created_at,
+                "updated_at": row.updated_at,
+            }),
+        })
+    return actions
+
+
+class SearchIndexer:
+    """
+    帖子搜索索引的批量写入器
+
+    发件箱转发时把变更的帖子ID写入登记表 search_index_queue（与事件的已处理标记同一事务），
+    后台任务每隔 SEARCH_INDEX_FLUSH_INTERVAL 秒用 SELECT ... FOR UPDATE SKIP LOCKED
+    取出一批待写入的登记，从数据库读取这些帖子的最新状态，通过 bulk API 一次写入，
+    成功后才记录 indexed_at。同一帖子在一个周期内的多次变更（编辑、点赞、评论）合并为
+    一次写入；写入的是读取时的最新状态，因此与事件顺序无关。
+
+    Elasticsearch不可用、请求失败或进程崩溃时登记保留在表中，恢复后继续写入；
+    多个工作进程同时写入也不会取到同一批帖子。已写入的登记保留
+    SEARCH_INDEX_QUEUE_RETENTION 秒，供重建索引脚本补齐加载期间的变更。
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        # 上次清理过期登记的时间（loop.time()）
+        self._purged_at = 0.0
+
+    @staticmethod
+    async def enqueue(db: AsyncSession, post_ids: Iterable[int]) -> None:
+        """
+        登记需要重新索引的帖子，随调用方的事务一起提交
+
+        参数:
+            db: 数据库会话（调用方负责提交）
+            post_ids: 帖子ID（可重复）
+        """
+        # 按ID顺序写入，并发登记同一批帖子时不会互相死锁
+        post_ids = sorted(set(post_ids))
+        if not post_ids:
+            return
+        stmt = pg_insert(SearchIndexEntry).values([{"post_id": post_id} for post_id in post_ids])
+        # 正在写入的登记被行锁保护，重新登记会等写入提交后再把它标记为待写入
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[SearchIndexEntry.post_id],
+            set_={"queued_at": func.now(), "indexed_at": None},
+        ))
+
+    async def start(self):
+        """启动后台写入任务"""
+        if self.task is None:
+            self.task = asyncio.create_task(self.flush_loop())
+            logger.info("搜索索引写入任务已启动")
+
+    async def stop(self):
+        """停止后台写入任务（未写入的登记留在表中，由下次启动后写入）"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+            logger.info("搜索索引写入任务已停止")
+
+    async def flush_loop(self):
+        """定期写入循环：有积压时连续写入，否则按写入间隔等待"""
+        try:
+            while True:
+                written = None
+                try:
+                    written = await asyncio.shield(self.flush())
+                    loop_time = asyncio.get_running_loop().time()
+                    if loop_time - self._purged_at >= _PURGE_INTERVAL:
+                        self._purged_at = loop_time
+                        await asyncio.shield(self.purge())
+                except Exception as e:
+                    logger.error(f"写入搜索索引失败: {str(e)}")
+
+                if written is None or written < settings.SEARCH_INDEX_BATCH_SIZE:
+                    await asyncio.sleep(settings.SEARCH_INDEX_FLUSH_INTERVAL)
+        except asyncio.CancelledError:
+            pass
+
+    async def flush(self) -> Optional[int]:
+        """
+        写入一批登记的帖子
+
+        返回:
+            取出的登记数，Elasticsearch不可用或请求失败时返回 None（登记保留待重试）
+        """
+        if not es_service.is_ready:
+            return None
+
+        async with AsyncSessionLocal() as db:
+            post_ids = (await db.execute(
+                select(SearchIndexEntry.post_id)
+                .where(SearchIndexEntry.indexed_at.is_(None))
+                .order_by(SearchIndexEntry.queued_at)
+                .limit(settings.SEARCH_INDEX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not post_ids:
+                await db.rollback()
+                return 0
+
+            start = time.perf_counter()
+            try:
+                failed = await self._write(db, post_ids)
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"写入搜索索引失败，将在下次重试: {str(e)}")
+                SEARCH_INDEX_FAILURES.inc(len(post_ids))
+                return None
+            finally:
+                SEARCH_INDEX_FLUSH_DURATION.observe(time.perf_counter() - start)
+
+            # 写入失败的帖子保持待写入，下次重试
+            written = [post_id for post_id in post_ids if post_id not in failed]
+            if written:
+                await db.execute(
+                    update(SearchIndexEntry)
+                    .where(SearchIndexEntry.post_id.in_(written))
+                    .values(indexed_at=func.now())
+                )
+            await db.commit()
+
+        if failed:
+            SEARCH_INDEX_FAILURES.inc(len(failed))
+        return len(post_ids)
+
+    async def purge(self) -> None:
+        """删除已写入且超过保留时间的登记"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(SearchIndexEntry)
+                .where(SearchIndexEntry.indexed_at < func.now() - timedelta(seconds=settings.SEARCH_INDEX_QUEUE_RETENTION))
+            )
+            await db.commit()
+
+    async def _write(self, db: AsyncSession, post_ids: Sequence[int]) -> Set[int]:
+        """读取帖子的最新状态并批量写入，返回写入失败的帖子ID"""
+        index = es_service.index_name
+        rows = (await db.execute(post_select().where(Post.id.in_(post_ids)))).all()
+
+        actions = await post_actions(index, rows)
+        # 已删除的帖子
+        found = {row.id for row in rows}
+        actions.extend({"_op_type": "delete", "_index": index, "_id": post_id} for post_id in post_ids if post_id not in found)
+
+        _, errors = await async_bulk(es_service.client, actions, raise_on_error=False, raise_on_exception=True)
+
+        failed = set()
+        for error in errors:
+            op, info = next(iter(error.items()))
+            # 删除不存在的文档返回 404，不算失败
+            if op == "delete" and info.get("status") == 404:
+                continue
+            failed.add(int(info["_id"]))
+            logger.warning(f"索引帖子失败: {info}")
+
+        deletes = sum(1 for action in actions if action.get("_op_type") == "delete")
+        SEARCH_INDEX_DOCUMENTS.labels(op="index").inc(len(actions) - deletes)
+        SEARCH_INDEX_DOCUMENTS.labels(op="delete").inc(deletes)
+        return failed
+
+
+# 创建搜索索引写入器单例
+search_indexer = SearchIndexer()
@@ -0,0 +1,92 @@
+from typing import Iterable, List
+
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.post import Tag, post_tag_association
+
+
+def normalize_tag_names(names: Iterable[str]) -> List[str]:
+    """
+    规范化标签名：去除首尾空白、转小写、去掉空值并去重
+
+    返回值按名称排序，多个事务以相同顺序锁定标签行，避免死锁
+    """
+    return sorted({name.strip().lower() for name in names if name and name.strip()})
+
+
+async def add_post_tags(db: AsyncSession, post_id: int, names: List[str]) -> None:
+    """
+    为帖子添加标签，语句数与标签数量无关
+
+    1. INSERT ... ON CONFLICT DO NOTHING 补齐不存在的标签；
+    2. 一条 UPDATE 原子地增加 post_count；
+    3. 批量插入 post_tag 关联行。
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        post_id: 帖子ID，新帖子需先 flush 获得ID
+        names: 已规范化的标签名列表
+    """
+    if not names:
+        return
+
+    pending = list(names)
+    while pending:
+        await db.execute(
+            pg_insert(Tag)
+            .values([{"name": name, "post_count": 0} for name in pending])
+            .on_conflict_do_nothing(index_elements=[Tag.name])
+        )
+        result = await db.execute(
+            update(Tag)
+            .where(Tag.name.in_(pending))
+            .values(post_count=Tag.post_count + 1)
+            .returning(Tag.name)
+            .execution_options(synchronize_session=False)
+        )
+        # 标签在插入后被并发删除（计数归零）时不会被更新，重新插入后再计数
+        updated = set(result.scalars().all())
+        pending = [name for name in pending if name not in updated]
+
+    await db.execute(
+        pg_insert(post_tag_association)
+        .values([{"post_id": post_id, "tag_name": name} for name in names])
+        .on_conflict_do_nothing()
+    )
+
+
+async def remove_post_tags(db: AsyncSession, post_id: int, names: List[str]) -> None:
+    """
+    移除帖子的标签，原子地减少 post_count，并删除不再被引用的标签
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        post_id: 帖子ID
+        names: 已规范化的标签名列表
+    """
+    if not names:
+        return
+
+    await db.execute(
+        delete(post_tag_association).where(
+            post_tag_association.c.post_id == post_id,
+            post_tag_association.c.tag_name.in_(names),
+        )
+    )
+    await db.execute(
+        update(Tag)
+        .where(Tag.name.in_(names))
+        .values(post_count=Tag.post_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(Tag)
+        .where(
+            Tag.name.in_(names),
+            Tag.post_count <= 0,
+            ~exists(select(post_tag_association.c.post_id).where(post_tag_association.c.tag_name == Tag.name)),
+        )
+        .execution_options(synchronize_session=False)
+    )
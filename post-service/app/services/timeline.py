@@ -0,0 +1,454 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import httpx
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.post import Post, Visibility
+from app.utils.http_client import user_service_client
+from app.utils.redis_client import redis_service
+
+logger = logging.getLogger(__name__)
+
+FEED_READS = Counter(
+    "feed_reads_total",
+    "首页时间线读取次数",
+    ["source"],  # cache / rebuild / database
+)
+FEED_READ_ITEMS = Counter(
+    "feed_read_items_total",
+    "首页时间线返回的帖子数",
+    ["mode"],  # push：来自推送的时间线 / pull：读取时从大V的发帖列表拉取
+)
+FEED_FANOUT_POSTS = Counter(
+    "feed_fanout_posts_total",
+    "扇出的帖子数",
+    ["mode"],  # push：写入关注者时间线 / pull：作者关注者过多，只写入作者的发帖列表
+)
+FEED_FANOUT_WRITES = Counter(
+    "feed_fanout_writes_total",
+    "扇出写入的时间线数",
+)
+FEED_FANOUT_DURATION = Histogram(
+    "feed_fanout_duration_seconds",
+    "单个帖子扇出的耗时（秒）",
+    ["mode"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+FEED_FANOUT_QUEUE_DEPTH = Gauge(
+    "feed_fanout_queue_depth",
+    "等待扇出的帖子数",
+)
+
+# 只写入已存在的有序集合：冷数据在读取时从数据库重建，避免只含少量新帖子的残缺列表
+_PUSH_SCRIPT = """
+local length = tonumber(ARGV[3])
+local pushed = 0
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('ZADD', key, ARGV[1], ARGV[2])
+        redis.call('ZREMRANGEBYRANK', key, 0, -(length + 1))
+        pushed = pushed + 1
+    end
+end
+return pushed
+"""
+
+# 空列表的占位成员（分数为0，读取范围从1开始，不会被返回）
+_PLACEHOLDER = "0"
+
+
+class _SourcePage(NamedTuple):
+    """从一个缓存有序集合读取的一页"""
+    post_ids: List[int]  # 新到旧，最多 size + 1 个
+    floor: int  # 已被截断时缓存中最小的帖子ID，更早的帖子只在数据库中；未截断时为0
+
+
+class TimelineService:
+    """
+    首页时间线（推拉结合）
+
+    - 推：普通作者发帖后，由后台工作协程把帖子ID推入每个关注者的时间线
+      feed:{user_id}；
+    - 拉：关注者数量达到 FEED_CELEBRITY_THRESHOLD 的作者只把帖子写入自己的
+      发帖列表 author_posts:{user_id}，关注者读取时再拉取并合并。
+
+    有序集合的成员和分数都是帖子ID。帖子ID按创建顺序分配，因此按ID归并即按
+    created_at 归并，且没有相同时间的并列问题。列表长度限制为 FEED_MAX_LENGTH，
+    超过 FEED_TTL 未读取会过期；过期或关注关系变化后，下次读取时从数据库重建。
+
+    当前处于拉模式的作者记录在 feed_celebrities 中。作者首次达到（或重新达到）
+    阈值时递增全局版本号 feed_celebrity_version；每个大V列表记录重建时的版本号，
+    版本号不一致的列表在读取时重建，避免该作者之后的帖子从已缓存的时间线中消失。
+    """
+
+    FEED_KEY_PREFIX = "feed"
+    PULL_KEY_PREFIX = "feed_pull"
+    AUTHOR_KEY_PREFIX = "author_posts"
+    PULL_VERSION_KEY_PREFIX = "feed_pull_version"
+    CELEBRITIES_KEY = "feed_celebrities"
+    CELEBRITY_VERSION_KEY = "feed_celebrity_version"
+
+    def __init__(self):
+        self._push = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def feed_key(self, user_id: int) -> str:
+        return f"{self.FEED_KEY_PREFIX}:{user_id}"
+
+    def pull_key(self, user_id: int) -> str:
+        """用户关注的大V列表（读取时拉取）"""
+        return f"{self.PULL_KEY_PREFIX}:{user_id}"
+
+    def author_key(self, user_id: int) -> str:
+        """大V的发帖列表"""
+        return f"{self.AUTHOR_KEY_PREFIX}:{user_id}"
+
+    def pull_version_key(self, user_id: int) -> str:
+        """大V列表重建时的全局版本号"""
+        return f"{self.PULL_VERSION_KEY_PREFIX}:{user_id}"
+
+    async def start(self):
+        """启动扇出工作协程"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.FEED_FANOUT_QUEUE_SIZE)
+        FEED_FANOUT_QUEUE_DEPTH.set_function(self._queue.qsize)
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(settings.FEED_FANOUT_WORKERS)
+        ]
+        logger.info(f"时间线扇出任务已启动，工作协程数: {settings.FEED_FANOUT_WORKERS}")
+
+    async def stop(self):
+        """等待队列中的扇出完成（有超时），然后停止工作协程"""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=settings.FEED_FANOUT_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"停止时仍有 {self._queue.qsize()} 个帖子未完成扇出")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        logger.info("时间线扇出任务已停止")
+
+    async def schedule_fan_out(self, post_id: int, author_id: int, visibility: Visibility) -> None:
+        """
+        把新帖子加入扇出队列（提交后调用）
+
+        仅自己可见的帖子不扇出；队列已满时等待，对发帖请求形成背压
+        """
+        if visibility == Visibility.PRIVATE or self._queue is None:
+            return
+        await self._queue.put((post_id, author_id))
+
+    async def _worker(self):
+        """扇出工作协程，并发数由工作协程数量限制"""
+        while True:
+            post_id, author_id = await self._queue.get()
+            try:
+                await self.fan_out(post_id, author_id)
+            finally:
+                self._queue.task_done()
+
+    async def fan_out(self, post_id: int, author_id: int) -> None:
+        """
+        扇出一个帖子：推入作者自己的时间线；关注者较少时推入所有关注者的时间线，
+        否则只写入作者的发帖列表，由关注者读取时拉取
+        """
+        if not redis_service.is_ready:
+            return
+        start = time.perf_counter()
+        mode = "push"
+        try:
+            await self._push_to([self.feed_key(author_id)], post_id)
+            follower_ids, after_id, total = await self._fetch_followers(author_id, None)
+            if total >= settings.FEED_CELEBRITY_THRESHOLD:
+                mode = "pull"
+                await self._push_to([self.author_key(author_id)], post_id)
+                await self._mark_celebrity(author_id)
+                return
+            await redis_service.client.srem(self.CELEBRITIES_KEY, author_id)
+            while True:
+                if follower_ids:
+                    await self._push_to([self.feed_key(follower_id) for follower_id in follower_ids], post_id)
+                if after_id is None:
+                    break
+                follower_ids, after_id, _ = await self._fetch_followers(author_id, after_id)
+        except Exception as e:
+            logger.error(f"扇出帖子 {post_id} 到关注者时间线失败: {str(e)}")
+        finally:
+            FEED_FANOUT_POSTS.labels(mode=mode).inc()
+            FEED_FANOUT_DURATION.labels(mode=mode).observe(time.perf_counter() - start)
+
+    async def _mark_celebrity(self, author_id: int) -> None:
+        """
+        记录作者进入拉模式；首次进入时递增全局版本号，
+        使此前缓存的大V列表（不含该作者）在读取时重建
+        """
+        client = redis_service.client
+        if await client.sadd(self.CELEBRITIES_KEY, author_id):
+            await client.incr(self.CELEBRITY_VERSION_KEY)
+            logger.info(f"作者 {author_id} 的关注者数量达到阈值，改为读取时拉取")
+
+    async def invalidate(self, user_id: int) -> None:
+        """删除用户的时间线和大V列表（关注关系变化后调用），下次读取时重建"""
+        if not redis_service.is_ready:
+            return
+        try:
+            await redis_service.client.delete(
+                self.feed_key(user_id), self.pull_key(user_id), self.pull_version_key(user_id)
+            )
+        except Exception as e:
+            logger.warning(f"删除用户 {user_id} 的时间线失败: {str(e)}")
+
+    async def read(self, db: AsyncSession, user_id: int, before_id: Optional[int], size: int) -> Tuple[List[int], bool]:
+        """
+        读取时间线中的一页帖子ID
+
+        参数:
+            db: 数据库会话（重建或Redis不可用时查询）
+            user_id: 用户ID
+            before_id: 只返回ID小于该值的帖子，为空时从最新开始
+            size: 每页数量
+
+        返回:
+            (帖子ID列表（新到旧）, 是否还有更多)
+        """
+        post_ids: List[int] = []
+        if redis_service.is_ready:
+            try:
+                post_ids, has_more, complete = await self._read_cached(db, user_id, before_id, size)
+                # 缓存已被截断时，翻到末尾后继续从数据库读取更早的帖子
+                if has_more or complete:
+                    return post_ids, has_more
+                if post_ids:
+                    before_id = post_ids[-1]
+            except Exception as e:
+                logger.warning(f"读取用户 {user_id} 的时间线缓存失败，改为查询数据库: {str(e)}")
+                post_ids = []
+
+        FEED_READS.labels(source="database").inc()
+        author_ids = await self._fetch_following(user_id)
+        remaining = size - len(post_ids)
+        older_ids = await self._query_post_ids(db, user_id, author_ids, before_id, remaining + 1)
+        FEED_READ_ITEMS.labels(mode="push").inc(min(len(older_ids), remaining))
+        return post_ids + older_ids[:remaining], len(older_ids) > remaining
+
+    async def _read_cached(
+        self, db: AsyncSession, user_id: int, before_id: Optional[int], size: int
+    ) -> Tuple[List[int], bool, bool]:
+        """
+        从推送的时间线和关注的大V发帖列表各取一页并归并
+
+        返回:
+            (帖子ID列表, 是否还有更多, 缓存中的结果是否完整)
+        """
+        client = redis_service.client
+        feed_key = self.feed_key(user_id)
+
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.exists(feed_key)
+            pipe.smembers(self.pull_key(user_id))
+            pipe.get(self.pull_version_key(user_id))
+            pipe.get(self.CELEBRITY_VERSION_KEY)
+            feed_exists, celebrity_members, pull_version, celebrity_version = await pipe.execute()
+
+        if feed_exists and celebrity_members and pull_version == (celebrity_version or "0"):
+            FEED_READS.labels(source="cache").inc()
+        else:
+            FEED_READS.labels(source="rebuild").inc()
+            celebrity_members = await self._rebuild(db, user_id, celebrity_version)
+
+        celebrity_ids = [int(member) for member in celebrity_members if member != _PLACEHOLDER]
+        author_keys = [self.author_key(celebrity_id) for celebrity_id in celebrity_ids]
+        await self._ensure_author_lists(db, celebrity_ids)
+
+        pages = await self._read_pages([feed_key] + author_keys, before_id, size)
+        pulled_ids = set()
+        for page in pages[1:]:
+            pulled_ids.update(page.post_ids)
+
+        # 截断的列表中比 floor 更早的帖子已不在缓存中，只能信任 floor 以上的部分
+        floor = max(page.floor for page in pages)
+        merged = [post_id for post_id in self._merge(page.post_ids for page in pages) if post_id >= floor]
+
+        post_ids = merged[:size]
+        FEED_READ_ITEMS.labels(mode="pull").inc(sum(1 for post_id in post_ids if post_id in pulled_ids))
+        FEED_READ_ITEMS.labels(mode="push").inc(sum(1 for post_id in post_ids if post_id not in pulled_ids))
+        return post_ids, len(merged) > size, floor == 0
+
+    async def _read_pages(self, keys: List[str], before_id: Optional[int], size: int) -> List[_SourcePage]:
+        """在一次往返中读取多个有序集合的一页，并续期"""
+        max_score = f"({before_id}" if before_id is not None else "+inf"
+        async with redis_service.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.zrevrangebyscore(key, max_score, 1, start=0, num=size + 1)
+                pipe.zcount(key, 1, "+inf")
+                pipe.zrangebyscore(key, 1, "+inf", start=0, num=1, withscores=True)
+                pipe.expire(key, settings.FEED_TTL)
+            results = await pipe.execute()
+
+        pages = []
+        for i in range(0, len(results), 4):
+            members, cached_count, lowest, _ = results[i:i + 4]
+            truncated = cached_count >= settings.FEED_MAX_LENGTH and bool(lowest)
+            pages.append(_SourcePage(
+                post_ids=[int(member) for member in members],
+                floor=int(lowest[0][1]) if truncated else 0,
+            ))
+        return pages
+
+    @staticmethod
+    def _merge(pages: Iterable[List[int]]) -> List[int]:
+        """k路归并多个新到旧的帖子ID列表并去重"""
+        merged: List[int] = []
+        for post_id in heapq.merge(*pages, reverse=True):
+            if not merged or merged[-1] != post_id:
+                merged.append(post_id)
+        return merged
+
+    async def _rebuild(self, db: AsyncSession, user_id: int, celebrity_version: Optional[str]) -> List[str]:
+        """
+        根据关注列表从数据库重建时间线和大V列表（用户服务不可用时不重建，避免缓存残缺的时间线）
+
+        参数:
+            celebrity_version: 查询关注列表之前读取的全局版本号，重建期间有作者达到阈值时
+                版本号会不一致，下次读取再次重建
+
+        返回:
+            大V列表的成员（含占位成员）
+        """
+        author_ids = await self._fetch_following(user_id, raise_on_error=True)
+        celebrity_ids = await self._fetch_following(
+            user_id, raise_on_error=True, min_followers=settings.FEED_CELEBRITY_THRESHOLD
+        )
+        post_ids = await self._query_post_ids(db, user_id, author_ids, None, settings.FEED_MAX_LENGTH)
+
+        feed_key, pull_key, version_key = self.feed_key(user_id), self.pull_key(user_id), self.pull_version_key(user_id)
+        celebrity_members = [_PLACEHOLDER] + [str(celebrity_id) for celebrity_id in celebrity_ids]
+        async with redis_service.client.pipeline(transaction=True) as pipe:
+            pipe.delete(feed_key, pull_key)
+            pipe.zadd(feed_key, {_PLACEHOLDER: 0, **{str(post_id): post_id for post_id in post_ids}})
+            pipe.sadd(pull_key, *celebrity_members)
+            pipe.set(version_key, celebrity_version or "0", ex=settings.FEED_TTL)
+            pipe.expire(feed_key, settings.FEED_TTL)
+            pipe.expire(pull_key, settings.FEED_TTL)
+            await pipe.execute()
+
+        # 查询之后、写入之前提交并扇出的帖子：推送时时间线不存在（或随后被删除），
+        # 只写入了数据库，需要补入
+        newer_ids = await self._query_post_ids(
+            db, user_id, author_ids, None, settings.FEED_MAX_LENGTH, after_id=max(post_ids, default=0)
+        )
+        if newer_ids:
+            async with redis_service.client.pipeline(transaction=True) as pipe:
+                pipe.zadd(feed_key, {str(post_id): post_id for post_id in newer_ids})
+                pipe.zremrangebyrank(feed_key, 0, -(settings.FEED_MAX_LENGTH + 1))
+                await pipe.execute()
+        return celebrity_members
+
+    async def _ensure_author_lists(self, db: AsyncSession, author_ids: List[int]) -> None:
+        """为缺失的大V发帖列表从数据库重建（一次查询）"""
+        if not author_ids:
+            return
+        async with redis_service.client.pipeline(transaction=False) as pipe:
+            for author_id in author_ids:
+                pipe.exists(self.author_key(author_id))
+            exists = await pipe.execute()
+        missing = [author_id for author_id, found in zip(author_ids, exists) if not found]
+        if not missing:
+            return
+
+        # 每个作者取最近 FEED_MAX_LENGTH 个帖子
+        ranked = (
+            select(
+                Post.user_id,
+                Post.id,
+                func.row_number().over(partition_by=Post.user_id, order_by=Post.id.desc()).label("rank"),
+            )
+            .where(Post.user_id.in_(missing), Post.visibility != Visibility.PRIVATE)
+            .subquery()
+        )
+        rows = (await db.execute(
+            select(ranked.c.user_id, ranked.c.id).where(ranked.c.rank <= settings.FEED_MAX_LENGTH)
+        )).all()
+
+        posts_by_author = {author_id: {_PLACEHOLDER: 0} for author_id in missing}
+        for author_id, post_id in rows:
+            posts_by_author[author_id][str(post_id)] = post_id
+        async with redis_service.client.pipeline(transaction=False) as pipe:
+            for author_id, members in posts_by_author.items():
+                key = self.author_key(author_id)
+                pipe.zadd(key, members)
+                pipe.expire(key, settings.FEED_TTL)
+            await pipe.execute()
+
+    async def _query_post_ids(
+        self, db: AsyncSession, user_id: int, author_ids: List[int], before_id: Optional[int], limit: int,
+        after_id: Optional[int] = None,
+    ) -> List[int]:
+        """查询自己和关注的人的帖子ID（新到旧），他人仅自己可见的帖子除外"""
+        stmt = select(Post.id).where(
+            or_(
+                Post.user_id == user_id,
+                Post.user_id.in_(author_ids) & (Post.visibility != Visibility.PRIVATE),
+            )
+        )
+        if before_id is not None:
+            stmt = stmt.where(Post.id < before_id)
+        if after_id is not None:
+            stmt = stmt.where(Post.id > after_id)
+        result = await db.execute(stmt.order_by(Post.id.desc()).limit(limit))
+        return list(result.scalars().all())
+
+    async def _push_to(self, keys: List[str], post_id: int) -> None:
+        if self._push is None:
+            self._push = redis_service.client.register_script(_PUSH_SCRIPT)
+        pushed = await self._push(keys=keys, args=[post_id, post_id, settings.FEED_MAX_LENGTH])
+        FEED_FANOUT_WRITES.inc(pushed)
+
+    async def _fetch_followers(self, user_id: int, after_id: Optional[int]) -> Tuple[List[int], Optional[int], int]:
+        """从用户服务获取一页关注者，返回 (关注者ID列表, 下一页的 after_id, 关注者总数)"""
+        client = await user_service_client.get_client()
+        params = {"limit": settings.FEED_FANOUT_PAGE_SIZE}
+        if after_id is not None:
+            params["after_id"] = after_id
+        response = await client.get(f"/users/{user_id}/followers", params=params)
+        response.raise_for_status()
+        data = response.json()
+        return data.get("followers", []), data.get("next_after_id"), data.get("total", 0)
+
+    async def _fetch_following(
+        self, user_id: int, raise_on_error: bool = False, min_followers: Optional[int] = None
+    ) -> List[int]:
+        """
+        从用户服务获取关注列表，默认在不可用时返回空列表（只包含自己的帖子）
+
+        参数:
+            min_followers: 只返回关注者数量不少于该值的用户
+        """
+        params = {"min_followers": min_followers} if min_followers is not None else None
+        try:
+            client = await user_service_client.get_client()
+            response = await client.get(f"/users/{user_id}/following", params=params)
+            response.raise_for_status()
+            return response.json().get("following", [])
+        except httpx.HTTPError as e:
+            if raise_on_error:
+                raise
+            logger.warning(f"获取用户 {user_id} 的关注列表失败: {str(e)}")
+            return []
+
+
+# 创建时间线服务单例
+timeline_service = TimelineService()
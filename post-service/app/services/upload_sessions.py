@@ -0,0 +1,244 @@
+import logging
+import math
+import mimetypes
+import uuid
+from typing import Dict, List, NamedTuple, Optional
+
+from app.core.config import settings
+from app.utils.redis_client import redis_service
+from app.utils.storage import media_key_prefix, storage
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSessionError(Exception):
+    """分块上传请求不合法（块编号、块大小、会话状态等）"""
+
+
+class UploadSessionUnavailable(Exception):
+    """Redis不可用，无法保存会话状态"""
+
+
+class UploadSession(NamedTuple):
+    """分块上传会话的状态"""
+    session_id: str
+    object_key: str  # 完成后提交给 POST /posts/media 的对象键
+    content_type: str
+    size: int  # 文件总大小（字节）
+    chunk_size: int  # 除最后一块外每块的大小
+    total_chunks: int
+    received: List[int]  # 已收到的块编号（从1开始，升序）
+
+    @property
+    def offset(self) -> int:
+        """从文件开头连续收到的字节数，客户端从这里继续上传"""
+        contiguous = 0
+        for number in self.received:
+            if number != contiguous + 1:
+                break
+            contiguous = number
+        return min(contiguous * self.chunk_size, self.size)
+
+    @property
+    def next_chunk(self) -> Optional[int]:
+        """第一个未收到的块编号，全部收到时为 None"""
+        received = set(self.received)
+        for number in range(1, self.total_chunks + 1):
+            if number not in received:
+                return number
+        return None
+
+    def chunk_length(self, number: int) -> int:
+        """第 number 块应有的字节数"""
+        if number == self.total_chunks:
+            return self.size - (self.total_chunks - 1) * self.chunk_size
+        return self.chunk_size
+
+
+class UploadSessionService:
+    """
+    可续传的分块上传
+
+    每个会话对应一次MinIO分片上传，第 N 块即第 N 个分片；
+    会话元数据和已收到分片的 ETag 保存在Redis中，并在每次上传块后续期。
+    客户端断线后查询会话即可从 offset 继续，已上传的块不需要重传。
+
+    会话过期后Redis中的状态被清除，MinIO中未完成的分片由其过期清理机制回收。
+    """
+
+    KEY_PREFIX = "upload_session"
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.KEY_PREFIX}:{session_id}"
+
+    def _parts_key(self, session_id: str) -> str:
+        return f"{self.KEY_PREFIX}:{session_id}:parts"
+
+    def _client(self):
+        if not redis_service.is_ready:
+            raise UploadSessionUnavailable()
+        return redis_service.client
+
+    async def create(self, user_id: int, filename: str, content_type: str, size: int) -> UploadSession:
+        """
+        创建会话并在MinIO中开始分片上传
+
+        参数:
+            user_id: 上传者ID
+            filename: 原始文件名（仅记录）
+            content_type: 内容类型（调用方已校验）
+            size: 文件总大小（调用方已校验上限）
+
+        返回:
+            新的会话
+        """
+        client = self._client()
+        chunk_size = settings.UPLOAD_CHUNK_SIZE
+        total_chunks = max(math.ceil(size / chunk_size), 1)
+
+        extension = mimetypes.guess_extension(content_type) or ""
+        object_key = f"{media_key_prefix(user_id)}{uuid.uuid4().hex}{extension}"
+        upload_id = await storage.create_multipart_upload(object_key, content_type)
+
+        session_id = uuid.uuid4().hex
+        key = self._key(session_id)
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "user_id": user_id,
+                "filename": filename,
+                "object_key": object_key,
+                "upload_id": upload_id,
+                "content_type": content_type,
+                "size": size,
+                "chunk_size": chunk_size,
+                "total_chunks": total_chunks,
+            })
+            pipe.expire(key, settings.UPLOAD_SESSION_TTL)
+            await pipe.execute()
+
+        return UploadSession(session_id, object_key, content_type, size, chunk_size, total_chunks, [])
+
+    async def _load(self, session_id: str, user_id: int) -> Optional[Dict[str, str]]:
+        """读取会话元数据，不存在或不属于该用户时返回 None"""
+        meta = await self._client().hgetall(self._key(session_id))
+        if not meta or int(meta["user_id"]) != user_id:
+            return None
+        return meta
+
+    async def get(self, session_id: str, user_id: int) -> Optional[UploadSession]:
+        """
+        查询会话状态
+
+        返回:
+            会话，不存在、已过期或不属于该用户时返回 None
+        """
+        meta = await self._load(session_id, user_id)
+        if meta is None:
+            return None
+        parts = await self._client().hkeys(self._parts_key(session_id))
+        return self._build(session_id, meta, parts)
+
+    @staticmethod
+    def _build(session_id: str, meta: Dict[str, str], parts) -> UploadSession:
+        return UploadSession(
+            session_id=session_id,
+            object_key=meta["object_key"],
+            content_type=meta["content_type"],
+            size=int(meta["size"]),
+            chunk_size=int(meta["chunk_size"]),
+            total_chunks=int(meta["total_chunks"]),
+            received=sorted(int(number) for number in parts),
+        )
+
+    async def put_chunk(self, session_id: str, user_id: int, number: int, data: bytes) -> Optional[UploadSession]:
+        """
+        上传第 number 块，重复上传同一块是幂等的
+
+        参数:
+            session_id: 会话ID
+            user_id: 上传者ID
+            number: 块编号，从1开始
+            data: 块内容，长度必须与该块应有的大小一致
+
+        返回:
+            更新后的会话，会话不存在时返回 None
+        """
+        client = self._client()
+        meta = await self._load(session_id, user_id)
+        if meta is None:
+            return None
+
+        session = self._build(session_id, meta, [])
+        if not 1 <= number <= session.total_chunks:
+            raise UploadSessionError(f"块编号应在 1 到 {session.total_chunks} 之间")
+        if len(data) != session.chunk_length(number):
+            raise UploadSessionError(f"第 {number} 块应为 {session.chunk_length(number)} 字节，实际 {len(data)} 字节")
+
+        etag = await storage.upload_part(meta["object_key"], meta["upload_id"], number, data)
+
+        key, parts_key = self._key(session_id), self._parts_key(session_id)
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hset(parts_key, number, etag)
+            pipe.expire(key, settings.UPLOAD_SESSION_TTL)
+            pipe.expire(parts_key, settings.UPLOAD_SESSION_TTL)
+            pipe.hkeys(parts_key)
+            results = await pipe.execute()
+
+        return self._build(session_id, meta, results[-1])
+
+    async def complete(self, session_id: str, user_id: int) -> Optional[UploadSession]:
+        """
+        所有块都收到后合并分片，生成最终对象并删除会话
+
+        返回:
+            完成的会话，会话不存在时返回 None
+        """
+        client = self._client()
+        key, parts_key = self._key(session_id), self._parts_key(session_id)
+        meta = await self._load(session_id, user_id)
+        if meta is None:
+            return None
+
+        parts = await client.hgetall(parts_key)
+        session = self._build(session_id, meta, parts.keys())
+        if session.next_chunk is not None:
+            raise UploadSessionError(f"还有未上传的块，下一块为第 {session.next_chunk} 块")
+
+        # 防止重复的完成请求同时合并
+        if not await client.hsetnx(key, "completing", 1):
+            raise UploadSessionError("上传正在完成，请稍后查询")
+
+        try:
+            await storage.complete_multipart_upload(
+                meta["object_key"],
+                meta["upload_id"],
+                [(int(number), etag) for number, etag in parts.items()],
+            )
+        except Exception:
+            await client.hdel(key, "completing")
+            raise
+
+        await client.delete(key, parts_key)
+        return session
+
+    async def abort(self, session_id: str, user_id: int) -> bool:
+        """
+        放弃上传，释放MinIO中已上传的分片
+
+        返回:
+            会话是否存在
+        """
+        meta = await self._load(session_id, user_id)
+        if meta is None:
+            return False
+
+        try:
+            await storage.abort_multipart_upload(meta["object_key"], meta["upload_id"])
+        except Exception as e:
+            logger.warning(f"放弃分片上传失败: {str(e)}")
+        await self._client().delete(self._key(session_id), self._parts_key(session_id))
+        return True
+
+
+# 创建分块上传会话服务单例
+upload_sessions = UploadSessionService()
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, NamedTuple, Optional
+
+from prometheus_client import Counter, Histogram
+from redis.exceptions import ResponseError
+from sqlalchemy import Integer, column, update, values
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.post import Post
+from app.utils.redis_client import redis_service
+
+logger = logging.getLogger(__name__)
+
+POST_VIEWS_RECORDED = Counter(
+    "post_views_recorded_total",
+    "记录的帖子浏览次数",
+    ["backend"],  # redis / local
+)
+POST_VIEW_FLUSH_ROWS = Counter(
+    "post_view_flush_rows_total",
+    "批量写回数据库的帖子行数",
+)
+POST_VIEW_FLUSH_DURATION = Histogram(
+    "post_view_flush_duration_seconds",
+    "一次浏览数写回的耗时（秒）",
+)
+
+
+class ViewRecord(NamedTuple):
+    """一次浏览记录后的计数状态"""
+    pending: int  # 尚未写回数据库的浏览增量（含本次）
+    unique_viewers: Optional[int]  # 去重浏览人数（HyperLogLog估计），未启用时为 None
+
+
+class ViewCounter:
+    """
+    帖子浏览数的写回（write-behind）聚合器
+
+    浏览时只在Redis哈希中 HINCRBY（Redis不可用时记在进程内），不开写事务；
+    后台任务每隔 VIEW_COUNT_FLUSH_INTERVAL 秒把累计增量用一条
+    UPDATE ... FROM (VALUES ...) 批量写回 posts.view_count。
+
+    写回前先 RENAME 待写回的哈希，多个工作进程同时写回时每份增量只会被取走一次。
+    进程在 RENAME 之后、提交之前崩溃时，该批增量会丢失（浏览数允许近似）。
+    """
+
+    PENDING_KEY = "post_views:pending"
+    FLUSHING_KEY_PREFIX = "post_views:flushing"
+    VIEWERS_KEY_PREFIX = "post_viewers"
+
+    def __init__(self):
+        """初始化进程内计数（Redis不可用时使用）"""
+        # 单个事件循环内访问，不需要加锁
+        self._local: Dict[int, int] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    async def record(self, post_id: int, viewer_id: int) -> ViewRecord:
+        """
+        记录一次浏览
+
+        参数:
+            post_id: 帖子ID
+            viewer_id: 浏览者的用户ID（用于去重统计）
+
+        返回:
+            ViewRecord，pending 可与数据库中的 view_count 相加得到实时浏览数
+        """
+        if redis_service.is_ready:
+            try:
+                async with redis_service.client.pipeline(transaction=False) as pipe:
+                    pipe.hincrby(self.PENDING_KEY, post_id, 1)
+                    if settings.VIEW_COUNT_UNIQUE_VIEWERS:
+                        viewers_key = f"{self.VIEWERS_KEY_PREFIX}:{post_id}"
+                        pipe.pfadd(viewers_key, viewer_id)
+                        pipe.pfcount(viewers_key)
+                    results = await pipe.execute()
+                POST_VIEWS_RECORDED.labels(backend="redis").inc()
+                unique_viewers = results[2] if settings.VIEW_COUNT_UNIQUE_VIEWERS else None
+                return ViewRecord(pending=results[0], unique_viewers=unique_viewers)
+            except Exception as e:
+                logger.warning(f"记录浏览数到Redis失败，改为进程内计数: {str(e)}")
+
+        self._local[post_id] = self._local.get(post_id, 0) + 1
+        POST_VIEWS_RECORDED.labels(backend="local").inc()
+        return ViewRecord(pending=self._local[post_id], unique_viewers=None)
+
+    async def start(self):
+        """启动后台写回任务"""
+        if self.task is None:
+            self.task = asyncio.create_task(self.flush_loop())
+            logger.info("浏览数写回任务已启动")
+
+    async def stop(self):
+        """停止后台写回任务，并写回剩余的增量"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+        logger.info("浏览数写回任务已停止")
+
+    async def flush_loop(self):
+        """定期写回循环"""
+        try:
+            while True:
+                await asyncio.sleep(settings.VIEW_COUNT_FLUSH_INTERVAL)
+                # 停止时不打断进行中的写回，避免已取走的增量丢失
+                await asyncio.shield(self.flush())
+        except asyncio.CancelledError:
+            pass
+
+    async def flush(self):
+        """把进程内和Redis中累计的增量写回数据库"""
+        deltas, self._local = self._local, {}
+        flushing_key = await self._take_redis_deltas(deltas)
+        if not deltas:
+            return
+
+        start = time.perf_counter()
+        try:
+            await self._write(deltas)
+        except Exception as e:
+            logger.error(f"写回浏览数失败，增量将在下次重试: {str(e)}")
+            await self._restore(deltas)
+        else:
+            POST_VIEW_FLUSH_ROWS.inc(len(deltas))
+        finally:
+            POST_VIEW_FLUSH_DURATION.observe(time.perf_counter() - start)
+
+        if flushing_key is not None:
+            try:
+                await redis_service.client.delete(flushing_key)
+            except Exception as e:
+                logger.warning(f"删除已取走的浏览数哈希失败: {str(e)}")
+
+    async def _take_redis_deltas(self, deltas: Dict[int, int]) -> Optional[str]:
+        """取走Redis中待写回的增量并合并到 deltas，返回改名后的键"""
+        if not redis_service.is_ready:
+            return None
+
+        flushing_key = f"{self.FLUSHING_KEY_PREFIX}:{uuid.uuid4().hex}"
+        try:
+            await redis_service.client.rename(self.PENDING_KEY, flushing_key)
+        except ResponseError:
+            # 没有待写回的增量
+            return None
+        except Exception as e:
+            logger.warning(f"读取待写回的浏览数失败: {str(e)}")
+            return None
+
+        try:
+            # 进程在写回完成前退出时，避免残留的哈希永久占用内存
+            await redis_service.client.expire(flushing_key, 86400)
+            pending = await redis_service.client.hgetall(flushing_key)
+        except Exception as e:
+            logger.warning(f"读取待写回的浏览数失败: {str(e)}")
+            return None
+
+        for post_id, delta in pending.items():
+            post_id = int(post_id)
+            deltas[post_id] = deltas.get(post_id, 0) + int(delta)
+        return flushing_key
+
+    async def _write(self, deltas: Dict[int, int]):
+        """按批用 UPDATE ... FROM (VALUES ...) 写回，按ID排序以固定加锁顺序"""
+        rows = sorted(deltas.items())
+        batch_size = settings.VIEW_COUNT_FLUSH_BATCH_SIZE
+        async with AsyncSessionLocal() as db:
+            for i in range(0, len(rows), batch_size):
+                batch = values(
+                    column("id", Integer), column("delta", Integer), name="v"
+                ).data(rows[i:i + batch_size])
+                await db.execute(
+                    update(Post.__table__)
+                    .where(Post.__table__.c.id == batch.c.id)
+                    # 显式保留 updated_at，浏览不算编辑
+                    .values(
+                        view_count=Post.__table__.c.view_count + batch.c.delta,
+                        updated_at=Post.__table__.c.updated_at,
+                    )
+                )
+            await db.commit()
+
+    async def _restore(self, deltas: Dict[int, int]):
+        """写回失败时把增量放回，等待下次写回"""
+        if redis_service.is_ready:
+            try:
+                async with redis_service.client.pipeline(transaction=False) as pipe:
+                    for post_id, delta in deltas.items():
+                        pipe.hincrby(self.PENDING_KEY, post_id, delta)
+                    await pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"放回浏览数增量到Redis失败，改为进程内保存: {str(e)}")
+
+        for post_id, delta in deltas.items():
+            self._local[post_id] = self._local.get(post_id, 0) + delta
+
+
+# 创建浏览数聚合器单例
+view_counter = ViewCounter()
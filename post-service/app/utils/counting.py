@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from prometheus_client import Counter
+from sqlalchemy import Select, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.utils.redis_client import redis_service
+
+logger = logging.getLogger(__name__)
+
+LIST_COUNT_REQUESTS = Counter(
+    "list_count_requests_total",
+    "分页总数的统计方式",
+    ["scope", "method"],  # method: cache / exact / estimate
+)
+
+
+class CountStrategy:
+    """
+    分页总数统计策略
+
+    1. 先查Redis中按 (范围, 筛选条件) 缓存的结果；
+    2. 未命中时做有上限的精确统计（最多扫描 COUNT_EXACT_THRESHOLD + 1 行）；
+    3. 超过上限时改用查询计划的行数估计，并标记为估计值。
+
+    写操作调用 invalidate() 为范围换一个新的随机版本号，使该范围下的所有缓存同时失效。
+    """
+
+    CACHE_KEY_PREFIX = "count"
+    VERSION_KEY_PREFIX = "count_version"
+
+    async def count(self, db: AsyncSession, stmt: Select, scope: str, filters: Optional[Dict[str, Any]] = None) -> Tuple[int, bool]:
+        """
+        统计查询结果总数
+
+        参数:
+            db: 数据库会话
+            stmt: 已应用筛选条件的查询（不含分页）
+            scope: 缓存范围，写操作按范围失效，如 "posts"、"comments:post:1"
+            filters: 筛选条件，与范围一起组成缓存键
+
+        返回:
+            (总数, 是否为估计值)
+        """
+        scope_label = scope.split(":", 1)[0]
+        cache_key = await self._cache_key(scope, filters)
+
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            LIST_COUNT_REQUESTS.labels(scope=scope_label, method="cache").inc()
+            return cached
+
+        total, is_estimate = await self._count(db, stmt)
+        LIST_COUNT_REQUESTS.labels(scope=scope_label, method="estimate" if is_estimate else "exact").inc()
+
+        await self._cache_set(cache_key, total, is_estimate)
+        return total, is_estimate
+
+    async def invalidate(self, *scopes: str) -> None:
+        """
+        使范围内的缓存总数失效（在写操作提交后调用）
+
+        参数:
+            scopes: 一个或多个缓存范围
+        """
+        if not redis_service.is_ready:
+            return
+        try:
+            async with redis_service.client.pipeline(transaction=False) as pipe:
+                for scope in scopes:
+                    key = f"{self.VERSION_KEY_PREFIX}:{scope}"
+                    # 版本号取随机值，不会与仍未过期的旧缓存条目重复；过期后读作 "0"，
+                    # 此前以 "0" 写入的条目至少已存在 COUNT_CACHE_TTL * 2 秒，早已过期
+                    pipe.set(key, uuid.uuid4().hex, ex=settings.COUNT_CACHE_TTL * 2)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"失效缓存总数失败: {str(e)}")
+
+    async def _count(self, db: AsyncSession, stmt: Select) -> Tuple[int, bool]:
+        """有上限的精确统计，超过上限时返回查询计划估计值"""
+        threshold = settings.COUNT_EXACT_THRESHOLD
+        stmt = stmt.order_by(None)
+
+        bounded = stmt.limit(threshold + 1).subquery()
+        total = (await db.execute(select(func.count()).select_from(bounded))).scalar_one()
+        if total <= threshold:
+            return total, False
+
+        return max(await self._estimate(db, stmt), total), True
+
+    async def _estimate(self, db: AsyncSession, stmt: Select) -> int:
+        """读取 EXPLAIN 的顶层行数估计，失败时返回0"""
+        try:
+            compiled = stmt.compile(
+                dialect=db.get_bind().dialect,
+                compile_kwargs={"literal_binds": True},
+            )
+            # text() 会把冒号当作参数占位符，需要转义
+            sql = str(compiled).replace(":", r"\:")
+            plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except Exception as e:
+            logger.warning(f"获取查询计划行数估计失败: {str(e)}")
+            return 0
+
+    async def _cache_key(self, scope: str, filters: Optional[Dict[str, Any]]) -> Optional[str]:
+        if not redis_service.is_ready:
+            return None
+        try:
+            version = await redis_service.client.get(f"{self.VERSION_KEY_PREFIX}:{scope}") or "0"
+        except Exception as e:
+            logger.warning(f"读取缓存总数版本失败: {str(e)}")
+            return None
+        signature = json.dumps(filters or {}, sort_keys=True, default=str)
+        digest = hashlib.sha1(signature.encode("utf-8")).hexdigest()[:16]
+        return f"{self.CACHE_KEY_PREFIX}:{scope}:{version}:{digest}"
+
+    async def _cache_get(self, key: Optional[str]) -> Optional[Tuple[int, bool]]:
+        if key is None:
+            return None
+        try:
+            cached = await redis_service.client.get(key)
+        except Exception as e:
+            logger.warning(f"读取缓存总数失败: {str(e)}")
+            return None
+        if cached is None:
+            return None
+        total, is_estimate = json.loads(cached)
+        return int(total), bool(is_estimate)
+
+    async def _cache_set(self, key: Optional[str], total: int, is_estimate: bool) -> None:
+        if key is None:
+            return
+        try:
+            await redis_service.client.set(key, json.dumps([total, is_estimate]), ex=settings.COUNT_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"写入缓存总数失败: {str(e)}")
+
+
+# 创建总数统计策略单例
+count_strategy = CountStrategy()
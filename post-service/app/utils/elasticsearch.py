@@ -1,9 +1,11 @@
 from elasticsearch import AsyncElasticsearch
 from elasticsearch.exceptions import NotFoundError
 import logging
+from datetime import datetime
 from typing import Dict, Any, List, Optional
 
 from app.core.config import settings
+from app.utils.pagination import decode_search_cursor, encode_search_cursor
 
 logger = logging.getLogger(__name__)
 
@@ -47,22 +49,28 @@ class ElasticsearchService:
             logger.info("已关闭Elasticsearch连接")
     
     async def ensure_index(self):
-        """确保索引存在，不存在则创建"""
+        """确保索引存在（index_name 可以是别名），不存在则创建"""
         try:
-            # 检查索引是否存在
+            # 检查索引或别名是否存在
             exists = await self.client.indices.exists(index=self.index_name)
             if not exists:
-                # 创建索引
-                await self.create_index()
+                # 创建带版本后缀的索引，并以 index_name 作为别名，重建索引时可原子切换
+                await self.create_index(f"{self.index_name}_{datetime.now().strftime('%Y%m%d%H%M%S')}", alias=self.index_name)
             return True
         except Exception as e:
             logger.error(f"确保索引存在失败: {str(e)}")
             return False
     
-    async def create_index(self):
-        """创建帖子索引，设置映射"""
-        # 帖子索引映射
-        mapping = {
+    @staticmethod
+    def index_body(alias: Optional[str] = None, bulk_load: bool = False) -> Dict[str, Any]:
+        """
+        帖子索引的映射和设置
+        
+        参数:
+            alias: 创建时附加的别名
+            bulk_load: 是否为批量加载优化（关闭刷新、不分配副本），加载完成后需恢复
+        """
+        body = {
             "mappings": {
                 "properties": {
                     "id": {"type": "integer"},
@@ -81,19 +89,61 @@ class ElasticsearchService:
                 }
             },
             "settings": {
-                "number_of_shards": 1,
-                "number_of_replicas": 0
+                "number_of_shards": settings.ELASTICSEARCH_NUMBER_OF_SHARDS,
+                "number_of_replicas": 0 if bulk_load else settings.ELASTICSEARCH_NUMBER_OF_REPLICAS,
+                "refresh_interval": "-1" if bulk_load else settings.ELASTICSEARCH_REFRESH_INTERVAL,
             }
         }
+        if alias:
+            body["aliases"] = {alias: {}}
+        return body
+    
+    async def create_index(self, index_name: Optional[str] = None, alias: Optional[str] = None, bulk_load: bool = False):
+        """
+        创建帖子索引，设置映射
         
+        参数:
+            index_name: 索引名，默认 self.index_name
+            alias: 创建时附加的别名
+            bulk_load: 是否为批量加载优化
+        """
+        index_name = index_name or self.index_name
         try:
-            await self.client.indices.create(index=self.index_name, body=mapping)
-            logger.info(f"已创建索引: {self.index_name}")
+            await self.client.indices.create(index=index_name, body=self.index_body(alias, bulk_load))
+            logger.info(f"已创建索引: {index_name}")
             return True
         except Exception as e:
             logger.error(f"创建索引失败: {str(e)}")
             return False
     
+    @staticmethod
+    def build_document(post_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        把帖子数据转换为索引文档
+        
+        参数:
+            post_data: 帖子数据，tags 可以是字符串、字典或 Tag 对象，user 为作者资料
+        """
+        user = post_data.get("user") or {}
+        return {
+            "id": post_data.get("id"),
+            "user_id": post_data.get("user_id"),
+            "username": user.get("username", ""),
+            "full_name": user.get("full_name", ""),
+            "content": post_data.get("content", ""),
+            "tags": [
+                tag if isinstance(tag, str) else tag["name"] if isinstance(tag, dict) else tag.name
+                for tag in post_data.get("tags", [])
+            ],
+            "location": post_data.get("location", ""),
+            "media_type": post_data.get("media_type", "NONE"),
+            "visibility": post_data.get("visibility", "PUBLIC"),
+            "comment_count": post_data.get("comment_count", 0),
+            "like_count": post_data.get("like_count", 0),
+            "created_at": post_data.get("created_at"),
+            "updated_at": post_data.get("updated_at")
+        }
+    
     async def index_post(self, post_data: Dict[str, Any]) -> bool:
         """
         索引帖子数据
@@ -111,21 +161,7 @@ class ElasticsearchService:
         
         try:
             # 准备索引文档
-            document = {
-                "id": post_data.get("id"),
-                "user_id": post_data.get("user_id"),
-                "username": post_data.get("user", {}).get("username", ""),
-                "full_name": post_data.get("user", {}).get("full_name", ""),
-                "content": post_data.get("content", ""),
-                "tags": [tag["name"] if isinstance(tag, dict) else tag.name for tag in post_data.get("tags", [])],
-                "location": post_data.get("location", ""),
-                "media_type": post_data.get("media_type", "NONE"),
-                "visibility": post_data.get("visibility", "PUBLIC"),
-                "comment_count": post_data.get("comment_count", 0),
-                "like_count": post_data.get("like_count", 0),
-                "created_at": post_data.get("created_at"),
-                "updated_at": post_data.get("updated_at")
-            }
+            document = self.build_document(post_data)
             
             # 只索引公开帖子
             if document["visibility"] != "PUBLIC":
@@ -160,21 +196,7 @@ class ElasticsearchService:
         
         try:
             # 准备更新文档
-            document = {
-                "id": post_data.get("id"),
-                "user_id": post_data.get("user_id"),
-                "username": post_data.get("user", {}).get("username", ""),
-                "full_name": post_data.get("user", {}).get("full_name", ""),
-                "content": post_data.get("content", ""),
-                "tags": [tag["name"] if isinstance(tag, dict) else tag.name for tag in post_data.get("tags", [])],
-                "location": post_data.get("location", ""),
-                "media_type": post_data.get("media_type", "NONE"),
-                "visibility": post_data.get("visibility", "PUBLIC"),
-                "comment_count": post_data.get("comment_count", 0),
-                "like_count": post_data.get("like_count", 0),
-                "created_at": post_data.get("created_at"),
-                "updated_at": post_data.get("updated_at")
-            }
+            document = self.build_document(post_data)
             
             # 如果帖子变为非公开，从索引中删除
             if document["visibility"] != "PUBLIC":
@@ -231,6 +253,77 @@ class ElasticsearchService:
             logger.error(f"删除帖子索引失败: {str(e)}")
             return False
     
+    @staticmethod
+    def build_search_query(
+        query: Optional[str],
+        tags: Optional[List[str]] = None,
+        user_id: Optional[int] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        构建帖子搜索的查询条件（只匹配公开帖子）
+        
+        参数:
+            query: 搜索关键词
+            tags: 标签过滤
+            user_id: 用户ID过滤
+            from_date: 起始日期
+            to_date: 结束日期
+        
+        返回:
+            Elasticsearch 查询
+        """
+        must_queries = []
+        
+        # 内容搜索
+        if query:
+            must_queries.append({
+                "multi_match": {
+                    "query": query,
+                    "fields": ["content^2", "tags", "username", "full_name", "location"]
+                }
+            })
+        
+        # 标签过滤
+        if tags and len(tags) > 0:
+            must_queries.append({
+                "terms": {
+                    "tags": tags
+                }
+            })
+        
+        # 用户过滤
+        if user_id:
+            must_queries.append({
+                "term": {
+                    "user_id": user_id
+                }
+            })
+        
+        # 日期范围过滤
+        date_range = {}
+        if from_date:
+            date_range["gte"] = from_date
+        if to_date:
+            date_range["lte"] = to_date
+        
+        if date_range:
+            must_queries.append({
+                "range": {
+                    "created_at": date_range
+                }
+            })
+        
+        # 公开帖子过滤
+        must_queries.append({
+            "term": {
+                "visibility": "PUBLIC"
+            }
+        })
+        
+        return {"bool": {"must": must_queries}}
+    
     async def search_posts(
         self, 
         query: str, 
@@ -239,10 +332,16 @@ class ElasticsearchService:
         from_date: Optional[str] = None,
         to_date: Optional[str] = None,
         page: int = 1,
-        size: int = 20
+        size: int = 20,
+        cursor_mode: bool = False,
+        cursor: Optional[str] = None,
+        include_total: bool = False
     ) -> Dict[str, Any]:
         """
-        搜索帖子
+        搜索帖子，支持页码分页和游标分页两种模式
+        
+        页码模式使用 from/size，受 max_result_window 限制；
+        游标模式见 search_posts_after，翻页深度不影响查询耗时
         
         参数:
             query: 搜索关键词
@@ -250,88 +349,42 @@ class ElasticsearchService:
             user_id: 用户ID过滤
             from_date: 起始日期
             to_date: 结束日期
-            page: 页码
+            page: 页码（页码模式）
             size: 每页大小
+            cursor_mode: 是否使用游标模式
+            cursor: 上一页返回的 next_cursor（游标模式），首页为空
+            include_total: 游标模式下是否统计总数
         
         返回:
             搜索结果
         """
+        search_query = self.build_search_query(query, tags, user_id, from_date, to_date)
+        if cursor_mode:
+            return await self.search_posts_after(search_query, size, cursor, include_total)
+        
         if not self.is_ready:
             await self.connect()
             if not self.is_ready:
-                return {"total": 0, "items": []}
+                return {"total": 0, "items": [], "page": page, "size": size, "pages": 0}
         
         try:
             # 计算分页偏移
             offset = (page - 1) * size
             
-            # 构建查询
-            must_queries = []
-            
-            # 内容搜索
-            if query:
-                must_queries.append({
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["content^2", "tags", "username", "full_name", "location"]
-                    }
-                })
-            
-            # 标签过滤
-            if tags and len(tags) > 0:
-                must_queries.append({
-                    "terms": {
-                        "tags": tags
-                    }
-                })
-            
-            # 用户过滤
-            if user_id:
-                must_queries.append({
-                    "term": {
-                        "user_id": user_id
-                    }
-                })
-            
-            # 日期范围过滤
-            date_range = {}
-            if from_date:
-                date_range["gte"] = from_date
-            if to_date:
-                date_range["lte"] = to_date
-            
-            if date_range:
-                must_queries.append({
-                    "range": {
-                        "created_at": date_range
-                    }
-                })
-            
-            # 公开帖子过滤
-            must_queries.append({
-                "term": {
-                    "visibility": "PUBLIC"
-                }
-            })
-            
-            # 如果没有任何过滤条件，默认返回所有公开帖子
-            search_query = {
+            search_body = {
                 "from": offset,
                 "size": size,
-                "query": {
-                    "bool": {
-                        "must": must_queries if must_queries else [{"match_all": {}}]
-                    }
-                },
+                "query": search_query,
                 "sort": [
-                    {"created_at": {"order": "desc"}}
+                    {"created_at": {"order": "desc"}},
+                    {"id": {"order": "desc"}}
                 ]
             }
             
             # 执行搜索
             response = await self.client.search(
                 index=self.index_name,
-                body=search_query
+                body=search_body
             )
             
             # 解析结果
@@ -343,6 +396,8 @@ class ElasticsearchService:
             
             return {
                 "total": total,
+                # 默认只精确统计到 10000 条，超过时为下限
+                "total_is_estimate": response["hits"]["total"]["relation"] != "eq",
                 "items": items,
                 "page": page,
                 "size": size,
@@ -351,6 +406,102 @@ class ElasticsearchService:
         except Exception as e:
             logger.error(f"搜索帖子失败: {str(e)}")
             return {"total": 0, "items": [], "page": page, "size": size, "pages": 0}
+    
+    async def _open_point_in_time(self) -> str:
+        """打开索引的时间点快照，返回快照ID"""
+        response = await self.client.open_point_in_time(
+            index=self.index_name,
+            keep_alive=settings.SEARCH_PIT_KEEP_ALIVE
+        )
+        return response["id"]
+    
+    async def _close_point_in_time(self, pit_id: str) -> None:
+        """关闭时间点快照，失败时等待其自动过期"""
+        try:
+            await self.client.close_point_in_time(id=pit_id)
+        except Exception as e:
+            logger.debug(f"关闭时间点快照失败: {str(e)}")
+    
+    async def search_posts_after(
+        self,
+        search_query: Dict[str, Any],
+        size: int,
+        cursor: Optional[str] = None,
+        include_total: bool = False
+    ) -> Dict[str, Any]:
+        """
+        用时间点快照（PIT）和 search_after 按 (created_at, id) 倒序翻页
+        
+        首页打开快照，游标中保存快照ID和本页最后一条的排序值，
+        后续翻页都在同一快照上查询，结果不会因新写入而重复或遗漏。
+        快照过期或索引已切换时重新打开快照，从游标位置继续。
+        最后一页关闭快照；客户端中途放弃时快照在 SEARCH_PIT_KEEP_ALIVE 后过期。
+        
+        参数:
+            search_query: build_search_query 构建的查询
+            size: 每页大小
+            cursor: 上一页返回的 next_cursor，首页为空
+            include_total: 是否统计总数（默认不统计，开销更小）
+        
+        返回:
+            搜索结果，next_cursor 为空表示没有更多数据
+        """
+        # 游标格式错误时返回400
+        pit_id, search_after = decode_search_cursor(cursor) if cursor else (None, None)
+        empty = {"total": None, "items": [], "page": None, "size": size, "pages": None, "next_cursor": None}
+        
+        if not self.is_ready:
+            await self.connect()
+            if not self.is_ready:
+                return empty
+        
+        try:
+            search_body = {
+                # 多取一条判断是否还有下一页
+                "size": size + 1,
+                "query": search_query,
+                "sort": [
+                    {"created_at": {"order": "desc"}},
+                    {"id": {"order": "desc"}}
+                ],
+                "track_total_hits": include_total
+            }
+            if search_after:
+                search_body["search_after"] = search_after
+            
+            if pit_id is None:
+                pit_id = await self._open_point_in_time()
+            try:
+                response = await self.client.search(
+                    body={**search_body, "pit": {"id": pit_id, "keep_alive": settings.SEARCH_PIT_KEEP_ALIVE}}
+                )
+            except NotFoundError:
+                pit_id = await self._open_point_in_time()
+                response = await self.client.search(
+                    body={**search_body, "pit": {"id": pit_id, "keep_alive": settings.SEARCH_PIT_KEEP_ALIVE}}
+                )
+            
+            # 每次查询可能返回新的快照ID
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            
+            next_cursor = None
+            if len(hits) > size:
+                hits = hits[:size]
+                next_cursor = encode_search_cursor(pit_id, hits[-1]["sort"])
+            else:
+                await self._close_point_in_time(pit_id)
+            
+            result = {**empty, "items": [hit["_source"] for hit in hits], "next_cursor": next_cursor}
+            if include_total:
+                total = response["hits"]["total"]
+                result["total"] = total["value"]
+                result["total_is_estimate"] = total["relation"] != "eq"
+                result["pages"] = (total["value"] + size - 1) // size
+            return result
+        except Exception as e:
+            logger.error(f"搜索帖子失败: {str(e)}")
+            return empty
 
 # 创建Elasticsearch服务单例
 es_service = ElasticsearchService()
\ No newline at end of file
@@ -0,0 +1,164 @@
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.config import settings
+from app.utils.cache import LRUCache
+from app.utils.http_client import user_service_client
+from app.utils.redis_client import redis_service
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_CACHE_LOOKUPS = Counter(
+    "identity_cache_lookups_total",
+    "身份缓存查询次数",
+    ["result"],  # memory_hit / redis_hit / miss
+)
+IDENTITY_CACHE_HIT_RATIO = Gauge(
+    "identity_cache_hit_ratio",
+    "身份缓存命中率（内存与Redis两级合计）",
+)
+IDENTITY_MISS_LATENCY = Histogram(
+    "identity_resolver_miss_latency_seconds",
+    "缓存未命中时调用用户服务 /users/me 的耗时",
+)
+
+
+class IdentityResolver:
+    """
+    身份解析器
+
+    令牌在本地验证，用户信息按 (用户ID, 令牌过期时间) 缓存：
+    先查进程内LRU，再查Redis，都未命中时才调用用户服务 /users/me。
+    """
+
+    REDIS_KEY_PREFIX = "identity"
+
+    def __init__(self):
+        """初始化两级缓存和统计"""
+        self.cache = LRUCache(
+            maxsize=settings.IDENTITY_CACHE_MAX_SIZE,
+            ttl=settings.IDENTITY_CACHE_TTL,
+        )
+        self.lookups = 0
+        self.hits = 0
+        IDENTITY_CACHE_HIT_RATIO.set_function(self.hit_ratio)
+
+    def hit_ratio(self) -> float:
+        """当前进程的缓存命中率"""
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    async def resolve(self, token: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        解析当前用户信息
+
+        参数:
+            token: 已通过本地验证的JWT令牌
+            payload: 令牌载荷
+
+        返回:
+            用户信息字典（包含 token_exp）
+
+        异常:
+            httpx.HTTPStatusError / httpx.RequestError: 未命中缓存且用户服务调用失败
+        """
+        user_id = int(payload["sub"])
+        exp = payload.get("exp")
+        key = (user_id, exp)
+        ttl = self._ttl_for(exp)
+
+        user = self.cache.get(key)
+        if user is not None:
+            self._record("memory_hit")
+            return dict(user)
+
+        user = await self._redis_get(user_id, exp)
+        if user is not None:
+            self._record("redis_hit")
+            self.cache.set(key, user, ttl)
+            return dict(user)
+
+        self._record("miss")
+        start_time = time.perf_counter()
+        try:
+            client = await user_service_client.get_client()
+            response = await client.get(
+                "/users/me",
+                headers={"Authorization": f"Bearer {token}"}
+            )
+            response.raise_for_status()
+            user = response.json()
+        finally:
+            IDENTITY_MISS_LATENCY.observe(time.perf_counter() - start_time)
+
+        # 添加令牌过期时间
+        if exp is not None:
+            user["token_exp"] = exp
+
+        if ttl > 0:
+            self.cache.set(key, user, ttl)
+            await self._redis_set(user_id, exp, user, ttl)
+
+        return dict(user)
+
+    async def invalidate(self, user_id: int) -> None:
+        """
+        使用户的所有缓存条目失效（收到用户更新事件时调用）
+
+        参数:
+            user_id: 用户ID
+        """
+        removed = self.cache.delete_where(lambda key: key[0] == user_id)
+
+        if redis_service.is_ready:
+            try:
+                await redis_service.client.delete(self._redis_key(user_id))
+            except Exception as e:
+                logger.warning(f"删除Redis身份缓存失败: {str(e)}")
+
+        logger.debug(f"已失效用户[{user_id}]的身份缓存，本地条目数: {removed}")
+
+    def _record(self, result: str) -> None:
+        IDENTITY_CACHE_LOOKUPS.labels(result=result).inc()
+        self.lookups += 1
+        if result != "miss":
+            self.hits += 1
+
+    @staticmethod
+    def _ttl_for(exp: Optional[int]) -> float:
+        """缓存有效期不超过令牌剩余有效期"""
+        if exp is None:
+            return settings.IDENTITY_CACHE_TTL
+        return min(settings.IDENTITY_CACHE_TTL, exp - time.time())
+
+    def _redis_key(self, user_id: int) -> str:
+        return f"{self.REDIS_KEY_PREFIX}:{user_id}"
+
+    async def _redis_get(self, user_id: int, exp: Optional[int]) -> Optional[Dict[str, Any]]:
+        if not settings.IDENTITY_CACHE_REDIS_ENABLED or not redis_service.is_ready:
+            return None
+        try:
+            cached = await redis_service.client.hget(self._redis_key(user_id), str(exp))
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.warning(f"读取Redis身份缓存失败: {str(e)}")
+            return None
+
+    async def _redis_set(self, user_id: int, exp: Optional[int], user: Dict[str, Any], ttl: float) -> None:
+        if not settings.IDENTITY_CACHE_REDIS_ENABLED or not redis_service.is_ready:
+            return
+        try:
+            key = self._redis_key(user_id)
+            async with redis_service.client.pipeline(transaction=False) as pipe:
+                pipe.hset(key, str(exp), json.dumps(user))
+                pipe.expire(key, max(int(ttl), 1))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"写入Redis身份缓存失败: {str(e)}")
+
+
+# 创建身份解析器单例
+identity_resolver = IdentityResolver()
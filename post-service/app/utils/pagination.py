@@ -0,0 +1,135 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils.counting import count_strategy
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """
+    把 (created_at, id) 编码为不透明游标
+    """
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    解析游标，格式错误时返回400
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+def encode_search_cursor(pit_id: str, search_after: List[Any]) -> str:
+    """
+    把搜索的时间点快照ID和 search_after 排序值编码为不透明游标
+    """
+    raw = json.dumps([pit_id, search_after], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Tuple[str, List[Any]]:
+    """
+    解析搜索游标，格式错误时返回400
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        pit_id, search_after = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(pit_id, str) or not isinstance(search_after, list):
+            raise ValueError(cursor)
+        return pit_id, search_after
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+async def keyset_page(db: AsyncSession, stmt: Select, created_at_column, id_column, cursor: Optional[str], size: int) -> Tuple[List[Any], Optional[str]]:
+    """
+    按 (created_at DESC, id DESC) 做键集分页
+
+    参数:
+        db: 数据库会话
+        stmt: 已应用筛选条件的查询
+        created_at_column: 排序时间列
+        id_column: 主键列（用于打破时间相同的并列）
+        cursor: 上一页返回的游标，为空时从第一页开始
+        size: 每页数量
+
+    返回:
+        (本页数据, 下一页游标)，没有更多数据时游标为 None
+    """
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(created_at_column, id_column) < tuple_(cursor_created_at, cursor_id))
+
+    result = await db.execute(stmt.order_by(created_at_column.desc(), id_column.desc()).limit(size + 1))
+    rows = list(result.scalars().all())
+
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return rows, next_cursor
+
+
+async def paginate(
+    db: AsyncSession,
+    stmt: Select,
+    pagination: Dict[str, Any],
+    created_at_column,
+    id_column,
+    count_scope: str,
+    count_filters: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    根据分页参数执行查询，支持页码分页和游标分页两种模式
+
+    页码模式始终返回总数；游标模式只有 include_total 为真时才统计总数。
+    总数由 count_strategy 统计，数量较大时可能是估计值（total_is_estimate 为真）。
+
+    参数:
+        count_scope: 总数缓存范围，写操作按范围失效
+        count_filters: 影响总数的筛选条件
+
+    返回:
+        (本页数据, 分页信息字典)
+    """
+    size = pagination["size"]
+    cursor_mode = pagination["mode"] == "cursor"
+
+    total, total_is_estimate = None, False
+    if not cursor_mode or pagination["include_total"]:
+        total, total_is_estimate = await count_strategy.count(db, stmt, count_scope, count_filters)
+
+    page_info = {
+        "total": total,
+        "total_is_estimate": total_is_estimate,
+        "page": None,
+        "size": size,
+        "pages": (total + size - 1) // size if total is not None else None,
+        "next_cursor": None,
+    }
+
+    if cursor_mode:
+        items, page_info["next_cursor"] = await keyset_page(
+            db, stmt, created_at_column, id_column, pagination["cursor"], size
+        )
+        return items, page_info
+
+    page = pagination["page"]
+    result = await db.execute(
+        stmt.order_by(created_at_column.desc(), id_column.desc()).offset((page - 1) * size).limit(size)
+    )
+    page_info["page"] = page
+    return list(result.scalars().all()), page_info
@@ -0,0 +1,50 @@
+import logging
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RedisService:
+    """Redis服务类，提供共享的异步Redis连接"""
+
+    def __init__(self):
+        """初始化Redis客户端（连接在 connect() 中建立）"""
+        self.client: Optional[aioredis.Redis] = None
+        self.is_ready = False
+
+    async def connect(self):
+        """连接到Redis服务器"""
+        if self.client is not None:
+            return
+
+        try:
+            self.client = aioredis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                decode_responses=True,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            )
+            await self.client.ping()
+            self.is_ready = True
+            logger.info("成功连接到Redis")
+        except Exception as e:
+            logger.error(f"连接Redis失败: {str(e)}")
+            self.client = None
+            self.is_ready = False
+
+    async def close(self):
+        """关闭连接"""
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+            self.is_ready = False
+            logger.info("已关闭Redis连接")
+
+
+# 创建Redis服务单例
+redis_service = RedisService()
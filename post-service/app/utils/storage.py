@@ -1,29 +1,134 @@
+import asyncio
+import functools
+import hashlib
 import io
-import uuid
+import logging
+import mimetypes
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from typing import Optional, BinaryIO, Dict, Any
+from typing import Optional, BinaryIO, Dict, Any, List, Tuple
 
 from fastapi import UploadFile
+from prometheus_client import Counter
+from sqlalchemy import delete, literal_column, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from minio import Minio
 from minio.commonconfig import Tags
+from minio.datatypes import Object, Part
 from minio.error import S3Error
 
 from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.media import MediaObject
+
+logger = logging.getLogger(__name__)
+
+MEDIA_UPLOADS_DEDUPLICATED = Counter(
+    "media_uploads_deduplicated_total",
+    "内容已存在、跳过上传的文件数",
+)
+MEDIA_BYTES_DEDUPLICATED = Counter(
+    "media_bytes_deduplicated_total",
+    "因内容已存在而未上传的字节数",
+)
+
+
+class UploadTooLargeError(Exception):
+    """上传的文件超过大小限制"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"文件大小超过限制（最大 {max_size // (1024 * 1024)}MB）")
+
+
+def media_key_prefix(user_id: int) -> str:
+    """用户直传媒体对象的键前缀，创建帖子时只接受该前缀下的对象"""
+    return f"posts/user_{user_id}/"
+
+
+def max_upload_size(content_type: Optional[str]) -> int:
+    """直传和分块上传时按内容类型返回的大小上限，视频允许更大的文件"""
+    if content_type in settings.ALLOWED_VIDEO_TYPES:
+        return settings.MAX_VIDEO_UPLOAD_SIZE
+    return settings.MAX_UPLOAD_SIZE
+
+
+class LimitedHashingReader:
+    """
+    包装上传文件的只读流：边读边计算 SHA-256，并在超过大小限制时中止
+
+    MinIO 按 part_size 分块读取，因此内存占用与文件大小无关
+    """
+
+    def __init__(self, stream: BinaryIO, max_size: int):
+        self.stream = stream
+        self.max_size = max_size
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.stream.read(size)
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadTooLargeError(self.max_size)
+        self._hash.update(chunk)
+        return chunk
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
 
 class StorageService:
-    """对象存储服务封装，使用MinIO作为后端"""
-    
+    """
+    对象存储服务封装，使用MinIO作为后端
+
+    MinIO SDK 是同步的，所有调用都放到有界线程池中执行，不阻塞事件循环；
+    线程池大小即本进程访问对象存储的最大并发数。
+    """
+
     def __init__(self):
-        """初始化MinIO客户端"""
+        """初始化MinIO客户端和线程池"""
         self.client = Minio(
             endpoint=settings.MINIO_ENDPOINT,
             access_key=settings.MINIO_ACCESS_KEY,
             secret_key=settings.MINIO_SECRET_KEY,
             secure=settings.MINIO_SECURE,
         )
-        self._ensure_buckets_exist()
-    
+        # 签发给客户端的直传URL必须使用客户端可访问的地址签名；
+        # 指定区域后签名完全在本地完成，不会访问该地址
+        self.public_client = Minio(
+            endpoint=settings.MINIO_PUBLIC_ENDPOINT or settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=settings.MINIO_SECURE,
+            region=settings.MINIO_REGION,
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.STORAGE_MAX_WORKERS,
+            thread_name_prefix="storage",
+        )
+
+    async def start(self):
+        """确保存储桶存在"""
+        try:
+            await self._run(self._ensure_buckets_exist)
+            logger.info("对象存储已就绪")
+        except Exception as e:
+            logger.error(f"初始化对象存储失败: {str(e)}")
+
+    async def close(self):
+        """关闭线程池（不等待进行中的调用）"""
+        self.executor.shutdown(wait=False)
+        logger.info("已关闭对象存储线程池")
+
+    async def _run(self, func, *args, **kwargs):
+        """在存储线程池中执行同步调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
     def _ensure_buckets_exist(self):
         """确保所需的存储桶存在"""
         if not self.client.bucket_exists(settings.MINIO_POST_BUCKET):
@@ -41,92 +146,411 @@ class StorageService:
                 ]
             }
             self.client.set_bucket_policy(settings.MINIO_POST_BUCKET, json.dumps(policy))
-    
+
+    @staticmethod
+    def content_path(folder: str, digest: str, content_type: str) -> str:
+        """
+        内容寻址的对象路径：{folder}/{摘要前两位}/{摘要}{扩展名}
+
+        参数:
+            folder: 存储的子文件夹
+            digest: 内容的 SHA-256
+            content_type: 内容类型，用于确定扩展名
+
+        返回:
+            对象路径
+        """
+        extension = mimetypes.guess_extension(content_type) or ""
+        return f"{folder}/{digest[:2]}/{digest}{extension}"
+
+    @staticmethod
+    def derivative_base(path: str) -> str:
+        """衍生图路径的公共前缀（原图路径去掉扩展名），衍生图为 <前缀>_w<宽度>.<扩展名>"""
+        name = path.rsplit("/", 1)[-1]
+        return path.rsplit(".", 1)[0] if "." in name else path
+
+    def get_object_url(self, path: str) -> str:
+        """返回公开可读存储桶中对象的访问URL"""
+        if settings.MINIO_SECURE:
+            protocol = "https"
+        else:
+            protocol = "http"
+
+        return f"{protocol}://{settings.MINIO_ENDPOINT}/{settings.MINIO_POST_BUCKET}/{path}"
+
+    def object_path(self, url: str) -> str:
+        """get_object_url 的逆操作：从访问URL取回对象路径"""
+        return url[len(self.get_object_url("")):]
+
+    async def put_bytes(self, path: str, data: bytes, content_type: str) -> str:
+        """
+        上传内存中的小对象（如衍生图）
+
+        参数:
+            path: 对象路径
+            data: 对象内容
+            content_type: 内容类型
+
+        返回:
+            对象的访问URL
+        """
+        try:
+            await self._run(
+                self.client.put_object,
+                bucket_name=settings.MINIO_POST_BUCKET,
+                object_name=path,
+                data=io.BytesIO(data),
+                length=len(data),
+                content_type=content_type,
+            )
+            return self.get_object_url(path)
+        except S3Error as err:
+            raise Exception(f"文件上传失败: {err}")
+
+    async def get_bytes(self, path: str) -> bytes:
+        """
+        读取整个对象到内存，只用于大小受限的对象（如待处理的图片）
+
+        参数:
+            path: 对象路径
+
+        返回:
+            对象内容
+        """
+        def read() -> bytes:
+            response = self.client.get_object(bucket_name=settings.MINIO_POST_BUCKET, object_name=path)
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+
+        try:
+            return await self._run(read)
+        except S3Error as err:
+            raise Exception(f"文件读取失败: {err}")
+
     async def upload_file(
-        self, 
-        file: UploadFile, 
-        folder: str = "uploads", 
-        object_name: Optional[str] = None,
+        self,
+        file: UploadFile,
+        folder: str = "uploads",
         tags: Optional[Dict[str, str]] = None,
     ) -> str:
         """
-        上传文件到对象存储
-        
+        按内容寻址上传文件
+
+        先在本地临时文件上计算 SHA-256（同时检查大小），对象保存在以摘要命名的路径下。
+        相同内容已存在时不再上传到MinIO，只在 media_objects 中增加引用计数。
+
         参数:
             file: 要上传的文件
-            folder: 存储的子文件夹
-            object_name: 对象名称，如果不提供将生成唯一名称
-            tags: 对象标签
-        
+            folder: 存储的子文件夹（只在首次上传该内容时生效）
+            tags: 对象标签（只在首次上传该内容时设置）
+
         返回:
             对象的访问URL
         """
-        # 生成唯一文件名
-        if not object_name:
-            file_ext = file.filename.split(".")[-1] if "." in file.filename else ""
-            object_name = f"{uuid.uuid4().hex}"
-            if file_ext:
-                object_name = f"{object_name}.{file_ext}"
-        
-        # 构建完整路径
-        path = f"{folder}/{object_name}" if folder else object_name
-        
-        # 将文件内容读入内存
-        content = await file.read()
-        file_size = len(content)
-        content_stream = io.BytesIO(content)
-        
-        # 上传文件
+        # 已知大小时直接拒绝，避免读取文件
+        declared_size = getattr(file, "size", None)
+        if declared_size is not None and declared_size > settings.MAX_UPLOAD_SIZE:
+            raise UploadTooLargeError(settings.MAX_UPLOAD_SIZE)
+
+        content_type = file.content_type or "application/octet-stream"
+        await file.seek(0)
+
         try:
-            result = self.client.put_object(
-                bucket_name=settings.MINIO_POST_BUCKET,
-                object_name=path,
-                data=content_stream,
-                length=file_size,
-                content_type=file.content_type or "application/octet-stream",
+            digest, size = await self._run(self._hash_stream, file.file)
+            path, created = await self._acquire(
+                self.content_path(folder, digest, content_type), digest, size, content_type
             )
-            
-            # 如果有标签，设置对象标签
-            if tags:
-                self.client.set_object_tags(
-                    bucket_name=settings.MINIO_POST_BUCKET,
-                    object_name=path,
-                    tags=Tags(tags),
-                )
-            
-            # 返回对象URL
-            # 对于公开可读的存储桶，可以使用以下URL格式
-            if settings.MINIO_SECURE:
-                protocol = "https"
-            else:
-                protocol = "http"
-            
-            return f"{protocol}://{settings.MINIO_ENDPOINT}/{settings.MINIO_POST_BUCKET}/{path}"
-        
+            try:
+                # 并发上传相同内容时，先登记的请求可能还没有写完对象
+                if created or await self.stat_file(path) is None:
+                    await file.seek(0)
+                    await self._run(self._put_stream, path, file.file, size, digest, content_type, tags)
+                else:
+                    MEDIA_UPLOADS_DEDUPLICATED.inc()
+                    MEDIA_BYTES_DEDUPLICATED.inc(size)
+            except Exception:
+                # 释放本次登记的引用，新建的对象随之删除
+                await self.delete_file(path)
+                raise
+            return self.get_object_url(path)
         except S3Error as err:
             raise Exception(f"文件上传失败: {err}")
         finally:
             # 确保文件指针回到开始位置，以便后续可能的读取
             await file.seek(0)
-            content_stream.close()
-    
-    def get_presigned_url(
-        self, 
-        object_name: str, 
+
+    async def _acquire(self, path: str, digest: str, size: int, content_type: str) -> Tuple[str, bool]:
+        """
+        登记对内容的一个引用（引用计数 +1）
+
+        返回:
+            (对象路径, 是否首次登记)；内容已存在时返回已有的路径
+        """
+        stmt = pg_insert(MediaObject).values(
+            digest=digest, path=path, size=size, content_type=content_type, ref_count=1
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MediaObject.digest],
+            set_={"ref_count": MediaObject.ref_count + 1},
+        ).returning(MediaObject.path, literal_column("xmax = 0").label("inserted"))
+
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(stmt)).one()
+            await db.commit()
+        return row.path, row.inserted
+
+    async def acquire_uploaded(self, db: AsyncSession, objects: List[Object]) -> None:
+        """
+        在调用方的事务中登记直传对象的引用（每个帖子引用计数 +1）
+
+        直传对象不是按内容寻址的，以对象路径的 SHA-256 作为 digest 登记；
+        与帖子在同一事务中提交，帖子保存失败时登记随之回滚，对象保留供客户端重试。
+
+        参数:
+            db: 数据库会话（调用方负责提交）
+            objects: stat_file 返回的对象信息，对象路径不能重复
+        """
+        if not objects:
+            return
+        # 按路径排序，固定并发登记时的加锁顺序
+        rows = [
+            {
+                "digest": hashlib.sha256(obj.object_name.encode("utf-8")).hexdigest(),
+                "path": obj.object_name,
+                "size": obj.size,
+                "content_type": obj.content_type,
+                "ref_count": 1,
+            }
+            for obj in sorted(objects, key=lambda obj: obj.object_name)
+        ]
+        stmt = pg_insert(MediaObject).values(rows)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[MediaObject.digest],
+            set_={"ref_count": MediaObject.ref_count + 1},
+        ))
+
+    async def get_media_attributes(self, paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量读取已登记对象的处理结果（尺寸、blurhash、衍生图）
+
+        返回:
+            路径 -> 处理结果，未登记或未处理的对象不在其中
+        """
+        if not paths:
+            return {}
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(MediaObject.path, MediaObject.attributes).where(
+                    MediaObject.path.in_(paths), MediaObject.attributes.isnot(None)
+                )
+            )).all()
+        return {row.path: row.attributes for row in rows}
+
+    async def set_media_attributes(self, path: str, attributes: Dict[str, Any]) -> None:
+        """保存对象的处理结果，相同内容再次上传时直接复用（未登记的对象忽略）"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(MediaObject).where(MediaObject.path == path).values(attributes=attributes)
+            )
+            await db.commit()
+
+    @staticmethod
+    def _hash_stream(stream: BinaryIO) -> Tuple[str, int]:
+        """在线程池中执行：按块读取整个文件，返回 (SHA-256, 字节数)，超过大小限制时中止"""
+        reader = LimitedHashingReader(stream, settings.MAX_UPLOAD_SIZE)
+        while reader.read(settings.UPLOAD_PART_SIZE):
+            pass
+        return reader.sha256, reader.size
+
+    def _put_stream(
+        self,
+        path: str,
+        stream: BinaryIO,
+        size: int,
+        digest: str,
+        content_type: str,
+        tags: Optional[Dict[str, str]],
+    ) -> None:
+        """在线程池中执行：流式上传对象并设置标签（含SHA-256校验和）"""
+        # 超过 part_size 时 MinIO 按分片上传，内存占用与文件大小无关
+        self.client.put_object(
+            bucket_name=settings.MINIO_POST_BUCKET,
+            object_name=path,
+            data=stream,
+            length=size,
+            part_size=settings.UPLOAD_PART_SIZE,
+            content_type=content_type,
+        )
+
+        # 设置对象标签，附带校验和
+        object_tags = Tags.new_object_tags()
+        object_tags.update(tags or {})
+        object_tags["sha256"] = digest
+        self.client.set_object_tags(
+            bucket_name=settings.MINIO_POST_BUCKET,
+            object_name=path,
+            tags=object_tags,
+        )
+
+    async def upload_files(
+        self,
+        files: List[UploadFile],
+        folder: str = "uploads",
+        tags: Optional[Dict[str, str]] = None,
+        concurrency: Optional[int] = None,
+    ) -> List[str]:
+        """
+        并发上传多个文件，任一失败时删除已上传的对象并抛出第一个异常
+
+        参数:
+            files: 文件列表
+            folder: 存储的子文件夹
+            tags: 对象标签
+            concurrency: 单次调用的最大并发数，默认 MEDIA_UPLOAD_CONCURRENCY
+
+        返回:
+            与 files 顺序一致的访问URL列表
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.MEDIA_UPLOAD_CONCURRENCY)
+
+        async def upload_one(file: UploadFile) -> str:
+            async with semaphore:
+                return await self.upload_file(file=file, folder=folder, tags=tags)
+
+        results = await asyncio.gather(
+            *(upload_one(file) for file in files),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            # 失败的文件已在 upload_file 中清理，这里只删除成功的
+            await self.delete_files([self.object_path(result) for result in results if isinstance(result, str)])
+            raise errors[0]
+        return results
+
+    def presigned_put_url(self, object_name: str, expires: timedelta) -> str:
+        """
+        生成预签名PUT地址，客户端用它直接把文件上传到对象存储
+
+        签名在本地完成，不访问MinIO。
+
+        参数:
+            object_name: 对象名称
+            expires: URL有效期
+
+        返回:
+            预签名URL
+        """
+        return self.public_client.presigned_put_object(
+            bucket_name=settings.MINIO_POST_BUCKET,
+            object_name=object_name,
+            expires=expires,
+        )
+
+    async def stat_file(self, object_name: str) -> Optional[Object]:
+        """
+        读取对象元数据（HEAD请求）
+
+        参数:
+            object_name: 对象名称
+
+        返回:
+            对象信息（含 size、content_type），对象不存在时返回 None
+        """
+        try:
+            return await self._run(
+                self.client.stat_object,
+                bucket_name=settings.MINIO_POST_BUCKET,
+                object_name=object_name,
+            )
+        except S3Error as err:
+            if err.code in ("NoSuchKey", "NoSuchObject"):
+                return None
+            raise Exception(f"无法读取对象信息: {err}")
+
+    async def create_multipart_upload(self, object_name: str, content_type: str) -> str:
+        """
+        创建分片上传
+
+        参数:
+            object_name: 对象名称
+            content_type: 对象的内容类型
+
+        返回:
+            upload_id
+        """
+        # SDK 未公开分片上传的单步接口，这里使用其内部方法（requirements.txt 固定了已核对签名的 minio 版本）
+        return await self._run(
+            self.client._create_multipart_upload,
+            settings.MINIO_POST_BUCKET,
+            object_name,
+            {"Content-Type": content_type},
+        )
+
+    async def upload_part(self, object_name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        """
+        上传一个分片，重复上传同一编号会覆盖之前的分片
+
+        返回:
+            分片的 ETag
+        """
+        return await self._run(
+            self.client._upload_part,
+            settings.MINIO_POST_BUCKET,
+            object_name,
+            data,
+            None,
+            upload_id,
+            part_number,
+        )
+
+    async def complete_multipart_upload(self, object_name: str, upload_id: str, parts: List[Tuple[int, str]]) -> None:
+        """
+        按分片编号合并分片，生成最终对象
+
+        参数:
+            object_name: 对象名称
+            upload_id: 分片上传ID
+            parts: (分片编号, ETag) 列表
+        """
+        await self._run(
+            self.client._complete_multipart_upload,
+            settings.MINIO_POST_BUCKET,
+            object_name,
+            upload_id,
+            [Part(part_number, etag) for part_number, etag in sorted(parts)],
+        )
+
+    async def abort_multipart_upload(self, object_name: str, upload_id: str) -> None:
+        """放弃分片上传并释放已上传的分片"""
+        await self._run(
+            self.client._abort_multipart_upload,
+            settings.MINIO_POST_BUCKET,
+            object_name,
+            upload_id,
+        )
+
+    async def get_presigned_url(
+        self,
+        object_name: str,
         expires: timedelta = timedelta(hours=1)
     ) -> str:
         """
         生成预签名URL用于访问私有对象
-        
+
         参数:
             object_name: 对象名称
             expires: URL有效期
-        
+
         返回:
             预签名URL
         """
         try:
-            url = self.client.presigned_get_object(
+            url = await self._run(
+                self.client.presigned_get_object,
                 bucket_name=settings.MINIO_POST_BUCKET,
                 object_name=object_name,
                 expires=expires,
@@ -134,25 +558,76 @@ class StorageService:
             return url
         except S3Error as err:
             raise Exception(f"无法生成预签名URL: {err}")
-    
-    def delete_file(self, object_name: str) -> bool:
+
+    async def delete_file(self, object_name: str) -> bool:
         """
-        从对象存储中删除文件
-        
+        释放对象的一个引用
+
+        引用计数归零，或对象未在 media_objects 中登记（直传、旧对象）时，
+        从对象存储中删除该对象及其衍生图。
+
         参数:
             object_name: 对象名称
-        
+
         返回:
-            是否成功删除
+            是否成功
         """
         try:
-            self.client.remove_object(
-                bucket_name=settings.MINIO_POST_BUCKET,
-                object_name=object_name,
-            )
+            async with AsyncSessionLocal() as db:
+                remaining = (await db.execute(
+                    update(MediaObject)
+                    .where(MediaObject.path == object_name)
+                    .values(ref_count=MediaObject.ref_count - 1)
+                    .returning(MediaObject.ref_count)
+                )).scalar()
+                if remaining is not None and remaining > 0:
+                    await db.commit()
+                    return True
+
+                if remaining is not None:
+                    await db.execute(delete(MediaObject).where(MediaObject.path == object_name))
+                # 提交前删除对象：此时持有行锁，并发上传相同内容的请求会等待提交后重新上传
+                await self._run(self._remove_with_derivatives, object_name)
+                await db.commit()
             return True
         except S3Error:
             return False
 
+    async def discard_unreferenced(self, object_name: str) -> None:
+        """
+        删除未被任何帖子引用（未在 media_objects 中登记）的对象，已登记的对象保持不变
+
+        参数:
+            object_name: 对象名称
+        """
+        async with AsyncSessionLocal() as db:
+            referenced = (await db.execute(
+                select(MediaObject.digest).where(MediaObject.path == object_name)
+            )).first()
+        if referenced is None:
+            await self._run(self._remove_with_derivatives, object_name)
+
+    def _remove_with_derivatives(self, object_name: str) -> None:
+        """在线程池中执行：删除对象及其全部衍生图"""
+        self.client.remove_object(bucket_name=settings.MINIO_POST_BUCKET, object_name=object_name)
+        prefix = f"{self.derivative_base(object_name)}_w"
+        for obj in self.client.list_objects(settings.MINIO_POST_BUCKET, prefix=prefix):
+            self.client.remove_object(bucket_name=settings.MINIO_POST_BUCKET, object_name=obj.object_name)
+
+    async def delete_files(self, object_names: List[str]) -> None:
+        """
+        并发删除多个文件，删除失败只记录日志
+
+        参数:
+            object_names: 对象名称列表
+        """
+        results = await asyncio.gather(
+            *(self.delete_file(object_name) for object_name in object_names),
+            return_exceptions=True,
+        )
+        for object_name, result in zip(object_names, results):
+            if result is not True:
+                logger.warning(f"删除对象失败: {object_name}")
+
 # 创建存储服务单例
-storage = StorageService()
\ No newline at end of file
+storage = StorageService()
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+from prometheus_client import Counter
+
+from app.core.config import settings
+from app.utils.cache import LRUCache
+from app.utils.http_client import user_service_client
+from app.utils.redis_client import redis_service
+
+logger = logging.getLogger(__name__)
+
+USER_PROFILE_CACHE_LOOKUPS = Counter(
+    "user_profile_cache_lookups_total",
+    "用户资料缓存查询的用户数",
+    ["result"],  # memory_hit / redis_hit / miss / failure_cached
+)
+USER_PROFILE_BATCH_REQUESTS = Counter(
+    "user_profile_batch_requests_total",
+    "为补齐缓存而调用用户服务 /users/batch 的次数",
+)
+
+# 负缓存标记：用户服务确认不存在的用户
+_NOT_FOUND = object()
+# 获取失败标记：用户服务不可用，只在进程内缓存 USER_PROFILE_FAILURE_TTL 秒，避免故障期间每个请求都调用
+_FAILED = object()
+
+
+class UserProfileCache:
+    """
+    用户资料两级缓存（进程内LRU + Redis）
+
+    用于给帖子、评论、反应和搜索结果附加作者信息。只有两级缓存都未命中的
+    用户ID才会合并成一次 /users/batch 调用；同一用户的并发查询只会发起一次请求。
+    """
+
+    REDIS_KEY_PREFIX = "user_profile"
+
+    def __init__(self):
+        """初始化进程内缓存"""
+        self.cache = LRUCache(
+            maxsize=settings.USER_PROFILE_CACHE_MAX_SIZE,
+            ttl=settings.USER_PROFILE_CACHE_TTL,
+        )
+        # 正在请求中的用户ID -> Future
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+    async def get_many(self, user_ids: Iterable[int], raise_on_error: bool = False) -> Dict[int, Dict[str, Any]]:
+        """
+        批量获取用户资料
+
+        参数:
+            user_ids: 用户ID列表（可重复）
+            raise_on_error: 用户服务不可用时是否抛出异常，默认忽略并返回已知部分
+
+        返回:
+            用户ID到用户资料的映射，不存在的用户不包含在结果中
+
+        异常:
+            httpx.RequestError: raise_on_error 为 True 且用户服务不可用
+        """
+        ids = list(dict.fromkeys(int(user_id) for user_id in user_ids if user_id))
+        resolved: Dict[int, Any] = {}
+
+        # 第一级：进程内缓存（含最近获取失败的标记）
+        missing = []
+        failed = 0
+        for user_id in ids:
+            profile = self.cache.get(user_id)
+            if profile is None:
+                missing.append(user_id)
+            else:
+                resolved[user_id] = profile
+                failed += profile is _FAILED
+        USER_PROFILE_CACHE_LOOKUPS.labels(result="memory_hit").inc(len(ids) - len(missing) - failed)
+        USER_PROFILE_CACHE_LOOKUPS.labels(result="failure_cached").inc(failed)
+
+        # 第二级：Redis
+        if missing:
+            from_redis = await self._redis_get_many(missing)
+            USER_PROFILE_CACHE_LOOKUPS.labels(result="redis_hit").inc(len(from_redis))
+            for user_id, profile in from_redis.items():
+                self._cache_local(user_id, profile)
+                resolved[user_id] = profile
+            missing = [user_id for user_id in missing if user_id not in from_redis]
+
+        # 用户服务：合并为一次批量请求，并复用其他协程正在进行的请求
+        if missing:
+            USER_PROFILE_CACHE_LOOKUPS.labels(result="miss").inc(len(missing))
+            resolved.update(await self._load(missing))
+
+        if raise_on_error and any(profile is _FAILED for profile in resolved.values()):
+            raise httpx.RequestError("无法连接到用户服务")
+
+        return {
+            user_id: dict(profile)
+            for user_id, profile in resolved.items()
+            if isinstance(profile, dict)
+        }
+
+    async def get_one(self, user_id: int, raise_on_error: bool = False) -> Optional[Dict[str, Any]]:
+        """获取单个用户资料，不存在时返回 None"""
+        profiles = await self.get_many([user_id], raise_on_error=raise_on_error)
+        return profiles.get(int(user_id))
+
+    async def invalidate(self, user_id: int) -> None:
+        """
+        使用户资料缓存失效（收到用户更新事件时调用）
+
+        参数:
+            user_id: 用户ID
+        """
+        self.cache.delete(user_id)
+        if redis_service.is_ready:
+            try:
+                await redis_service.client.delete(self._redis_key(user_id))
+            except Exception as e:
+                logger.warning(f"删除Redis用户资料缓存失败: {str(e)}")
+
+    async def _load(self, user_ids: List[int]) -> Dict[int, Any]:
+        """从用户服务加载缓存中缺失的用户，合并并发请求"""
+        loop = asyncio.get_running_loop()
+        waiting = {user_id: self._inflight[user_id] for user_id in user_ids if user_id in self._inflight}
+        to_fetch = [user_id for user_id in user_ids if user_id not in waiting]
+
+        results: Dict[int, Any] = {}
+        if to_fetch:
+            futures = {user_id: loop.create_future() for user_id in to_fetch}
+            self._inflight.update(futures)
+
+            fetched = {user_id: _FAILED for user_id in to_fetch}
+            try:
+                fetched = await self._fetch(to_fetch)
+                await self._store(fetched)
+            except Exception as e:
+                logger.warning(f"批量获取用户信息失败: {str(e)}")
+                for user_id in to_fetch:
+                    if fetched[user_id] is _FAILED:
+                        self._cache_local(user_id, _FAILED)
+            finally:
+                # 无论成功与否都要唤醒等待同一用户的协程
+                for user_id, future in futures.items():
+                    self._inflight.pop(user_id, None)
+                    future.set_result(fetched[user_id])
+
+            results.update(fetched)
+
+        for user_id, future in waiting.items():
+            results[user_id] = await future
+
+        return results
+
+    async def _fetch(self, user_ids: List[int]) -> Dict[int, Any]:
+        """调用 /users/batch，返回用户ID到资料（或不存在标记）的映射"""
+        USER_PROFILE_BATCH_REQUESTS.inc()
+        client = await user_service_client.get_client()
+        # 后台任务（搜索索引、重建脚本）没有调用方的令牌，统一使用服务间调用令牌
+        headers = {"X-Service-Token": settings.USER_SERVICE_TOKEN} if settings.USER_SERVICE_TOKEN else None
+        response = await client.get("/users/batch", params={"ids": ",".join(map(str, user_ids))}, headers=headers)
+        response.raise_for_status()
+
+        users = {user["id"]: user for user in response.json()}
+        return {user_id: users.get(user_id, _NOT_FOUND) for user_id in user_ids}
+
+    async def _store(self, profiles: Dict[int, Any]) -> None:
+        """写入两级缓存，不存在的用户使用较短的负缓存时间"""
+        for user_id, profile in profiles.items():
+            self._cache_local(user_id, profile)
+
+        if not redis_service.is_ready:
+            return
+        try:
+            async with redis_service.client.pipeline(transaction=False) as pipe:
+                for user_id, profile in profiles.items():
+                    if profile is _NOT_FOUND:
+                        pipe.set(self._redis_key(user_id), "null", ex=settings.USER_PROFILE_NEGATIVE_TTL)
+                    else:
+                        pipe.set(self._redis_key(user_id), json.dumps(profile), ex=settings.USER_PROFILE_CACHE_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"写入Redis用户资料缓存失败: {str(e)}")
+
+    def _cache_local(self, user_id: int, profile: Any) -> None:
+        if profile is _FAILED:
+            self.cache.set(user_id, _FAILED, ttl=settings.USER_PROFILE_FAILURE_TTL)
+        elif profile is _NOT_FOUND:
+            self.cache.set(user_id, _NOT_FOUND, ttl=settings.USER_PROFILE_NEGATIVE_TTL)
+        else:
+            self.cache.set(user_id, profile)
+
+    async def _redis_get_many(self, user_ids: List[int]) -> Dict[int, Any]:
+        if not redis_service.is_ready:
+            return {}
+        try:
+            values = await redis_service.client.mget([self._redis_key(user_id) for user_id in user_ids])
+        except Exception as e:
+            logger.warning(f"读取Redis用户资料缓存失败: {str(e)}")
+            return {}
+
+        found = {}
+        for user_id, value in zip(user_ids, values):
+            if value is None:
+                continue
+            profile = json.loads(value)
+            found[user_id] = profile if profile is not None else _NOT_FOUND
+        return found
+
+    def _redis_key(self, user_id: int) -> str:
+        return f"{self.REDIS_KEY_PREFIX}:{user_id}"
+
+
+# 创建用户资料缓存单例
+user_profile_cache = UserProfileCache()
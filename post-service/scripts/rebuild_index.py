@@ -1,107 +1,284 @@
-# 修改 scripts/rebuild_index.py 文件
+"""
+重建帖子搜索索引（零停机）
 
+1. 新建带时间戳的索引，加载期间关闭刷新（refresh_interval=-1）、副本数为0；
+2. 把帖子ID范围切成若干片并行加载：每片按ID键集范围用服务端游标流式读取公开帖子，
+   通过 async_streaming_bulk 分块批量写入，内存占用与帖子总数无关；
+3. 恢复刷新间隔和副本数，等待副本分配完成后 refresh；
+4. 原子地把别名 ELASTICSEARCH_INDEX_POSTS 切换到新索引（旧版本中同名的实体索引会在同一操作中删除），
+   然后按搜索索引登记表补索引加载开始后登记过的帖子（包括只改变点赞数、评论数的帖子），
+   并删除加载期间已被删除的帖子，最后删除旧索引。
+
+登记表中已写入的记录保留 SEARCH_INDEX_QUEUE_RETENTION 秒，加载超过该时间时不切换别名。
+
+搜索服务始终通过别名读写，切换前后都不会中断。
+
+用法:
+    python scripts/rebuild_index.py [--slices 4] [--chunk-size 1000] [--keep-old]
+"""
+
+import argparse
 import asyncio
 import sys
 import os
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select
-from fastapi.encoders import jsonable_encoder
+from elasticsearch.helpers import async_scan, async_streaming_bulk
+from sqlalchemy import func, select
 
 from app.core.config import settings
-from app.db.session import get_db
-from app.models.post import Post
+from app.db.session import AsyncSessionLocal, async_engine
+from app.models.post import Post, Visibility
+from app.models.search_index import SearchIndexEntry
+from app.services.search_indexer import post_actions, post_select
 from app.utils.elasticsearch import es_service
+from app.utils.http_client import user_service_client
+from app.utils.redis_client import redis_service
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 创建异步数据库会话
-engine = create_async_engine(settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"))
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-async def rebuild_index():
+class Progress:
+    """各分片共享的进度统计"""
+
+    def __init__(self):
+        self.indexed = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.indexed / elapsed if elapsed > 0 else 0.0
+
+    def report(self, prefix: str = "进度") -> None:
+        logger.info(f"{prefix}: 已索引 {self.indexed} 个帖子，失败 {self.failed} 个，{self.rate:.0f} 个/秒")
+
+
+async def stream_actions(index: str, stmt, chunk_size: int) -> AsyncIterator[Dict[str, Any]]:
+    """用服务端游标流式读取帖子，逐块生成批量写入的动作"""
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(stmt.order_by(Post.id).execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            for action in await post_actions(index, rows):
+                yield action
+
+
+async def deleted_actions(index: str, chunk_size: int) -> AsyncIterator[Dict[str, Any]]:
+    """逐块扫描索引中的帖子ID，为数据库中已不存在的帖子生成删除动作"""
+
+    async def missing(post_ids: List[int]) -> List[int]:
+        async with AsyncSessionLocal() as session:
+            found = set((await session.execute(select(Post.id).where(Post.id.in_(post_ids)))).scalars())
+        return [post_id for post_id in post_ids if post_id not in found]
+
+    post_ids: List[int] = []
+    async for hit in async_scan(
+        es_service.client, index=index, query={"query": {"match_all": {}}}, _source=False, size=chunk_size
+    ):
+        post_ids.append(int(hit["_id"]))
+        if len(post_ids) >= chunk_size:
+            for post_id in await missing(post_ids):
+                yield {"_op_type": "delete", "_index": index, "_id": post_id}
+            post_ids = []
+    if post_ids:
+        for post_id in await missing(post_ids):
+            yield {"_op_type": "delete", "_index": index, "_id": post_id}
+
+
+async def load(index: str, stmt, chunk_size: int, progress: Progress) -> None:
+    """把一个查询的结果批量写入索引"""
+    await bulk_write(stream_actions(index, stmt, chunk_size), chunk_size, progress)
+
+
+async def bulk_write(actions: AsyncIterator[Dict[str, Any]], chunk_size: int, progress: Progress) -> None:
+    """分块批量执行写入或删除动作，并统计进度"""
+    async for ok, item in async_streaming_bulk(
+        es_service.client,
+        actions,
+        chunk_size=chunk_size,
+        max_chunk_bytes=10 * 1024 * 1024,
+        raise_on_error=False,
+        raise_on_exception=False,
+        max_retries=3,
+        initial_backoff=2,
+    ):
+        # 删除不存在的文档返回 404，不算失败
+        op, info = next(iter(item.items()))
+        if ok or (op == "delete" and info.get("status") == 404):
+            progress.indexed += 1
+        else:
+            progress.failed += 1
+            if progress.failed <= 10:
+                logger.warning(f"索引帖子失败: {info}")
+
+
+async def id_slices(slices: int) -> List[Tuple[int, int]]:
+    """把公开帖子的ID范围切成若干个左开右闭区间"""
+    async with AsyncSessionLocal() as session:
+        low, high = (await session.execute(
+            select(func.min(Post.id), func.max(Post.id)).where(Post.visibility == Visibility.PUBLIC)
+        )).one()
+    if low is None:
+        return []
+    span = high - low + 1
+    bounds = [low - 1 + span * i // slices for i in range(slices + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(slices) if bounds[i] < bounds[i + 1]]
+
+
+async def report_loop(progress: Progress, interval: float) -> None:
+    """定期输出进度"""
+    while True:
+        await asyncio.sleep(interval)
+        progress.report()
+
+
+async def database_now() -> datetime:
+    """数据库的当前时间（与登记表的 queued_at 使用同一时钟）"""
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(select(func.now()))).scalar_one()
+
+
+async def current_indices(alias: str) -> Tuple[List[str], bool]:
+    """返回 (别名当前指向的索引, 是否存在同名的实体索引)"""
+    client = es_service.client
+    if await client.indices.exists_alias(name=alias):
+        return list((await client.indices.get_alias(name=alias)).keys()), False
+    return [], bool(await client.indices.exists(index=alias))
+
+
+async def rebuild_index(slices: int, chunk_size: int, keep_old: bool) -> None:
     """重建全部帖子的搜索索引"""
     # 连接Elasticsearch
     await es_service.connect()
     if not es_service.is_ready:
         logger.error("无法连接到Elasticsearch")
         return
-    
-    # 创建新索引
-    index_name = f"posts_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    previous_index = es_service.index_name
-    
-    # 设置新索引名称
-    es_service.index_name = index_name
-    
-    # 创建新索引
-    success = await es_service.create_index()
-    if not success:
-        logger.error("无法创建新索引")
-        es_service.index_name = previous_index  # 恢复原索引名称
-        return
-    
-    logger.info(f"已创建新索引: {index_name}")
-    
-    # 从数据库批量读取公开帖子并索引
+
+    # 作者资料（用户名、姓名）通过缓存批量获取
+    await redis_service.connect()
+    await user_service_client.start()
+
+    client = es_service.client
+    alias = settings.ELASTICSEARCH_INDEX_POSTS
+    index_name = f"{alias}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    reporter: Optional[asyncio.Task] = None
+    # 当前所处的阶段和别名是否已切换，失败时如实记录
+    phase = "创建索引"
+    switched = False
+
     try:
-        async with AsyncSessionLocal() as session:
-            # 分批查询所有公开帖子
-            batch_size = 100
-            offset = 0
-            total_indexed = 0
-            
-            while True:
-                # 使用正确的异步查询语法
-                query = select(Post).filter(Post.visibility == "public").order_by(Post.id).offset(offset).limit(batch_size)
-                
-                result = await session.execute(query)
-                posts = result.scalars().all()
-                
-                if not posts:
-                    break
-                
-                # 索引批量帖子
-                for post in posts:
-                    post_data = jsonable_encoder(post)
-                    success = await es_service.index_post(post_data)
-                    if success:
-                        total_indexed += 1
-                
-                logger.info(f"已索引 {total_indexed} 个帖子")
-                offset += batch_size
-            
-            logger.info(f"索引重建完成，共索引 {total_indexed} 个帖子")
-            
-            # 将别名指向新索引
-            if total_indexed > 0:
-                # 创建或更新别名
-                await es_service.client.indices.put_alias(index=index_name, name="posts_current")
-                
-                # 删除旧索引（如果存在且不是当前新建的）
-                if previous_index != index_name:
-                    try:
-                        exists = await es_service.client.indices.exists(index=previous_index)
-                        if exists:
-                            await es_service.client.indices.delete(index=previous_index)
-                            logger.info(f"已删除旧索引: {previous_index}")
-                    except Exception as e:
-                        logger.error(f"删除旧索引失败: {str(e)}")
-            
+        # 此后登记的帖子在切换别名后补索引
+        started_at = await database_now()
+
+        # 创建新索引（批量加载设置）
+        if not await es_service.create_index(index_name, bulk_load=True):
+            logger.error("无法创建新索引")
+            return
+        logger.info(f"已创建新索引: {index_name}")
+
+        # 并行加载各分片
+        phase = "加载帖子"
+        progress = Progress()
+        reporter = asyncio.create_task(report_loop(progress, 10))
+        ranges = await id_slices(slices)
+        base = post_select().where(Post.visibility == Visibility.PUBLIC)
+        await asyncio.gather(*(
+            load(index_name, base.where(Post.id > low, Post.id <= high), chunk_size, progress)
+            for low, high in ranges
+        ))
+        progress.report("加载完成")
+
+        if progress.failed:
+            logger.error(f"有 {progress.failed} 个帖子索引失败，保留旧索引，不切换别名: {index_name}")
+            return
+
+        # 恢复正常的刷新间隔和副本数
+        phase = "恢复索引设置"
+        await client.indices.put_settings(index=index_name, settings={
+            "index": {
+                "refresh_interval": settings.ELASTICSEARCH_REFRESH_INTERVAL,
+                "number_of_replicas": settings.ELASTICSEARCH_NUMBER_OF_REPLICAS,
+            }
+        })
+        await client.cluster.health(
+            index=index_name,
+            wait_for_status="green" if settings.ELASTICSEARCH_NUMBER_OF_REPLICAS else "yellow",
+            timeout="10m",
+        )
+        await client.indices.refresh(index=index_name)
+
+        retention = timedelta(seconds=settings.SEARCH_INDEX_QUEUE_RETENTION)
+        if await database_now() - started_at >= retention:
+            logger.error(f"加载耗时超过登记保留时间，无法补齐加载期间的变更，不切换别名: {index_name}")
+            return
+
+        # 原子切换别名
+        phase = "切换别名"
+        old_indices, concrete = await current_indices(alias)
+        actions = [{"add": {"index": index_name, "alias": alias}}]
+        if concrete:
+            # 旧版本直接使用同名实体索引，在同一操作中删除并替换为别名
+            actions.insert(0, {"remove_index": {"index": alias}})
+        actions[0:0] = [{"remove": {"index": old, "alias": alias}} for old in old_indices]
+        await client.indices.update_aliases(actions=actions)
+        switched = True
+        logger.info(f"别名 {alias} 已切换到 {index_name}")
+
+        # 补索引加载开始后登记过的帖子（切换前写入的是旧索引），按最新状态写入或删除文档
+        phase = "补索引"
+        catch_up = Progress()
+        changed = select(SearchIndexEntry.post_id).where(SearchIndexEntry.queued_at >= started_at)
+        await load(index_name, post_select().where(Post.id.in_(changed)), chunk_size, catch_up)
+        catch_up.report("补索引完成")
+
+        # 加载期间被删除的帖子可能已写入新索引（删除事件只写入了旧索引），按ID逐块核对后删除
+        phase = "删除已不存在的帖子"
+        removed = Progress()
+        await bulk_write(deleted_actions(index_name, chunk_size), chunk_size, removed)
+        removed.report("删除已不存在的帖子完成")
+
+        if not keep_old:
+            phase = "删除旧索引"
+            for old in old_indices:
+                await client.indices.delete(index=old)
+                logger.info(f"已删除旧索引: {old}")
+
+        logger.info(
+            f"索引重建完成，共索引 {progress.indexed + catch_up.indexed} 个帖子，"
+            f"耗时 {time.perf_counter() - progress.started:.1f} 秒，平均 {progress.rate:.0f} 个/秒"
+        )
     except Exception as e:
-        logger.error(f"索引重建失败: {str(e)}")
+        if switched:
+            logger.error(f"索引重建在{phase}阶段失败，别名已切换到新索引 {index_name}，请检查后重新运行: {str(e)}")
+        else:
+            logger.error(f"索引重建在{phase}阶段失败，别名未切换，新索引保留以便排查: {index_name}: {str(e)}")
     finally:
+        if reporter is not None:
+            reporter.cancel()
         # 关闭连接
+        await user_service_client.close()
+        await redis_service.close()
         await es_service.close()
-        await engine.dispose()
+        await async_engine.dispose()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="重建帖子搜索索引")
+    parser.add_argument("--slices", type=int, default=4, help="并行加载的分片数")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="每次读取和批量写入的文档数")
+    parser.add_argument("--keep-old", action="store_true", help="切换后保留旧索引")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    asyncio.run(rebuild_index())
\ No newline at end of file
+    args = parse_args()
+    asyncio.run(rebuild_index(args.slices, args.chunk_size, args.keep_old))
@@ -0,0 +1,25 @@
+"""Add followee index to follows
+
+Revision ID: 6e4a1b7c3d92
+Revises: ac1f97d2786e
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e4a1b7c3d92'
+down_revision = 'ac1f97d2786e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 按被关注者分页获取关注者（唯一约束的前导列是 follower_id，无法用于该查询）
+    op.create_index('ix_follows_followee_id_follower_id', 'follows', ['followee_id', 'follower_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_follows_followee_id_follower_id', table_name='follows')
@@ -0,0 +1,26 @@
+"""Add avatar derivatives to users
+
+Revision ID: 7c4f1e9a2b53
+Revises: 2b8d5e0f6a17
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4f1e9a2b53'
+down_revision = '2b8d5e0f6a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('avatar_blurhash', sa.String(), nullable=True))
+    op.add_column('users', sa.Column('avatar_variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('users', 'avatar_variants')
+    op.drop_column('users', 'avatar_blurhash')
@@ -0,0 +1,32 @@
+"""Add follower_count to users
+
+Revision ID: 2b8d5e0f6a17
+Revises: 6e4a1b7c3d92
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b8d5e0f6a17'
+down_revision = '6e4a1b7c3d92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('follower_count', sa.Integer(), server_default='0', nullable=False))
+
+    # 用现有关注关系回填
+    op.execute("""
+        UPDATE users
+        SET follower_count = counts.total
+        FROM (SELECT followee_id, count(*) AS total FROM follows GROUP BY followee_id) AS counts
+        WHERE users.id = counts.followee_id
+    """)
+
+
+def downgrade():
+    op.drop_column('users', 'follower_count')
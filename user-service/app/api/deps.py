@@ -1,4 +1,5 @@
 # app/api/deps.py
+import hmac
 from typing import Generator, Optional
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
@@ -26,6 +27,17 @@ oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/login"
 )
 
+# 服务间调用不一定带用户令牌，缺少时不自动返回401
+optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl=f"{settings.API_V1_STR}/auth/login",
+    auto_error=False
+)
+
+def is_service_request(request: Request) -> bool:
+    """检查请求是否带有正确的服务间调用令牌"""
+    token = request.headers.get("X-Service-Token")
+    return bool(settings.SERVICE_TOKEN and token and hmac.compare_digest(token, settings.SERVICE_TOKEN))
+
 # 获取当前用户
 def get_current_user(
     request: Request,
@@ -74,6 +86,22 @@ def get_current_active_user(
         raise HTTPException(status_code=400, detail="用户不活跃")
     return current_user
 
+# 获取当前活跃用户，或确认为服务间调用（此时返回 None）
+def get_current_user_or_service(
+    request: Request,
+    db: Session = Depends(get_db),
+    token: Optional[str] = Depends(optional_oauth2_scheme)
+) -> Optional[User]:
+    if is_service_request(request):
+        return None
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="未提供认证凭据",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return get_current_active_user(get_current_user(request, db, token))
+
 # 获取当前超级用户
 def get_current_superuser(
     current_user: User = Depends(get_current_user),
@@ -1,16 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.models.user import User
 from app.models.follow import Follow
 from app.api.deps import get_current_user  # 假设你已有认证依赖
-from app.core.kafka_producer import send_follow_event
+from app.core.kafka_producer import send_follow_event, send_follow_graph_event
 
 router = APIRouter()
 
 @router.post("/users/{user_id}/follow", status_code=201)
-async def follow_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def follow_user(user_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="不能关注自己")
 
@@ -20,26 +22,64 @@ async def follow_user(user_id: int, db: Session = Depends(get_db), current_user:
 
     new_follow = Follow(follower_id=current_user.id, followee_id=user_id)
     db.add(new_follow)
+    db.query(User).filter(User.id == user_id).update(
+        {User.follower_count: User.follower_count + 1}, synchronize_session=False
+    )
     db.commit()
-    asyncio.create_task(send_follow_event(follower_id=current_user.id, followee_id=user_id))
+    # 同步会话在线程池中执行，事件在响应发送后由事件循环发布
+    background_tasks.add_task(send_follow_event, follower_id=current_user.id, followee_id=user_id)
+    background_tasks.add_task(send_follow_graph_event, "follow", follower_id=current_user.id, followee_id=user_id)
     return {"msg": "关注成功"}
 
 @router.delete("/users/{user_id}/unfollow", status_code=200)
-def unfollow_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def unfollow_user(user_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     follow = db.query(Follow).filter_by(follower_id=current_user.id, followee_id=user_id).first()
     if not follow:
         raise HTTPException(status_code=404, detail="未关注该用户")
 
     db.delete(follow)
+    db.query(User).filter(User.id == user_id).update(
+        {User.follower_count: func.greatest(User.follower_count - 1, 0)}, synchronize_session=False
+    )
     db.commit()
+    background_tasks.add_task(send_follow_graph_event, "unfollow", follower_id=current_user.id, followee_id=user_id)
     return {"msg": "取消关注成功"}
 
 @router.get("/users/{user_id}/followers")
-def get_followers(user_id: int, db: Session = Depends(get_db)):
-    followers = db.query(Follow).filter_by(followee_id=user_id).all()
-    return {"followers": [f.follower_id for f in followers]}
+def get_followers(
+    user_id: int,
+    after_id: Optional[int] = Query(None, description="上一页最后一个关注者ID"),
+    limit: Optional[int] = Query(None, ge=1, le=5000, description="每页数量，不传时返回全部"),
+    db: Session = Depends(get_db),
+):
+    """
+    获取关注者ID列表
+
+    传入 limit 时按关注者ID升序分页，next_after_id 为下一页的 after_id，没有更多数据时为空；
+    total 为关注者总数
+    """
+    total = db.query(User.follower_count).filter(User.id == user_id).scalar() or 0
+    query = db.query(Follow.follower_id).filter(Follow.followee_id == user_id)
+    if limit is None:
+        return {"followers": [follower_id for follower_id, in query.all()], "next_after_id": None, "total": total}
+
+    if after_id is not None:
+        query = query.filter(Follow.follower_id > after_id)
+    follower_ids = [follower_id for follower_id, in query.order_by(Follow.follower_id).limit(limit + 1).all()]
+
+    next_after_id = None
+    if len(follower_ids) > limit:
+        follower_ids = follower_ids[:limit]
+        next_after_id = follower_ids[-1]
+    return {"followers": follower_ids, "next_after_id": next_after_id, "total": total}
 
 @router.get("/users/{user_id}/following")
-def get_following(user_id: int, db: Session = Depends(get_db)):
-    following = db.query(Follow).filter_by(follower_id=user_id).all()
-    return {"following": [f.followee_id for f in following]}
+def get_following(
+    user_id: int,
+    min_followers: Optional[int] = Query(None, ge=0, description="只返回关注者数量不少于该值的用户"),
+    db: Session = Depends(get_db),
+):
+    query = db.query(Follow.followee_id).filter(Follow.follower_id == user_id)
+    if min_followers is not None:
+        query = query.join(User, User.id == Follow.followee_id).filter(User.follower_count >= min_followers)
+    return {"following": [followee_id for followee_id, in query.all()]}
@@ -1,13 +1,18 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_current_active_user, get_current_superuser
+from app.api.deps import get_current_active_user, get_current_superuser, get_current_user_or_service
+from app.core.config import settings
+from app.core.kafka_producer import send_user_updated_event
 from app.core.security import get_password_hash
 from app.db.session import get_db
 from app.models.user import User
 from app.schemas.user import User as UserSchema, UserCreate, UserUpdate
+from app.utils.media_processing import media_processor
+from app.utils.storage import UploadTooLargeError, storage
 
 router = APIRouter()
 
@@ -38,10 +43,11 @@ def update_user_me(
     *,
     db: Session = Depends(get_db),
     user_in: UserUpdate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
-    更新当前用户
+    更新当前用户（同步会话，在线程池中执行）
     """
     user_data = user_in.dict(exclude_unset=True)
     
@@ -55,8 +61,89 @@ def update_user_me(
     db.commit()
     db.refresh(current_user)
     
+    # 响应发送后通知其他服务失效该用户的缓存
+    background_tasks.add_task(send_user_updated_event, user_id=current_user.id)
+    
     return current_user
 
+@router.post("/me/avatar", response_model=UserSchema)
+async def upload_avatar(
+    *,
+    db: Session = Depends(get_db),
+    file: UploadFile = File(...),
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    上传头像，并生成多种尺寸的衍生图和 blurhash 占位图
+    """
+    if file.content_type not in settings.ALLOWED_IMAGE_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的文件类型: {file.content_type}")
+    
+    try:
+        original_url = await storage.upload_file(
+            file=file, folder="avatars", tags={"user_id": str(current_user.id)}
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    
+    async def load() -> bytes:
+        await file.seek(0)
+        return await file.read()
+    
+    result = await media_processor.process_image(
+        load, storage.object_path(original_url), settings.AVATAR_DERIVATIVE_WIDTHS
+    )
+    
+    def save_avatar() -> None:
+        if result:
+            # avatar_url 指向最大的 JPEG 衍生图，兼容只读取该字段的客户端
+            jpeg_variants = [variant for variant in result["variants"] if variant["format"] == "jpeg"]
+            current_user.avatar_url = jpeg_variants[0]["url"] if jpeg_variants else original_url
+            current_user.avatar_blurhash = result["blurhash"]
+            current_user.avatar_variants = result["variants"]
+        else:
+            current_user.avatar_url = original_url
+            current_user.avatar_blurhash = None
+            current_user.avatar_variants = None
+        
+        db.add(current_user)
+        db.commit()
+        db.refresh(current_user)
+    
+    # 同步会话的提交放到线程池中执行，不阻塞事件循环
+    await run_in_threadpool(save_avatar)
+    
+    # 响应发送后通知其他服务失效该用户的缓存
+    background_tasks.add_task(send_user_updated_event, user_id=current_user.id)
+    
+    return current_user
+
+@router.get("/batch", response_model=List[UserSchema])
+def read_users_batch(
+    ids: str = Query(..., description="用户ID列表，以逗号分隔"),
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_or_service),
+) -> Any:
+    """
+    批量获取多个用户信息（用户令牌或服务间调用令牌均可）
+
+    需要在 /{username} 之前注册，否则 /batch 会被当作用户名匹配
+    """
+    try:
+        user_ids = [int(id.strip()) for id in ids.split(",") if id.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="无效的用户ID格式",
+        )
+    
+    if not user_ids:
+        return []
+    
+    users = db.query(User).filter(User.id.in_(user_ids)).all()
+    return users
+
 @router.get("/{username}", response_model=UserSchema)
 def read_user_by_username(
     username: str,
@@ -89,26 +176,3 @@ def read_user_by_id(
             detail="未找到用户",
         )
     return user
-
-@router.get("/batch", response_model=List[UserSchema])
-def read_users_batch(
-    ids: str = Query(..., description="用户ID列表，以逗号分隔"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-) -> Any:
-    """
-    批量获取多个用户信息
-    """
-    try:
-        user_ids = [int(id.strip()) for id in ids.split(",") if id.strip()]
-    except ValueError:
-        raise HTTPException(
-            status_code=400,
-            detail="无效的用户ID格式",
-        )
-    
-    if not user_ids:
-        return []
-    
-    users = db.query(User).filter(User.id.in_(user_ids)).all()
-    return users
\ No newline at end of file
@@ -13,10 +13,20 @@ class Settings(BaseSettings):
     # 数据库配置
     DATABASE_URL: str
     
+    # 数据库连接池（每个引擎、每个工作进程独立）
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0  # 等待可用连接的超时（秒）
+    DB_POOL_RECYCLE: int = 1800  # 连接最大存活时间（秒）
+    DB_POOL_PRE_PING: bool = True  # 取出连接前检测是否可用
+    DB_STATEMENT_TIMEOUT_MS: int = 15000  # 服务端语句超时（毫秒），0 表示不限制
+    DB_PGBOUNCER_MODE: bool = False  # 经 PgBouncer（事务模式）连接：不在本地池化，禁用预编译语句缓存
+    
     # JWT 配置
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24小时
+    SERVICE_TOKEN: str = ""  # 服务间调用的共享令牌（请求头 X-Service-Token），为空时只接受用户令牌
     
     # CORS
     CORS_ORIGINS: List[str] = ["*"]
@@ -38,6 +48,7 @@ class Settings(BaseSettings):
     KAFKA_BOOTSTRAP_SERVERS: str = "kafka:9092"
     KAFKA_TOPIC_LOGS: str = "service.logs"
     KAFKA_TOPIC_NOTIFICATIONS: str = "user.notifications"
+    KAFKA_TOPIC_USERS: str = "user.events"  # 用户资料变更事件
     
     # MinIO配置（对象存储）
     MINIO_ENDPOINT: str = "minio:9000"
@@ -45,6 +56,7 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = "minioadmin"
     MINIO_SECURE: bool = False
     MINIO_USER_BUCKET: str = "user-content"
+    STORAGE_MAX_WORKERS: int = 16  # 执行MinIO同步调用的线程数（进程内对象存储最大并发）
     
     # OAuth2 配置
     GITHUB_CLIENT_ID: str = ""
@@ -68,6 +80,17 @@ class Settings(BaseSettings):
     
     # 上传文件存储路径
     UPLOADS_DIR: str = "/app/uploads"
+    MAX_UPLOAD_SIZE: int = 5 * 1024 * 1024  # 5MB
+    UPLOAD_PART_SIZE: int = 5 * 1024 * 1024  # 流式上传到MinIO的分片大小（不小于5MB）
+    MEDIA_UPLOAD_CONCURRENCY: int = 10  # 单个请求并发上传的文件数上限
+    ALLOWED_IMAGE_TYPES: List[str] = ["image/jpeg", "image/png", "image/gif", "image/webp"]
+    
+    # 头像衍生图配置
+    IMAGE_PROCESS_WORKERS: int = 1  # 生成衍生图的进程数，为0时不生成
+    AVATAR_DERIVATIVE_WIDTHS: List[int] = [64, 128, 256]  # 头像衍生图的最大宽度
+    IMAGE_DERIVATIVE_FORMATS: List[str] = ["webp", "jpeg"]  # 衍生图格式（webp / jpeg）
+    IMAGE_DERIVATIVE_QUALITY: int = 80  # 衍生图编码质量
+    IMAGE_MAX_PIXELS: int = 50_000_000  # 允许解码的最大像素数
     
     # 静态文件配置
     STATIC_DIR: str = "/app/static"
@@ -21,3 +21,21 @@ async def send_follow_event(follower_id: int, followee_id: int):
         "followee_id": followee_id,
     }
     await producer.send_and_wait("notifications", json.dumps(event).encode("utf-8"))
+
+async def send_user_updated_event(user_id: int):
+    await init_kafka_producer()
+    event = {
+        "type": "user_updated",
+        "user_id": user_id,
+    }
+    await producer.send_and_wait(settings.KAFKA_TOPIC_USERS, json.dumps(event).encode("utf-8"))
+
+async def send_follow_graph_event(event_type: str, follower_id: int, followee_id: int):
+    """关注关系变更事件（follow / unfollow），帖子服务据此重建关注者的首页时间线"""
+    await init_kafka_producer()
+    event = {
+        "type": event_type,
+        "follower_id": follower_id,
+        "followee_id": followee_id,
+    }
+    await producer.send_and_wait(settings.KAFKA_TOPIC_USERS, json.dumps(event).encode("utf-8"))
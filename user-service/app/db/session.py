@@ -1,11 +1,39 @@
+from typing import Any, Dict
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from app.core.config import settings
+from app.db.metrics import InstrumentedQueuePool
+
+
+def _engine_options() -> Dict[str, Any]:
+    """
+    根据配置生成引擎参数
+
+    返回:
+        传给 create_engine 的关键字参数
+    """
+    if settings.DB_PGBOUNCER_MODE:
+        # 连接由 PgBouncer 池化，本地不保留连接；语句超时需在数据库角色上设置（ALTER ROLE ... SET statement_timeout）
+        return {"poolclass": NullPool}
+
+    options: Dict[str, Any] = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        options["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    return options
 
 # 创建 SQLAlchemy 引擎
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(settings.DATABASE_URL, **_engine_options())
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -4,7 +4,11 @@ from prometheus_fastapi_instrumentator import Instrumentator
 
 from app.api import api_router
 from app.core.config import settings
+from app.db.metrics import register_pool_metrics
+from app.db.session import engine
 from app.utils.logging import setup_logging
+from app.utils.media_processing import media_processor
+from app.utils.storage import storage
 
 # 设置日志
 logger = setup_logging()
@@ -57,11 +61,29 @@ async def api_health_check():
 @app.on_event("startup")
 async def startup_event():
     logger.info("服务启动中...")
+    
+    # 注册数据库连接池指标
+    register_pool_metrics(engine, "sync")
+    
+    # 确保对象存储桶存在
+    await storage.start()
+    
+    # 启动图片处理进程池
+    await media_processor.start()
 
 # 关闭事件
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("服务关闭中...")
+    
+    # 停止图片处理进程池
+    await media_processor.stop()
+    
+    # 关闭对象存储线程池
+    await storage.close()
+    
+    # 关闭数据库连接池
+    engine.dispose()
 
 # 如果直接运行此脚本，则启动应用
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.session import Base
@@ -11,4 +11,8 @@ class Follow(Base):
     followee_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint("follower_id", "followee_id", name="uix_follower_followee"),)
+    __table_args__ = (
+        UniqueConstraint("follower_id", "followee_id", name="uix_follower_followee"),
+        # 按被关注者分页获取关注者
+        Index("ix_follows_followee_id_follower_id", "followee_id", "follower_id"),
+    )
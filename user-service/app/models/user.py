@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, Text, Enum
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Text, Enum, JSON
 from sqlalchemy.sql import func
 import enum
 
@@ -24,6 +24,8 @@ class User(Base):
     
     # 扩展个人资料
     avatar_url = Column(String, nullable=True)
+    avatar_blurhash = Column(String, nullable=True)  # 头像加载前显示的占位图
+    avatar_variants = Column(JSON, nullable=True)  # 头像衍生图 [{url, width, height, format}]
     bio = Column(Text, nullable=True)
     location = Column(String, nullable=True)
     website = Column(String, nullable=True)
@@ -38,6 +40,9 @@ class User(Base):
     # 隐私设置
     is_private = Column(Boolean, default=False)
     
+    # 关注者数量（关注/取消关注时原子更新）
+    follower_count = Column(Integer, nullable=False, server_default="0")
+    
     # 审计字段
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, date
 from pydantic import BaseModel, EmailStr, Field, validator, HttpUrl
 
@@ -46,6 +46,14 @@ class UserProfileUpdate(BaseModel):
         return v
 
 
+# 头像衍生图
+class ImageVariant(BaseModel):
+    url: str
+    width: int
+    height: int
+    format: str  # webp / jpeg
+
+
 # 用于数据库操作的用户模型基类
 class UserInDBBase(UserBase):
     id: int
@@ -54,6 +62,8 @@ class UserInDBBase(UserBase):
     is_superuser: bool
     # 基本资料
     avatar_url: Optional[str] = None
+    avatar_blurhash: Optional[str] = None
+    avatar_variants: Optional[List[ImageVariant]] = None
     bio: Optional[str] = None
     location: Optional[str] = None
     website: Optional[HttpUrl] = None
@@ -89,6 +99,8 @@ class UserPublic(BaseModel):
     username: str
     full_name: Optional[str] = None
     avatar_url: Optional[str] = None
+    avatar_blurhash: Optional[str] = None
+    avatar_variants: Optional[List[ImageVariant]] = None
     bio: Optional[str] = None
     location: Optional[str] = None
     website: Optional[HttpUrl] = None
@@ -0,0 +1,169 @@
+import io
+import math
+from typing import List, NamedTuple, Sequence
+
+from PIL import Image, ImageOps
+
+# 各输出格式对应的 Pillow 格式名、内容类型和扩展名
+IMAGE_FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+class ImageDerivative(NamedTuple):
+    """一张缩放后的衍生图"""
+    width: int
+    height: int
+    format: str  # webp / jpeg
+    content_type: str
+    extension: str
+    data: bytes
+
+
+class ProcessedImage(NamedTuple):
+    """原图尺寸、占位图和全部衍生图"""
+    width: int
+    height: int
+    blurhash: str
+    derivatives: List[ImageDerivative]
+
+
+def generate_derivatives(
+    data: bytes,
+    widths: Sequence[int],
+    formats: Sequence[str],
+    quality: int,
+    max_pixels: int,
+) -> ProcessedImage:
+    """
+    解码一次图片，按宽度上限生成多种尺寸和格式的衍生图，并计算 blurhash
+
+    在进程池中执行，参数和返回值都可序列化。比原图宽的尺寸会被跳过；
+    原图比所有尺寸都窄时只按原宽度转换格式。动图只处理第一帧。
+
+    参数:
+        data: 原图内容
+        widths: 衍生图的最大宽度列表
+        formats: 输出格式列表（webp / jpeg）
+        quality: 编码质量
+        max_pixels: 允许解码的最大像素数，防止解压炸弹
+
+    返回:
+        ProcessedImage
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+
+    with Image.open(io.BytesIO(data)) as source:
+        # EXIF 方向为 5~8 时宽高互换
+        orientation = source.getexif().get(0x0112, 1)
+        width, height = source.size
+        if orientation in (5, 6, 7, 8):
+            width, height = height, width
+
+        targets = sorted({w for w in widths if w < width}, reverse=True) or [width]
+
+        # JPEG 可以在解码时按 1/2~1/8 缩放，只解码到最大衍生图所需的尺寸
+        scale = targets[0] / width
+        source.draft("RGB", (math.ceil(source.size[0] * scale), math.ceil(source.size[1] * scale)))
+        image = ImageOps.exif_transpose(source)
+
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    derivatives = []
+    current = image
+    # 从大到小逐级缩放，每一级以上一级为输入
+    for target in targets:
+        size = (target, max(round(height * target / width), 1))
+        if current.size != size:
+            current = current.resize(size, Image.LANCZOS)
+        for name in formats:
+            pil_format, content_type, extension = IMAGE_FORMATS[name]
+            buffer = io.BytesIO()
+            if pil_format == "JPEG":
+                rgb = current.convert("RGB") if has_alpha else current
+                rgb.save(buffer, pil_format, quality=quality, optimize=True, progressive=True)
+            else:
+                current.save(buffer, pil_format, quality=quality, method=4)
+            derivatives.append(ImageDerivative(size[0], size[1], name, content_type, extension, buffer.getvalue()))
+
+    return ProcessedImage(width, height, blurhash_encode(current), derivatives)
+
+
+def _encode83(value: int, length: int) -> str:
+    return "".join(_BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _srgb_to_linear(value: int) -> float:
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash_encode(image: Image.Image, x_components: int = 4, y_components: int = 3) -> str:
+    """
+    计算图片的 blurhash 占位字符串（在缩小到32像素以内的图上计算）
+
+    参数:
+        image: 图片
+        x_components: 水平方向的分量数
+        y_components: 垂直方向的分量数
+
+    返回:
+        blurhash 字符串
+    """
+    small = image.convert("RGB")
+    small.thumbnail((32, 32))
+    width, height = small.size
+    pixels = [tuple(_srgb_to_linear(c) for c in pixel) for pixel in small.getdata()]
+
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[i][x] * cos_y[j][y]
+                    pr, pg, pb = pixels[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = normalisation / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(c) for factor in ac for c in factor)
+        quantised_max = max(0, min(82, int(actual_max * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+        result += _encode83(quantised_max, 1)
+    else:
+        max_value = 1
+        result += _encode83(0, 1)
+
+    result += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+
+    for factor in ac:
+        q = [
+            max(0, min(18, int(math.floor(math.copysign(abs(c / max_value) ** 0.5, c) * 9 + 9.5))))
+            for c in factor
+        ]
+        result += _encode83(q[0] * 19 * 19 + q[1] * 19 + q[2], 2)
+
+    return result
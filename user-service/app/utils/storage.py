@@ -1,28 +1,98 @@
+import asyncio
+import functools
+import hashlib
 import io
-import uuid
+import logging
+import mimetypes
+import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from typing import Optional, BinaryIO
+from typing import Optional, BinaryIO, Dict, Any, List, Tuple
 
 from fastapi import UploadFile
 from minio import Minio
 from minio.commonconfig import Tags
+from minio.datatypes import Object
 from minio.error import S3Error
 
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLargeError(Exception):
+    """上传的文件超过大小限制"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"文件大小超过限制（最大 {max_size // (1024 * 1024)}MB）")
+
+
+class LimitedHashingReader:
+    """
+    包装上传文件的只读流：边读边计算 SHA-256，并在超过大小限制时中止
+
+    MinIO 按 part_size 分块读取，因此内存占用与文件大小无关
+    """
+
+    def __init__(self, stream: BinaryIO, max_size: int):
+        self.stream = stream
+        self.max_size = max_size
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.stream.read(size)
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadTooLargeError(self.max_size)
+        self._hash.update(chunk)
+        return chunk
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+
 class StorageService:
-    """对象存储服务封装，使用MinIO作为后端"""
-    
+    """
+    对象存储服务封装，使用MinIO作为后端
+
+    MinIO SDK 是同步的，所有调用都放到有界线程池中执行，不阻塞事件循环；
+    线程池大小即本进程访问对象存储的最大并发数。
+    """
+
     def __init__(self):
-        """初始化MinIO客户端"""
+        """初始化MinIO客户端和线程池"""
         self.client = Minio(
             endpoint=settings.MINIO_ENDPOINT,
             access_key=settings.MINIO_ACCESS_KEY,
             secret_key=settings.MINIO_SECRET_KEY,
             secure=settings.MINIO_SECURE,
         )
-        self._ensure_buckets_exist()
-    
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.STORAGE_MAX_WORKERS,
+            thread_name_prefix="storage",
+        )
+
+    async def start(self):
+        """确保存储桶存在"""
+        try:
+            await self._run(self._ensure_buckets_exist)
+            logger.info("对象存储已就绪")
+        except Exception as e:
+            logger.error(f"初始化对象存储失败: {str(e)}")
+
+    async def close(self):
+        """关闭线程池（不等待进行中的调用）"""
+        self.executor.shutdown(wait=False)
+        logger.info("已关闭对象存储线程池")
+
+    async def _run(self, func, *args, **kwargs):
+        """在存储线程池中执行同步调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
     def _ensure_buckets_exist(self):
         """确保所需的存储桶存在"""
         if not self.client.bucket_exists(settings.MINIO_USER_BUCKET):
@@ -39,93 +109,222 @@ class StorageService:
                     }
                 ]
             }
-            self.client.set_bucket_policy(settings.MINIO_USER_BUCKET, policy)
-    
-    async def upload_file(
-        self, 
-        file: UploadFile, 
-        folder: str = "uploads", 
-        object_name: Optional[str] = None,
-        tags: Optional[dict] = None,
-    ) -> str:
+            self.client.set_bucket_policy(settings.MINIO_USER_BUCKET, json.dumps(policy))
+
+    @staticmethod
+    def content_path(folder: str, digest: str, content_type: str) -> str:
         """
-        上传文件到对象存储
-        
+        内容寻址的对象路径：{folder}/{摘要前两位}/{摘要}{扩展名}
+
         参数:
-            file: 要上传的文件
             folder: 存储的子文件夹
-            object_name: 对象名称，如果不提供将生成唯一名称
-            tags: 对象标签
-        
+            digest: 内容的 SHA-256
+            content_type: 内容类型，用于确定扩展名
+
+        返回:
+            对象路径
+        """
+        extension = mimetypes.guess_extension(content_type) or ""
+        return f"{folder}/{digest[:2]}/{digest}{extension}"
+
+    @staticmethod
+    def derivative_base(path: str) -> str:
+        """衍生图路径的公共前缀（原图路径去掉扩展名），衍生图为 <前缀>_w<宽度>.<扩展名>"""
+        name = path.rsplit("/", 1)[-1]
+        return path.rsplit(".", 1)[0] if "." in name else path
+
+    def get_object_url(self, path: str) -> str:
+        """返回公开可读存储桶中对象的访问URL"""
+        if settings.MINIO_SECURE:
+            protocol = "https"
+        else:
+            protocol = "http"
+
+        return f"{protocol}://{settings.MINIO_ENDPOINT}/{settings.MINIO_USER_BUCKET}/{path}"
+
+    def object_path(self, url: str) -> str:
+        """get_object_url 的逆操作：从访问URL取回对象路径"""
+        return url[len(self.get_object_url("")):]
+
+    async def put_bytes(self, path: str, data: bytes, content_type: str) -> str:
+        """
+        上传内存中的小对象（如衍生图）
+
+        参数:
+            path: 对象路径
+            data: 对象内容
+            content_type: 内容类型
+
         返回:
             对象的访问URL
         """
-        # 生成唯一文件名
-        if not object_name:
-            file_ext = file.filename.split(".")[-1] if "." in file.filename else ""
-            object_name = f"{uuid.uuid4().hex}"
-            if file_ext:
-                object_name = f"{object_name}.{file_ext}"
-        
-        # 构建完整路径
-        path = f"{folder}/{object_name}" if folder else object_name
-        
-        # 将文件内容读入内存
-        content = await file.read()
-        file_size = len(content)
-        content_stream = io.BytesIO(content)
-        
-        # 上传文件
         try:
-            result = self.client.put_object(
+            await self._run(
+                self.client.put_object,
                 bucket_name=settings.MINIO_USER_BUCKET,
                 object_name=path,
-                data=content_stream,
-                length=file_size,
-                content_type=file.content_type or "application/octet-stream",
+                data=io.BytesIO(data),
+                length=len(data),
+                content_type=content_type,
             )
-            
-            # 如果有标签，设置对象标签
-            if tags:
-                self.client.set_object_tags(
-                    bucket_name=settings.MINIO_USER_BUCKET,
-                    object_name=path,
-                    tags=Tags(tags),
-                )
-            
-            # 返回对象URL
-            # 对于公开可读的存储桶，可以使用以下URL格式
-            if settings.MINIO_SECURE:
-                protocol = "https"
-            else:
-                protocol = "http"
-            
-            return f"{protocol}://{settings.MINIO_ENDPOINT}/{settings.MINIO_USER_BUCKET}/{path}"
-        
+            return self.get_object_url(path)
+        except S3Error as err:
+            raise Exception(f"文件上传失败: {err}")
+
+    async def upload_file(
+        self,
+        file: UploadFile,
+        folder: str = "uploads",
+        tags: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """
+        按内容寻址上传文件
+
+        先在本地临时文件上计算 SHA-256（同时检查大小），对象保存在以摘要命名的路径下；
+        相同内容已存在时不再上传到MinIO
+
+        参数:
+            file: 要上传的文件
+            folder: 存储的子文件夹
+            tags: 对象标签（只在首次上传该内容时设置）
+
+        返回:
+            对象的访问URL
+        """
+        # 已知大小时直接拒绝，避免读取文件
+        declared_size = getattr(file, "size", None)
+        if declared_size is not None and declared_size > settings.MAX_UPLOAD_SIZE:
+            raise UploadTooLargeError(settings.MAX_UPLOAD_SIZE)
+
+        content_type = file.content_type or "application/octet-stream"
+        await file.seek(0)
+
+        try:
+            digest, size = await self._run(self._hash_stream, file.file)
+            path = self.content_path(folder, digest, content_type)
+            if await self.stat_file(path) is None:
+                await file.seek(0)
+                await self._run(self._put_stream, path, file.file, size, digest, content_type, tags)
+            return self.get_object_url(path)
         except S3Error as err:
             raise Exception(f"文件上传失败: {err}")
         finally:
             # 确保文件指针回到开始位置，以便后续可能的读取
             await file.seek(0)
-            content_stream.close()
-    
-    def get_presigned_url(
-        self, 
-        object_name: str, 
+
+    @staticmethod
+    def _hash_stream(stream: BinaryIO) -> Tuple[str, int]:
+        """在线程池中执行：按块读取整个文件，返回 (SHA-256, 字节数)，超过大小限制时中止"""
+        reader = LimitedHashingReader(stream, settings.MAX_UPLOAD_SIZE)
+        while reader.read(settings.UPLOAD_PART_SIZE):
+            pass
+        return reader.sha256, reader.size
+
+    def _put_stream(
+        self,
+        path: str,
+        stream: BinaryIO,
+        size: int,
+        digest: str,
+        content_type: str,
+        tags: Optional[Dict[str, str]],
+    ) -> None:
+        """在线程池中执行：流式上传对象并设置标签（含SHA-256校验和）"""
+        # 超过 part_size 时 MinIO 按分片上传，内存占用与文件大小无关
+        self.client.put_object(
+            bucket_name=settings.MINIO_USER_BUCKET,
+            object_name=path,
+            data=stream,
+            length=size,
+            part_size=settings.UPLOAD_PART_SIZE,
+            content_type=content_type,
+        )
+
+        # 设置对象标签，附带校验和
+        object_tags = Tags.new_object_tags()
+        object_tags.update(tags or {})
+        object_tags["sha256"] = digest
+        self.client.set_object_tags(
+            bucket_name=settings.MINIO_USER_BUCKET,
+            object_name=path,
+            tags=object_tags,
+        )
+
+    async def upload_files(
+        self,
+        files: List[UploadFile],
+        folder: str = "uploads",
+        tags: Optional[Dict[str, str]] = None,
+        concurrency: Optional[int] = None,
+    ) -> List[str]:
+        """
+        并发上传多个文件，任一失败时删除已上传的对象并抛出第一个异常
+
+        参数:
+            files: 文件列表
+            folder: 存储的子文件夹
+            tags: 对象标签
+            concurrency: 单次调用的最大并发数，默认 MEDIA_UPLOAD_CONCURRENCY
+
+        返回:
+            与 files 顺序一致的访问URL列表
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.MEDIA_UPLOAD_CONCURRENCY)
+
+        async def upload_one(file: UploadFile) -> str:
+            async with semaphore:
+                return await self.upload_file(file=file, folder=folder, tags=tags)
+
+        results = await asyncio.gather(
+            *(upload_one(file) for file in files),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            # 失败的文件已在 upload_file 中清理，这里只删除成功的
+            await self.delete_files([self.object_path(result) for result in results if isinstance(result, str)])
+            raise errors[0]
+        return results
+
+    async def stat_file(self, object_name: str) -> Optional[Object]:
+        """
+        读取对象元数据（HEAD请求）
+
+        参数:
+            object_name: 对象名称
+
+        返回:
+            对象信息（含 size、content_type），对象不存在时返回 None
+        """
+        try:
+            return await self._run(
+                self.client.stat_object,
+                bucket_name=settings.MINIO_USER_BUCKET,
+                object_name=object_name,
+            )
+        except S3Error as err:
+            if err.code in ("NoSuchKey", "NoSuchObject"):
+                return None
+            raise Exception(f"无法读取对象信息: {err}")
+
+    async def get_presigned_url(
+        self,
+        object_name: str,
         expires: timedelta = timedelta(hours=1)
     ) -> str:
         """
         生成预签名URL用于访问私有对象
-        
+
         参数:
             object_name: 对象名称
             expires: URL有效期
-        
+
         返回:
             预签名URL
         """
         try:
-            url = self.client.presigned_get_object(
+            url = await self._run(
+                self.client.presigned_get_object,
                 bucket_name=settings.MINIO_USER_BUCKET,
                 object_name=object_name,
                 expires=expires,
@@ -133,19 +332,22 @@ class StorageService:
             return url
         except S3Error as err:
             raise Exception(f"无法生成预签名URL: {err}")
-    
-    def delete_file(self, object_name: str) -> bool:
+
+    async def delete_file(self, object_name: str) -> bool:
         """
         从对象存储中删除文件
-        
+
+        对象按内容寻址，相同内容的上传共用一个对象，调用方需确认没有其他引用
+
         参数:
             object_name: 对象名称
-        
+
         返回:
             是否成功删除
         """
         try:
-            self.client.remove_object(
+            await self._run(
+                self.client.remove_object,
                 bucket_name=settings.MINIO_USER_BUCKET,
                 object_name=object_name,
             )
@@ -153,5 +355,20 @@ class StorageService:
         except S3Error:
             return False
 
+    async def delete_files(self, object_names: List[str]) -> None:
+        """
+        并发删除多个文件，删除失败只记录日志
+
+        参数:
+            object_names: 对象名称列表
+        """
+        results = await asyncio.gather(
+            *(self.delete_file(object_name) for object_name in object_names),
+            return_exceptions=True,
+        )
+        for object_name, result in zip(object_names, results):
+            if result is not True:
+                logger.warning(f"删除对象失败: {object_name}")
+
 # 创建存储服务单例
-storage = StorageService()
\ No newline at end of file
+storage = StorageService()